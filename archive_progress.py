@@ -0,0 +1,129 @@
+from multiprocessing import Array
+import threading
+import time
+
+from progress_meter import format_eta
+
+# How often, as a percentage of a member, the wrappers report into the
+# shared counters
+MEMBER_PCT_STEP = 0.5
+
+DEFAULT_EVERY_SECS = 1.0
+
+
+class ArchiveProgress:
+    """
+    Progress of a whole archive, across every member and phase.
+
+    Each phase, e.g. scan & load, has to get through all total_bytes, if
+    that's known; if not, e.g. for a streamed tar, only what's been done
+    so far is shown.
+    Progress wrappers anywhere, including in pool processes that inherited
+    this object, report into shared counters through callback(phase), and
+    finish() credits whatever a member's phase skipped, like the rows past
+    -n. A thread in the process that called start() writes the overall
+    percent done, throughput and ETA to progress_fh every every_secs.
+    """
+
+    def __init__(self, object_name, total_bytes, phases=('scan', 'load'),
+                 progress_fh=None, every_secs=DEFAULT_EVERY_SECS):
+        self._object_name = object_name
+        self._total_bytes = total_bytes
+        self._phases = tuple(phases)
+        self._done = Array('q', len(self._phases))
+        self._progress_fh = progress_fh
+        self._every_secs = every_secs
+        self._seen = {}
+        self._started = None
+        self._stopping = None
+        self._reporter = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_progress_fh=None, _stopping=None, _reporter=None,
+                     _seen={})
+        return state
+
+    @property
+    def total(self):
+        if self._total_bytes is None:
+            return None
+        return self._total_bytes * len(self._phases)
+
+    def done(self, phase=None):
+        if phase is not None:
+            return self._done[self._phases.index(phase)]
+        with self._done.get_lock():
+            return sum(self._done)
+
+    def add(self, phase, nbytes):
+        if not nbytes:
+            return
+        idx = self._phases.index(phase)
+        with self._done.get_lock():
+            self._done[idx] += nbytes
+
+    def callback(self, phase):
+        """ A progress wrapper callback that counts into phase. """
+        def report(object_name, line_num, char_num, file_len):
+            key = (phase, object_name)
+            seen = self._seen.get(key, 0)
+            if char_num > seen:
+                self._seen[key] = (char_num if file_len is None
+                                   else min(char_num, file_len))
+                self.add(phase, self._seen[key] - seen)
+        return report
+
+    def finish(self, phase, object_name, file_len):
+        """ Count all of object_name as done for phase. """
+        seen = self._seen.pop((phase, object_name), 0)
+        if file_len is not None:
+            self.add(phase, file_len - seen)
+
+    def describe(self):
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        done = self.done()
+        bytes_per_sec = done / elapsed
+        if self.total is None:
+            return (f"\r{self._object_name}: {done / 2 ** 20:,.1f} MB done - "
+                    f"{bytes_per_sec / 2 ** 20:,.1f} MB/s")
+        total = max(1, self.total)
+        eta = (total - done) / bytes_per_sec if done else 0
+        per_phase = max(1, self._total_bytes)
+        phases = ", ".join(
+            f"{phase} {int(self.done(phase) / per_phase * 100)}%"
+            for phase in self._phases)
+        return (f"\r{self._object_name}: {int(done / total * 100)}% of "
+                f"{self._total_bytes / 2 ** 20:,.1f} MB ({phases}) - "
+                f"{bytes_per_sec / 2 ** 20:,.1f} MB/s, "
+                f"ETA {format_eta(max(0, eta))}")
+
+    def _report_loop(self):
+        while not self._stopping.wait(self._every_secs):
+            self._progress_fh.write(self.describe())
+            self._progress_fh.flush()
+
+    def start(self):
+        self._started = time.monotonic()
+        if self._progress_fh:
+            self._stopping = threading.Event()
+            self._reporter = threading.Thread(
+                target=self._report_loop, name="archive-progress",
+                daemon=True)
+            self._reporter.start()
+        return self
+
+    def stop(self):
+        if self._reporter:
+            self._stopping.set()
+            self._reporter.join()
+            self._reporter = None
+        if self._progress_fh:
+            self._progress_fh.write(self.describe() + "\n")
+            self._progress_fh.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,289 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import errno
+import logging
+import os
+from random import randint
+from shutil import which
+import sys
+import tempfile
+import time
+from subprocess import CalledProcessError, PIPE
+from typing import Awaitable, Callable
+from zipfile import ZipInfo
+
+from csv_scanner import CSVScanner
+from fifo_transfer import (
+    FIFO_OPEN_POLL_SECS, TransferStats, _unwrap, file_span, pipe_capacity)
+from pipeline_hooks import phase
+
+logger = logging.getLogger('csv2db')
+
+# Members waiting between one stage & the next; each is an inflated temp
+# file, unless it's stored, so this bounds the disk they take
+QUEUE_DEPTH = 1
+
+
+async def wait_writable(fd):
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_writer(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_writer(fd)
+
+
+async def open_fifo_for_write_async(fifo_fname, reader_proc=None):
+    """
+    fifo_transfer.open_fifo_for_write(), polling without blocking the
+    event loop, for a reader started with asyncio.create_subprocess_exec.
+    The fd is left non-blocking, for transfer_async().
+    """
+    while True:
+        try:
+            return os.open(fifo_fname, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO:  # ENXIO: no reader yet
+                raise
+        if reader_proc is not None and reader_proc.returncode is not None:
+            raise BrokenPipeError(
+                f"FIFO reader exited with {reader_proc.returncode} before "
+                f"opening {fifo_fname}")
+        await asyncio.sleep(FIFO_OPEN_POLL_SECS)
+
+
+async def transfer_async(fifo_fd, csv_fh, buf_size=None) -> TransferStats:
+    """
+    fifo_transfer.transfer() into a non-blocking fifo_fd, waiting on the
+    event loop whenever the pipe's full. Files still go by os.sendfile();
+    anything else is read in the loop's default executor.
+    """
+    loop = asyncio.get_running_loop()
+    buf_size = buf_size or pipe_capacity(fifo_fd)
+    started = time.perf_counter()
+    span = file_span(csv_fh) if hasattr(os, 'sendfile') else None
+    nbytes = 0
+
+    if span and span[1] is not None:
+        method = 'sendfile'
+        in_fd, offset, left = span
+        while left > 0:
+            try:
+                sent = os.sendfile(fifo_fd, in_fd, offset + nbytes,
+                                   min(left, buf_size))
+            except BlockingIOError:
+                await wait_writable(fifo_fd)
+                continue
+            if not sent:
+                break
+            nbytes += sent
+            left -= sent
+            if hasattr(csv_fh, 'advance'):
+                csv_fh.advance(sent)
+        _unwrap(csv_fh).seek(nbytes, os.SEEK_CUR)
+    else:
+        method = 'copy'
+        while data := await loop.run_in_executor(None, csv_fh.read,
+                                                 buf_size):
+            view = memoryview(data)
+            while view:
+                try:
+                    view = view[os.write(fifo_fd, view):]
+                except BlockingIOError:
+                    await wait_writable(fifo_fd)
+            nbytes += len(data)
+
+    return TransferStats(nbytes, time.perf_counter() - started,
+                         method, buf_size)
+
+
+async def import_sqlite_async(
+        db_path, scanner: CSVScanner, table_name, csv_fh,
+        file_info: ZipInfo,
+        create_only: bool = False):
+    """
+    csv2db.create_import_sqlite, with sqlite3 run by
+    asyncio.create_subprocess_exec, and the FIFO written & sqlite3 waited
+    for without blocking the event loop, so the pipeline's other stages
+    carry on meanwhile.
+    """
+    member = file_info.filename if file_info else table_name
+    sqlite3_path = which("sqlite3")
+    proc, fifo_fname, tmpdir = None, None, None
+    # Closed last, so the import phase covers sqlite3 finishing up too
+    phases = ExitStack()
+    try:
+        tmpdir = tempfile.mkdtemp()
+        fifo_fname = os.path.join(
+            tmpdir, f"{table_name}_{hex(randint(0, sys.maxsize))[2:]}")
+        os.mkfifo(fifo_fname)
+
+        with phase(member, 'create'):
+            create = await asyncio.create_subprocess_exec(
+                sqlite3_path,
+                '-cmd', scanner.sql_create_table_1line(table_name),
+                db_path, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+            out, err = await create.communicate(b'')
+            if create.returncode:
+                raise CalledProcessError(create.returncode, sqlite3_path,
+                                         out, err)
+        logger.debug("sqlite3: created table %s", table_name)
+
+        if create_only:
+            return
+
+        info = phases.enter_context(phase(member, 'import'))
+        proc_info = phases.enter_context(phase(member, 'sqlite3'))
+        proc = await asyncio.create_subprocess_exec(
+            sqlite3_path,
+            '-cmd', '.mode csv',
+            '-cmd', '.separator , "\\n"',
+            '-cmd', f'.import {fifo_fname} {table_name}',
+            db_path, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        proc_info['pid'] = proc.pid
+
+        try:
+            fifo_fd = await open_fifo_for_write_async(fifo_fname, proc)
+            try:
+                with phase(member, 'transfer') as transfer_info:
+                    done = await transfer_async(fifo_fd, csv_fh)
+                    transfer_info.update(bytes=done.nbytes,
+                                         buf_size=done.buf_size,
+                                         method=done.method)
+            finally:
+                os.close(fifo_fd)
+        except BrokenPipeError:
+            if proc.returncode is None:
+                proc.kill()
+            err = await proc.stderr.read()
+            logger.error("sqlite3 stopped reading %s: %s", fifo_fname,
+                         err.decode(errors='replace').strip())
+            raise
+
+        logger.info("csv -> fifo, %s: %d bytes in %.2fs, %.1f MB/s "
+                    "(%s, %d byte buffer)",
+                    table_name, done.nbytes, done.seconds,
+                    done.nbytes / 2 ** 20 / max(done.seconds, 1e-9),
+                    done.method, done.buf_size)
+        info.update(transfer_info)
+
+    except BaseException:
+        # Don't leave sqlite3 waiting on a FIFO nobody will open
+        if proc and proc.returncode is None:
+            proc.kill()
+        raise
+
+    finally:
+        if csv_fh:
+            csv_fh.close()
+
+        # As in create_import_sqlite, sqlite3 must always be told to .quit
+        if proc:
+            if proc.returncode is None:
+                try:
+                    proc.stdin.write(b".quit\n")
+                    await proc.stdin.drain()
+                    proc.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            await proc.wait()
+            logger.debug("import_sqlite_async: sqlite3 exited with %d",
+                         proc.returncode)
+
+        if fifo_fname and os.path.exists(fifo_fname):
+            os.remove(fifo_fname)
+        if tmpdir:
+            os.rmdir(tmpdir)
+        phases.close()
+
+
+def in_thread(loader: Callable) -> Callable[..., Awaitable]:
+    """ A csv2db.LOADERS loader, run in the event loop's executor. """
+    async def load(**kw):
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: loader(**kw))
+    return load
+
+
+class AsyncPipeline:
+    """
+    Takes members through inflate, scan and load stages at once, each on
+    a different member, with bounded queues between them, so a member's
+    load into SQLite by sqlite3 overlaps the next member's scan and the
+    one after's inflation, rather than each waiting on the last.
+
+    inflate(name, table_name, file_info) and scan(name, table_name,
+    file_info, spool) are blocking calls, each run in a thread of its own;
+    zlib lets go of the GIL while it inflates. inflate() returns a temp file
+    of the inflated member, or None if it can be read as it is, for scan()
+    to return the scanner of. load(name, table_name, file_info, ss, spool)
+    is a coroutine, run on the event loop one member at a time, in members'
+    order, SQLite having a single writer. Spools are closed once loaded.
+    """
+
+    def __init__(self, inflate, scan, load, depth=QUEUE_DEPTH):
+        self._inflate = inflate
+        self._scan = scan
+        self._load = load
+        self._depth = depth
+
+    def run(self, members):
+        asyncio.run(self._run(members))
+
+    async def _run(self, members):
+        inflated = asyncio.Queue(self._depth)
+        scanned = asyncio.Queue(self._depth)
+        with ThreadPoolExecutor(
+                1, thread_name_prefix='csv2db-inflate') as inflater, \
+                ThreadPoolExecutor(
+                    1, thread_name_prefix='csv2db-scan') as scanner:
+            tasks = [
+                asyncio.ensure_future(
+                    self._inflating(inflater, members, inflated)),
+                asyncio.ensure_future(
+                    self._scanning(scanner, inflated, scanned)),
+                asyncio.ensure_future(self._loading(scanned)),
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                for queue in (inflated, scanned):
+                    while not queue.empty():
+                        item = queue.get_nowait()
+                        if item and item[3]:
+                            item[3].close()
+                raise
+
+    async def _inflating(self, pool, members, out: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        for name, table_name, file_info in members:
+            spool = await loop.run_in_executor(
+                pool, self._inflate, name, table_name, file_info)
+            await out.put((name, table_name, file_info, spool))
+        await out.put(None)
+
+    async def _scanning(self, pool, inp: asyncio.Queue, out: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while (item := await inp.get()) is not None:
+            try:
+                ss = await loop.run_in_executor(pool, self._scan, *item)
+            except BaseException:
+                if item[3]:
+                    item[3].close()
+                raise
+            await out.put((*item, ss))
+        await out.put(None)
+
+    async def _loading(self, inp: asyncio.Queue):
+        while (item := await inp.get()) is not None:
+            name, table_name, file_info, spool, ss = item
+            try:
+                await self._load(name, table_name, file_info, ss, spool)
+            finally:
+                if spool:
+                    spool.close()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+from functools import partial
+from io import StringIO, TextIOWrapper
+import json
+import os
+import platform
+import random
+from shutil import which
+import sys
+import tempfile
+import time
+from typing import List
+import zipfile
+
+from csv_scanner import CSVScanner
+from csv2db import zip_walker, LOADERS
+
+QUOTING = {
+    'minimal': csv.QUOTE_MINIMAL,
+    'all': csv.QUOTE_ALL,
+    'nonnumeric': csv.QUOTE_NONNUMERIC,
+}
+
+COMPRESSION = {
+    'stored': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+DEFAULT_TYPE_MIX = 'int=3,decimal=2,str=3,date=1,datetime=1,bool=1,empty=1'
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    def error(self, message: str) -> None:
+        sys.stderr.write('error: %s\n' % message)
+        self.print_help()
+
+
+def get_args(argv: List[str]) -> argparse.Namespace:
+    parser = ArgumentParser(
+        prog='benchmark.py',
+        description='Generate a reproducible synthetic CSV/zip corpus and '
+                    'time csv2db\'s scanner, zip_walker and loaders on it.')
+    parser.add_argument('--tables', dest='tables', default=4, type=int)
+    parser.add_argument('--rows', dest='rows', default=100000, type=int,
+                        help='Rows in the first table; each later table '
+                             'gets half as many as the one before')
+    parser.add_argument('--width', dest='width', default=12, type=int,
+                        help='Columns per table')
+    parser.add_argument('--type-mix', dest='type_mix',
+                        default=DEFAULT_TYPE_MIX,
+                        help='Relative weights of column types, '
+                             f'default {DEFAULT_TYPE_MIX}')
+    parser.add_argument('--str-len', dest='str_len', default=24, type=int,
+                        help='Longest generated string value')
+    parser.add_argument('--quoting', dest='quoting', default='minimal',
+                        choices=sorted(QUOTING))
+    parser.add_argument('--newlines', dest='newline_frac', default=0.0,
+                        type=float,
+                        help='Fraction of string values with an embedded '
+                             'newline')
+    parser.add_argument('--compression', dest='compression',
+                        default='deflated', choices=sorted(COMPRESSION))
+    parser.add_argument('--seed', dest='seed', default=0, type=int)
+    parser.add_argument('--loaders', dest='loaders', default=None,
+                        help='Comma separated loaders to time, default all '
+                             'that can run here')
+    parser.add_argument('--keep', dest='keep_dir', default=None,
+                        help='Write the corpus and dbs here and keep them')
+    parser.add_argument('--out', '-o', dest='out', default=None,
+                        help='Write JSON results here instead of stdout')
+    return parser.parse_args(argv)
+
+
+def parse_type_mix(type_mix):
+    weights = {}
+    for part in type_mix.split(','):
+        typ, _, weight = part.partition('=')
+        if typ not in VALUE_MAKERS:
+            raise ValueError(f"Unknown column type '{typ}' in --type-mix, "
+                             f"pick from {', '.join(sorted(VALUE_MAKERS))}")
+        weights[typ] = float(weight or 1)
+    return weights
+
+
+def _make_str(rnd, str_len, newline_frac):
+    val = ''.join(rnd.choices('abcdefghij klmnop, "',
+                              k=rnd.randint(1, str_len)))
+    if newline_frac and rnd.random() < newline_frac:
+        val = val[:len(val) // 2] + '\n' + val[len(val) // 2:]
+    return val
+
+
+VALUE_MAKERS = {
+    'int': lambda rnd, *_: str(rnd.randint(-10 ** 6, 10 ** 9)),
+    'decimal': lambda rnd, *_: f"{rnd.uniform(-1000, 1000):.4f}",
+    'str': _make_str,
+    'date': lambda rnd, *_: (f"20{rnd.randint(10, 29)}-"
+                             f"{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}"),
+    'datetime': lambda rnd, *_: (f"2023-{rnd.randint(1, 12):02}-"
+                                 f"{rnd.randint(1, 28):02} "
+                                 f"{rnd.randint(0, 23):02}:"
+                                 f"{rnd.randint(0, 59):02}:00"),
+    'bool': lambda rnd, *_: rnd.choice(('true', 'false')),
+    'empty': lambda rnd, *_: '',
+}
+
+
+def make_table(rnd, rows, width, weights, str_len, quoting, newline_frac):
+    types = rnd.choices(list(weights), weights=list(weights.values()),
+                        k=width)
+    buf = StringIO()
+    writer = csv.writer(buf, quoting=quoting)
+    writer.writerow([f"{typ}_{col}" for col, typ in enumerate(types)])
+    makers = [VALUE_MAKERS[typ] for typ in types]
+    for _ in range(rows):
+        writer.writerow([make(rnd, str_len, newline_frac) for make in makers])
+    return buf.getvalue().encode('utf-8')
+
+
+def make_corpus(zip_filename, tables=4, rows=100000, width=12,
+                type_mix=DEFAULT_TYPE_MIX, str_len=24, quoting='minimal',
+                newline_frac=0.0, compression='deflated', seed=0):
+    """
+    Write a zip of synthetic CSVs. The same arguments always produce the
+    same bytes of csv data.
+    """
+    rnd = random.Random(seed)
+    weights = parse_type_mix(type_mix)
+    with zipfile.ZipFile(zip_filename, 'w', COMPRESSION[compression]) as zip:
+        for table_no in range(tables):
+            zip.writestr(
+                f"bench/table_{table_no}.csv",
+                make_table(rnd, max(1, rows >> table_no), width, weights,
+                           str_len, QUOTING[quoting], newline_frac))
+
+
+def bench_scan(zip_filename):
+    results = []
+    with zipfile.ZipFile(zip_filename) as zip:
+        for info in zip.infolist():
+            with zip.open(info) as fh:
+                # Inflate up front so only the scanner is being timed
+                text = TextIOWrapper(fh, newline='').read()
+            ss = CSVScanner(StringIO(text, newline=''), 'bench')
+            started = time.perf_counter()
+            ss.scan()
+            seconds = time.perf_counter() - started
+            results.append({
+                'member': info.filename,
+                'rows': ss.row_count,
+                'seconds': seconds,
+                'rows_per_sec': ss.row_count / max(seconds, 1e-9),
+            })
+    return results
+
+
+def bench_zip_walker(zip_filename):
+    started = time.perf_counter()
+    zip_walker(zip_filename, max_rows=None)
+    return {'seconds': time.perf_counter() - started}
+
+
+def bench_loader(zip_filename, loader, db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    started = time.perf_counter()
+    zip_walker(zip_filename, max_rows=None,
+               output_fn=partial(LOADERS[loader], db_path))
+    seconds = time.perf_counter() - started
+    with zipfile.ZipFile(zip_filename) as zip:
+        nbytes = sum(info.file_size for info in zip.infolist())
+    return {
+        'loader': loader,
+        'bytes': nbytes,
+        'seconds': seconds,
+        'mb_per_sec': nbytes / 2 ** 20 / max(seconds, 1e-9),
+    }
+
+
+def main(args):
+    loaders = args.loaders.split(',') if args.loaders else [
+        loader for loader in sorted(LOADERS)
+        if loader != 'sqlite3' or which('sqlite3')]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        work_dir = args.keep_dir or tmpdir
+        os.makedirs(work_dir, exist_ok=True)
+        zip_filename = os.path.join(work_dir, 'corpus.zip')
+        corpus = {k: getattr(args, k) for k in (
+            'tables', 'rows', 'width', 'type_mix', 'str_len', 'quoting',
+            'newline_frac', 'compression', 'seed')}
+        make_corpus(zip_filename, **corpus)
+        results = {
+            'corpus': corpus,
+            'host': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+            },
+            'scan': bench_scan(zip_filename),
+            'zip_walker': bench_zip_walker(zip_filename),
+            'import': [
+                bench_loader(zip_filename, loader,
+                             os.path.join(work_dir, f"{loader}.db"))
+                for loader in loaders],
+        }
+    report = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main(get_args(sys.argv[1:]))
@@ -27,6 +27,25 @@ class BytesIOStatsWrapper(IOBase):
         self._line_num += len(data)
         return data
 
+    def readinto(self, buf):
+        n = self._source.readinto(buf)
+        self._char_num += n
+        if not isinstance(buf, bytearray):
+            buf = memoryview(buf)[:n].tobytes()
+        self._line_num += buf.count(b"\n", 0, n)
+        return n
+
+    def advance(self, nbytes):
+        """
+        Count nbytes as consumed when they were moved out of the source by
+        other means, e.g. os.sendfile(). Lines aren't counted.
+        """
+        self._char_num += nbytes
+
+    @property
+    def source(self):
+        return self._source
+
     @property
     def char_num(self):
         return self._char_num
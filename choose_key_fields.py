@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
-from collections import defaultdict as dd
+from collections import Counter, defaultdict as dd, namedtuple
 import pickle
+import re
 import sys
-from typing import List
+from typing import Dict, List
+
+from schema_catalog import SchemaCatalog, is_catalog
+from value_sketch import KMVSketch
 
 
 class ArgumentParser(argparse.ArgumentParser):
@@ -17,17 +21,41 @@ def get_args(argv: List[str]) -> argparse.Namespace:
     parser = ArgumentParser(
         prog='choose_key_fields.py',
         description='Locate likely key fields in csv2db --save-struct '
-                    'dumpfiles. Compares first columns with other tables'
+                    'catalogs & dumpfiles. Compares first columns with '
+                    'other tables'
                     'referents of the same name, and recommends '
                     'those as foreign key pairs.')
     parser.add_argument('--file', '-f', dest='structs_file', type=str,
                         action='store')
+    parser.add_argument(
+        '--min-containment', '-m', dest='min_containment', type=float,
+        default=MIN_CONTAINMENT,
+        help='With sketches in the dumpfile, the least share of a '
+             'column\'s values another must hold to be reported as what '
+             'it references')
     return parser.parse_args(argv)
 
 
 TNAME = 0
 COL_KEY = 1
 
+# Types not worth an index even when their names match across tables;
+# both csv2db's struct names & the SQL types its tables are created with
+UNINDEXED_TYPES = frozenset(('none', 'bool', 'NULL', 'BOOLEAN'))
+
+_SIZE_RX = re.compile(r'\s*\(.*\)$')
+
+# A column shared by name & type with another table; key is whether it's
+# the first column of its table, the likeliest place for a table's key
+Candidate = namedtuple('Candidate', ('table', 'column', 'key'))
+
+# Most of column's distinct values are found in ref_column's, which has
+# about as many or more, as a foreign key's are in the key it references
+Inclusion = namedtuple('Inclusion', ('table', 'column', 'ref_table',
+                                     'ref_column', 'containment'))
+
+MIN_CONTAINMENT = 0.9
+
 def get_by_pos(table_list, position):
     # import pudb; pu.db
     res = list(filter(
@@ -46,6 +74,92 @@ def mk_inverted_index(structs):
     return iindex
 
 
+def base_type(ftyp):
+    """ A struct's or SQL type without its size, e.g. str for str(12). """
+    return _SIZE_RX.sub('', ftyp)
+
+
+def key_candidates(structs: Dict[str, Dict[str, str]]) -> List[Candidate]:
+    """
+    The columns of structs, as saved by csv2db --save-struct, that share
+    their name and base type with a column of some other table: likely
+    keys, and the columns that join to them.
+    """
+    iindex = mk_inverted_index({
+        tname: {fname: base_type(ftyp) for fname, ftyp in tstruct.items()}
+        for tname, tstruct in structs.items()})
+    found = set()
+    for (fname, ftyp), occurrences in iindex.items():
+        if ftyp in UNINDEXED_TYPES:
+            continue
+        if len({tname for tname, _ in occurrences}) < 2:
+            continue
+        for tname, col_num in occurrences:
+            found.add(Candidate(tname, fname, col_num == 0))
+    return sorted(found)
+
+
+def load_structs(structs_file):
+    """
+    The structs & sketches in a --save-struct schema catalog, read table by
+    table as they're looked up, or in a .pkl dumpfile; dumpfiles from
+    before there were sketches are just the structs.
+    """
+    if is_catalog(structs_file):
+        catalog = SchemaCatalog(structs_file)
+        return catalog.structs(), catalog.all_sketches()
+    with open(structs_file, "rb") as fh:
+        saved = pickle.load(fh)
+    if isinstance(saved.get('version'), int):
+        return saved['structs'], saved.get('sketches', {})
+    return saved, {}
+
+
+def inclusion_candidates(
+        sketches: Dict[str, Dict[str, KMVSketch]],
+        structs: Dict[str, Dict[str, str]] = None,
+        min_containment=MIN_CONTAINMENT) -> List[Inclusion]:
+    """
+    Likely foreign keys, found by what's in the columns, not what they're
+    called: pairs of columns in different tables where nearly all of one's
+    distinct values, by their sketches, are also the other's.
+
+    Only pairs of columns whose sketches share a hash are compared, found
+    through an inverted index of the hashes, so the work & memory go with
+    the total size of the sketches, not the square of the column count.
+    """
+    columns = []
+    for tname, tsketches in sketches.items():
+        for fname, sketch in tsketches.items():
+            ftyp = structs.get(tname, {}).get(fname) if structs else None
+            if ftyp and base_type(ftyp) in UNINDEXED_TYPES:
+                continue
+            columns.append((tname, fname, ftyp and base_type(ftyp), sketch))
+    postings = dd(list)
+    for col_num, (_, _, _, sketch) in enumerate(columns):
+        for h in sketch.hashes:
+            postings[h].append(col_num)
+
+    found = []
+    for col_num, (tname, fname, ftyp, sketch) in enumerate(columns):
+        sharing = Counter(other for h in sketch.hashes
+                          for other in postings[h] if other != col_num)
+        for other in sharing:
+            ref_tname, ref_fname, ref_ftyp, ref_sketch = columns[other]
+            if ref_tname == tname or ftyp != ref_ftyp:
+                continue
+            if ref_sketch.distinct() < sketch.distinct() * min_containment:
+                continue
+            containment = sketch.containment(ref_sketch)
+            if containment is not None and containment >= min_containment:
+                found.append(Inclusion(tname, fname, ref_tname, ref_fname,
+                                       containment))
+    # Columns named the same as what they reference first, among equals
+    found.sort(key=lambda inc: (-inc.containment,
+                                inc.column != inc.ref_column, inc[:4]))
+    return found
+
+
 def locate_pairs(iindex, structs):
     for fld, occurrences in iindex.items():
         if len(occurrences) == 1:
@@ -73,8 +187,15 @@ def scan_structs(struct):
 
 
 def main(args):
-    with open(args.structs_file, "rb") as fh:
-        structs = pickle.loads(fh.read())
+    structs, sketches = load_structs(args.structs_file)
+    if sketches:
+        for inc in inclusion_candidates(sketches, structs,
+                                        args.min_containment):
+            print(f"{inc.table}.{inc.column} -> "
+                  f"{inc.ref_table}.{inc.ref_column}: "
+                  f"{inc.containment:.0%} of ~"
+                  f"{sketches[inc.table][inc.column].distinct():,} values")
+    else:
         iindex = mk_inverted_index(structs)
         pairs = locate_pairs(iindex, structs)
 
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+
+from pipeline_hooks import PipelineHook
+
+
+def _now_us():
+    # CLOCK_MONOTONIC is system-wide, so spans from pool workers line up
+    # with the parent's
+    return time.monotonic_ns() // 1000
+
+
+class ChromeTrace(PipelineHook):
+    """
+    Records every phase as a Chrome trace event, written on close() to
+    out_path as JSON that Perfetto or about://tracing can show as a
+    timeline, one track per process & thread.
+
+    A phase whose info has a 'pid', e.g. the sqlite3 CLI's lifetime, is
+    drawn in that process' track rather than in the one that timed it.
+    """
+
+    def __init__(self, out_path):
+        self._out_path = out_path
+        self._pid = os.getpid()
+        self._running = {}
+        self._events = []
+        self._process_names = {self._pid: 'csv2db'}
+        self._thread_names = {}
+
+    def enter(self, member, phase, info):
+        key = (member, phase, threading.get_ident())
+        self._running[key] = _now_us()
+
+    def exit(self, member, phase, info):
+        started = self._running.pop(
+            (member, phase, threading.get_ident()), None)
+        if started is None:
+            return
+        tid = threading.get_native_id()
+        pid = info.get('pid') or os.getpid()
+        if info.get('pid'):
+            self._process_names[pid] = phase
+            tid = pid
+        elif pid != self._pid:
+            self._process_names[pid] = 'csv2db worker'
+        self._thread_names[(pid, tid)] = threading.current_thread().name
+        self._events.append({
+            'name': phase,
+            'cat': 'csv2db',
+            'ph': 'X',
+            'ts': started,
+            'dur': _now_us() - started,
+            'pid': pid,
+            'tid': tid,
+            'args': {'member': member,
+                     **{key: val for key, val in info.items()
+                        if key != 'pid'}},
+        })
+
+    def drain(self):
+        drained = (self._events, self._process_names, self._thread_names)
+        self._events, self._process_names, self._thread_names = [], {}, {}
+        return drained
+
+    def absorb(self, drained):
+        events, process_names, thread_names = drained
+        self._events.extend(events)
+        self._process_names.update(process_names)
+        self._thread_names.update(thread_names)
+
+    def trace_events(self):
+        meta = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                 'args': {'name': name}}
+                for pid, name in self._process_names.items()]
+        meta += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                  'args': {'name': name}}
+                 for (pid, tid), name in self._thread_names.items()]
+        return meta + sorted(self._events, key=lambda event: event['ts'])
+
+    def close(self):
+        with open(self._out_path, 'w') as fh:
+            json.dump({'traceEvents': self.trace_events(),
+                       'displayTimeUnit': 'ms'}, fh)
@@ -0,0 +1,82 @@
+from collections import Counter
+from itertools import zip_longest
+import logging
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('csv_scanner')
+
+type_rx = re.compile(
+    r"(?P<date>^\d{4}[\-/]\d{2}[\-/]\d{2}$)"
+    r"|(?P<datetime>^\d{4}[\-/]\d{2}[\-/]\d{2}.\d{2}:\d{2}:\d{2}$)"
+    r"|(?P<time>^\d{2}:\d{2}:\d{2}$)"
+    r"|(?P<int>^[\-+0-9]+$)"
+    r"|(?P<decimal>^[\-+]?[0-9]*\.?[0-9]*$)"
+    r"|(?P<bool>^true|false$)"
+    r"|(?P<none>^None$)"
+    r"|(?P<str>^.*$)"
+)
+
+# Every alternative of type_rx except 'str' needs the value to start with
+# one of these characters, so anything else can skip the regex entirely
+_NON_STR_LEAD = frozenset("0123456789+-.tfN")
+
+_MISSING = object()
+
+ColumnTally = Tuple[Dict[str, int], int]
+
+
+def classify_value(val: str) -> str:
+    """
+    Return the type_rx group name that matches val, taking shortcuts for
+    the common shapes before falling back to the regex.
+    """
+    if not val:
+        return 'decimal'  # the decimal pattern is the first to accept ''
+    if val[0] not in _NON_STR_LEAD:
+        return 'str'
+    if val.isdigit() and val.isascii():
+        return 'int'
+    tx = type_rx.match(val)
+    if tx is None:
+        logger.warning("Could not grok value: %s", val)
+        return 'str'
+    return tx.lastgroup
+
+
+def classify_column(values: Iterable[str]) -> ColumnTally:
+    """
+    Classify a column of values in bulk.
+
+    Each distinct value is classified once and weighted by its count.
+    Returns the per-type counts, in order of first appearance, and the
+    longest 'str' value seen.
+    """
+    type_counts = {}
+    str_max_len = 0
+    for val, cnt in Counter(values).items():
+        typ = classify_value(val)
+        type_counts[typ] = type_counts.get(typ, 0) + cnt
+        if typ == 'str' and len(val) > str_max_len:
+            str_max_len = len(val)
+    return type_counts, str_max_len
+
+
+def transpose(rows: Sequence[Sequence[str]]) -> List[Sequence[str]]:
+    """
+    Turn a batch of rows into a list of columns. Short rows don't
+    contribute to the columns they're missing.
+    """
+    width = len(rows[0])
+    if all(len(row) == width for row in rows):
+        return list(zip(*rows))
+    return [[val for val in col if val is not _MISSING]
+            for col in zip_longest(*rows, fillvalue=_MISSING)]
+
+
+def classify_rows(rows: Sequence[Sequence[str]]) -> List[ColumnTally]:
+    """ Classify a batch of csv.reader rows column by column. """
+    if not rows:
+        return []
+    return [classify_column(col) for col in transpose(rows)]
@@ -1,23 +1,46 @@
 #!/usr/bin/env python3
 
 import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import ExitStack
 import logging
 import os
 from functools import partial
-from io import TextIOWrapper
+from io import BufferedReader, TextIOWrapper
 import pickle
 from random import randint
 import re
-from shutil import which
+from shutil import copyfileobj, which
 from subprocess import Popen, PIPE, run
 import sys
 import tempfile
 from typing import Tuple, List
-import zipfile
 from zipfile import ZipInfo
 
+from async_pipeline import AsyncPipeline, import_sqlite_async, in_thread
+from archive_progress import ArchiveProgress, MEMBER_PCT_STEP
 from csv_scanner import CSVScanner
+from distinct_count import UNIQUE_LIMIT
+import pipeline_hooks
+from pipeline_hooks import PipelineHook, phase
+from read_ahead_reader import READ_AHEAD_BLOCK, READ_AHEAD_BLOCKS, read_ahead
+from fifo_transfer import open_fifo_for_write, transfer
+from sqlite_loader import import_sqlite_inproc
+from chrome_trace import ChromeTrace
+from import_registry import ImportRegistry
+from key_indexes import KeyIndexer
+from phase_profiler import PhaseProfiler
+from run_metrics import RunMetrics
+from schema_catalog import LEGACY_EXTS, SchemaCatalog
+from scan_cache import ScanCache, DEFAULT_MAX_AGE, DEFAULT_MAX_BYTES
+from split_scan import (
+    SpanReader, chunk_reads, chunk_spans, count_quotes_in_file, map_file,
+    split_points)
+from staged_load import StagedLoad
+from sources import Source, ZipSource, open_source
+from spooled_tee_reader import SpooledTeeReader, SPOOL_MAX_MEM
 from text_io_progress_wrapper import TextIOProgressWrapper
+from value_sketch import DEFAULT_K
 from bytes_io_progress_wrapper import BytesIOProgressWrapper
 
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +48,13 @@ logger = logging.getLogger('csv2db')
 
 CSV_EXT_RX = re.compile(r'.*\.csv$')
 
+# --save-struct's legacy .pkl format: a pickled dict of it, the structs,
+# the sketches and the distinct counts
+STRUCTS_VERSION = 3
+
+# Bytes copied at a time when inflating a member into a temp file
+COPY_BUF = 2 ** 20
+
 std_err = sys.stderr
 
 
@@ -42,6 +72,11 @@ def get_args(argv: List[str]) -> Tuple[argparse.Namespace, ArgumentParser]:
                     'in a .ZIP archive.')
     parser.add_argument('--zip', '-z', dest='zip_file', type=str,
                         action='store')
+    parser.add_argument(
+        '--source', '-Z', dest='source', type=str, action='store',
+        help='Read csv files from a zip, a tar (.tar, .tar.gz/.bz2/.xz/'
+             '.zst), a directory, a single .csv(.gz/.bz2/.xz) file, or '
+             '- for stdin')
     parser.add_argument('--sqlite', '-s', dest='sqlite_db_file', type=str,
                         action='store')
     parser.add_argument('--filter', '-f', dest='name_filter', type=str,
@@ -57,107 +92,786 @@ def get_args(argv: List[str]) -> Tuple[argparse.Namespace, ArgumentParser]:
     parser.add_argument(
         '--save-struct', '-t', dest='save_struct', action='store',
         default=None,
-        help='Filename to write scan statistics & table structure, then exit')
+        help='Schema catalog to write scan statistics & table structure '
+             'to, then exit: a SQLite file each table is added to as it\'s '
+             'scanned, or a pickle if the name ends in .pkl')
     parser.add_argument('--max', '-n', dest='max_csv_rows', default=0,
                         type=int, action='store', nargs='?')
+    parser.add_argument(
+        '--sample', '-S', dest='sample_rows', default=None, type=int,
+        help='Infer types from about this many rows spread across each '
+             'csv file, instead of the top -n rows')
+    parser.add_argument(
+        '--converge', '-e', dest='converge', default=None, type=float,
+        help='Stop scanning a csv file once every column has held its type '
+             'and width long enough to put its per-row chance of changing '
+             'below this, at 95%% confidence (e.g. 0.001)')
+    parser.add_argument(
+        '--sketch', dest='sketch_k', default=None, type=int, nargs='?',
+        const=DEFAULT_K,
+        help='Keep a bottom-k sketch of each column\'s distinct values, '
+             f'k={DEFAULT_K} unless given, in --save-struct\'s output, for '
+             'choose_key_fields.py to find foreign keys with')
+    parser.add_argument(
+        '--distinct', dest='distinct_limit', default=None, type=int,
+        nargs='?', const=UNIQUE_LIMIT,
+        help='Count each column\'s distinct values, exactly while there '
+             f'are no more than {UNIQUE_LIMIT:,} unless given, and no '
+             'repeats, else estimated. With -n and no count, the first '
+             'column shown to be unique becomes the PRIMARY KEY')
     parser.add_argument(
         '--progress-rows', '-r', dest='every_rows', default=None, type=int,
         help='Show progress update every -r rows')
     parser.add_argument(
         '--progress-pct', '-p', dest='every_pct', default=None, type=float,
         help='Show progress update every -p percent of a csv file')
+    parser.add_argument(
+        '--progress-secs', '-P', dest='every_secs', default=None,
+        type=float,
+        help='Show progress update every -P seconds')
+    parser.add_argument(
+        '--progress-archive', '-A', dest='archive_every_secs', default=None,
+        type=float,
+        help='Show progress of the whole archive, across all csv files, '
+             'scans & imports, every -A seconds, instead of per csv file')
+    parser.add_argument(
+        '--jobs', '-j', dest='jobs', default=None, type=int,
+        help='Scan members in this many worker processes; imports then '
+             'run largest member first')
+    parser.add_argument(
+        '--single-pass', dest='single_pass', action='store_const',
+        default=False, const=True,
+        help='Inflate each member once, spooling it during the scan and '
+             'importing from the spool')
+    parser.add_argument(
+        '--spool-mb', dest='spool_mb', default=SPOOL_MAX_MEM // 2 ** 20,
+        type=int,
+        help='MB of a spooled member to hold in memory before spilling to '
+             'a temp file')
+    parser.add_argument(
+        '--split-mb', dest='split_mb', default=None, type=int,
+        help='With -n and no count, scan csv files bigger than this many MB '
+             'in chunks of about this size, in --jobs (default: all CPUs) '
+             'worker processes')
+    parser.add_argument(
+        '--loader', '-l', dest='loader', default='sqlite3',
+        choices=sorted(LOADERS),
+        help='Import through the sqlite3 CLI and a FIFO (sqlite3), or '
+             'in-process with the sqlite3 module (python)')
+    parser.add_argument(
+        '--parallel-load', dest='parallel_load', action='store_const',
+        default=False, const=True,
+        help='Load each csv file into a staging db of its own, in --jobs '
+             'worker processes, then merge them into the --sqlite db')
+    parser.add_argument(
+        '--async', dest='async_load', action='store_const',
+        default=False, const=True,
+        help='Inflate, scan and load csv files at once, each stage on a '
+             'different file, so one\'s load overlaps the next one\'s '
+             'scan and inflation')
+    parser.add_argument(
+        '--readahead', dest='readahead', default=None, type=int, nargs='?',
+        const=READ_AHEAD_BLOCKS,
+        help='Inflate csv files in a background thread, up to this many '
+             f'{READ_AHEAD_BLOCK // 2 ** 20}MB buffers ahead of the scan or '
+             f'import ({READ_AHEAD_BLOCKS} unless given)')
+    parser.add_argument(
+        '--cache-dir', dest='cache_dir', default=None,
+        help='Cache scan results here, keyed by member name, CRC & size, '
+             'so unchanged members aren\'t rescanned')
+    parser.add_argument(
+        '--cache-max-age', dest='cache_max_age',
+        default=DEFAULT_MAX_AGE // (24 * 3600), type=float,
+        help='Days an unused scan cache entry is kept')
+    parser.add_argument(
+        '--cache-max-mb', dest='cache_max_mb',
+        default=DEFAULT_MAX_BYTES // 2 ** 20, type=float,
+        help='Size the scan cache is trimmed to, oldest entries first')
+    parser.add_argument(
+        '--incremental', '-i', dest='incremental', action='store_const',
+        default=False, const=True,
+        help='Only reload tables whose csv file changed since they were '
+             'last imported into the --sqlite db')
+    parser.add_argument(
+        '--index-keys', dest='index_keys', action='store_const',
+        default=False, const=True,
+        help='Once all tables are loaded, index the columns they share by '
+             'name & type, i.e. likely keys & join columns')
+    parser.add_argument(
+        '--index-threads', dest='index_threads', default=None, type=int,
+        help='With --index-keys, helper threads for each index\'s sort '
+             '(default: all CPUs)')
+    parser.add_argument(
+        '--metrics-out', dest='metrics_out', default=None,
+        help='Write JSON timings, CPU, bytes, rows & peak RSS of each csv '
+             'file\'s open, scan, create & import phases here')
+    parser.add_argument(
+        '--trace', dest='trace_out', default=None,
+        help='Write a Chrome trace of each csv file\'s phases here, for '
+             'viewing in Perfetto or about://tracing')
+    parser.add_argument(
+        '--profile', dest='profile_dir', default=None,
+        help='cProfile each csv file\'s scan & import into .pstats files '
+             'here, plus a summary of the top functions')
+    parser.add_argument(
+        '--profile-every', dest='profile_every', default=1, type=int,
+        help='With --profile, only profile one in this many csv files')
     return parser.parse_args(argv), parser
 
 
-def zip_walker(zip_filename,
-               name_filter: re.Pattern = None,
-               max_rows=None,
-               output_fn=None,
-               create_only=False,
-               every_rows=None,
-               every_pct=None,
-               show_struct=False,
-               save_struct=None,
-               ):
+def scan_stream(csv_fh, name, table_name, file_len,
+                every_rows=None, every_pct=None, every_secs=None,
+                progress: ArchiveProgress = None, **scanner_kw):
+    show_progress = False
+    if progress:
+        csv_fh = TextIOProgressWrapper(
+            csv_fh,
+            object_name=name,
+            file_len=file_len,
+            callback=progress.callback('scan'),
+            every_pct=MEMBER_PCT_STEP,
+        )
+    elif show_progress := every_rows or every_pct or every_secs:
+        csv_fh = TextIOProgressWrapper(
+            csv_fh,
+            object_name=name,
+            file_len=file_len,
+            progress_fh=std_err,
+            every_rows=every_rows,
+            every_pct=every_pct,
+            every_secs=every_secs,
+        )
+    else:
+        csv_fh = TextIOWrapper(csv_fh)
+
+    ss = CSVScanner(
+        csv_fh,
+        table_name,
+        file_len=file_len,
+        **scanner_kw,
+    )
+    with phase(name, 'scan', file_size=file_len) as info:
+        ss.scan()
+        info['rows'] = ss.row_count
+    if progress:
+        # Count whatever the scan didn't need to read, e.g. past -n rows
+        progress.finish('scan', name, file_len)
+    if show_progress:
+        std_err.write("\n")
+    return ss
+
+
+def scan_member(source, name, table_name, file_len,
+                every_rows=None, every_pct=None, every_secs=None,
+                progress: ArchiveProgress = None, readahead=None,
+                **scanner_kw):
+    with phase(name, 'open'):
+        csv_fh = source.open(name)
+        if readahead:
+            csv_fh = read_ahead(csv_fh, readahead)
+    with csv_fh:
+        return scan_stream(csv_fh, name, table_name, file_len,
+                           every_rows=every_rows,
+                           every_pct=every_pct,
+                           every_secs=every_secs,
+                           progress=progress,
+                           **scanner_kw)
+
+
+def scan_member_once(source, name, table_name, file_len,
+                     every_rows=None, every_pct=None, every_secs=None,
+                     progress: ArchiveProgress = None,
+                     spool_mem=SPOOL_MAX_MEM, readahead=None, **scanner_kw):
+    """
+    Scan a member while spooling its inflated bytes, returning the scanner
+    and the spool rewound to the start, ready to be imported from.
+    """
+    with phase(name, 'open'):
+        member_fh = source.open(name)
+        if readahead:
+            member_fh = read_ahead(member_fh, readahead)
+    with member_fh:
+        tee = SpooledTeeReader(member_fh, max_mem=spool_mem)
+        ss = scan_stream(BufferedReader(tee), name, table_name, file_len,
+                         every_rows=every_rows,
+                         every_pct=every_pct,
+                         every_secs=every_secs,
+                         progress=progress,
+                         **scanner_kw)
+        # Inflating whatever the scan didn't read
+        with phase(name, 'open'):
+            return ss, tee.spooled()
+
+
+def inflate_to_temp(source, file_info):
+    """ The member in a temp file of its own, rewound to the start. """
+    spool = tempfile.NamedTemporaryFile(prefix='.csv2db-split-',
+                                        suffix='.csv')
+    try:
+        with source.open(file_info) as member_fh:
+            copyfileobj(member_fh, spool, COPY_BUF)
+        spool.flush()
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def scan_member_split(pool: ProcessPoolExecutor, source, name, table_name,
+                      file_info, chunk_bytes, **scanner_kw):
+    """
+    Scan a member in chunks of about chunk_bytes, each in one of pool's
+    workers, and merge their tallies into one scanner.
+
+    Chunks are cut at record boundaries found by quote parity, so a quoted
+    field's newlines don't split its record. Members that aren't in a file
+    as they are, e.g. deflated zip members, are inflated into a temp file
+    first, which is returned too, rewound, for the import to read from.
+    """
+    spool = None
+    with phase(name, 'open'):
+        extent = source.extent(file_info)
+        if extent is None:
+            spool = inflate_to_temp(source, file_info)
+            extent = spool.name, 0, os.fstat(spool.fileno()).st_size
+    path, offset, size = extent
+    merged = CSVScanner(None, table_name, file_len=size, **scanner_kw)
+    try:
+        with phase(name, 'scan', file_size=size) as info:
+            points = split_points(offset, size, chunk_bytes)
+            quote_counts = pool.map(count_quotes_in_file, [path] * len(points),
+                                    [offset] + points[:-1], points)
+            with map_file(path) as buf:
+                reads = chunk_reads(
+                    buf, offset, size,
+                    chunk_spans(buf, offset, size, points, quote_counts))
+            logger.info("%s: scanning %d chunks", name, len(reads))
+            chunks = [pool.submit(_scan_chunk_in_worker, path, spans,
+                                  f"{name}#{i}", table_name, scanner_kw)
+                      for i, spans in enumerate(reads)]
+            for chunk in chunks:
+                ss, drained = chunk.result()
+                pipeline_hooks.absorb(drained)
+                merged.merge(ss)
+            info['rows'] = merged.row_count
+    except BaseException:
+        if spool:
+            spool.close()
+        raise
+    return merged, spool
+
+
+def size_order(member):
+    """
+    Sort key for a (name, table_name, file_info) member by its size, or by
+    its compressed file's if that's unknown, e.g. for .bz2 files, else 0.
+    """
+    file_info = member[2]
+    if file_info.file_size is not None:
+        return file_info.file_size
+    try:
+        return os.path.getsize(file_info.path)
+    except (AttributeError, TypeError, OSError):
+        return 0
 
-    with zipfile.ZipFile(zip_filename, "r") as zip:
+
+def describe_distinct(counter):
+    return (f"{'' if counter.exact else '~'}{counter.distinct():,} distinct"
+            f"{' (unique)' if counter.unique else ''}")
+
+
+def _cache_scan(cache, name, file_info, scanner_kw, scan: Future):
+    if not scan.exception():
+        ss, _ = scan.result()
+        cache.put(name, file_info, scanner_kw, ss)
+
+
+_worker_source = None
+_worker_progress = None
+_worker_readahead = None
+
+
+def _open_worker_source(source: Source, progress: ArchiveProgress = None,
+                        hooks=(), readahead=None):
+    global _worker_source, _worker_progress, _worker_readahead
+    _worker_source = source.reopen()
+    _worker_progress = progress
+    _worker_readahead = readahead
+    pipeline_hooks.adopt(hooks)
+
+
+def _scan_member_in_worker(name, table_name, file_len, scanner_kw):
+    # Runs in a pool process, against that process' own copy of the
+    # source. Returns what the hooks recorded here too, for the parent's
+    # hooks to absorb.
+    ss = scan_member(_worker_source, name, table_name, file_len,
+                     progress=_worker_progress, readahead=_worker_readahead,
+                     **scanner_kw)
+    return ss, pipeline_hooks.drain()
+
+
+def _scan_chunk_in_worker(path, spans, chunk_name, table_name, scanner_kw):
+    # The chunk's bytes, less the header row it borrows from the start of
+    # the file, are what it counts towards the archive's progress
+    chunk_len = spans[-1][1] - spans[-1][0]
+    with SpanReader(path, spans) as chunk_fh:
+        if _worker_progress:
+            csv_fh = TextIOProgressWrapper(
+                BufferedReader(chunk_fh),
+                object_name=chunk_name,
+                file_len=chunk_len,
+                callback=_worker_progress.callback('scan'),
+                every_pct=MEMBER_PCT_STEP,
+            )
+        else:
+            csv_fh = TextIOWrapper(BufferedReader(chunk_fh))
+        ss = CSVScanner(csv_fh, table_name, file_len=chunk_len, **scanner_kw)
+        with phase(chunk_name, 'chunk', file_size=chunk_len) as info:
+            ss.scan()
+            info['rows'] = ss.row_count
+    if _worker_progress:
+        _worker_progress.finish('scan', chunk_name, chunk_len)
+    return ss, pipeline_hooks.drain()
+
+
+def _stage_member_in_worker(name, table_name, target_table,
+                            file_info: ZipInfo, scanner_kw,
+                            staged: StagedLoad, ss: CSVScanner = None):
+    # Scans, unless the parent had a cached scan, then loads the member
+    # into its own staging db, for the parent to merge
+    if ss is None:
+        ss = scan_member(_worker_source, name, table_name,
+                         file_info.file_size, progress=_worker_progress,
+                         readahead=_worker_readahead, **scanner_kw)
+    with phase(name, 'open'):
+        src_fh = _worker_source.open_for_import(file_info)
+        if _worker_readahead:
+            src_fh = read_ahead(src_fh, _worker_readahead)
+    with src_fh as csv_fh:
+        if _worker_progress:
+            csv_fh = BytesIOProgressWrapper(
+                source=csv_fh,
+                object_name=name,
+                every_pct=MEMBER_PCT_STEP,
+                callback=_worker_progress.callback('load'),
+                file_len=file_info.file_size,
+            )
+        _ = csv_fh.readline()
+        staged.load(ss, target_table, csv_fh, file_info)
+    if _worker_progress:
+        _worker_progress.finish('load', name, file_info.file_size)
+    return ss, pipeline_hooks.drain()
+
+
+def zip_walker(zip_filename, **kw):
+    with ZipSource(zip_filename) as source:
+        return source_walker(source, **kw)
+
+
+def source_walker(source: Source,
+                  name_filter: re.Pattern = None,
+                  max_rows=None,
+                  output_fn=None,
+                  create_only=False,
+                  every_rows=None,
+                  every_pct=None,
+                  every_secs=None,
+                  archive_every_secs=None,
+                  show_struct=False,
+                  save_struct=None,
+                  jobs=None,
+                  single_pass=False,
+                  spool_mem=SPOOL_MAX_MEM,
+                  sample_rows=None,
+                  converge=None,
+                  cache: ScanCache = None,
+                  registry: ImportRegistry = None,
+                  hooks: List[PipelineHook] = (),
+                  staged: StagedLoad = None,
+                  split_bytes=None,
+                  indexer: KeyIndexer = None,
+                  sketch_k=None,
+                  distinct_limit=None,
+                  async_fn=None,
+                  readahead=None,
+                  ):
+
+    scanner_kw = dict(max_rows=max_rows,
+                      sample_rows=sample_rows,
+                      converge=converge)
+    if sketch_k:
+        scanner_kw['sketch_k'] = sketch_k
+    if distinct_limit:
+        scanner_kw['distinct_limit'] = distinct_limit
+    with ExitStack() as stack:
+        for hook in hooks:
+            stack.enter_context(pipeline_hooks.install(hook))
+        if staged:
+            stack.callback(staged.close)
         table_sql = dict()
-        if save_struct:
-            structs = {}
-
-        for file_no, name in enumerate(zip.namelist()):
-            if name_filter and not name_filter.match(name):
-                continue
-            table_name = os.path.basename(name).split(".")[0]
-            file_info = zip.getinfo(name)
-            file_len = file_info.file_size
-
-            if CSV_EXT_RX.match(name):
-                with zip.open(name) as csv_fh:
-                    if show_progress:=every_rows or every_pct:
-                        csv_fh = TextIOProgressWrapper(
-                            csv_fh,
+        catalog = None
+        if save_struct and save_struct.endswith(LEGACY_EXTS):
+            structs, sketches, distinct = {}, {}, {}
+        elif save_struct:
+            # Each table's written as soon as it's scanned
+            catalog = stack.enter_context(SchemaCatalog(save_struct))
+
+        importing = output_fn and not (show_struct or save_struct)
+        if not importing or create_only:
+            registry = None
+
+        def wanted_members():
+            for file_info in source.members():
+                name = file_info.filename
+                if name_filter and not name_filter.match(name):
+                    continue
+                if CSV_EXT_RX.match(name):
+                    table_name = os.path.basename(name).split(".")[0]
+                    if registry and registry.is_current(
+                            table_name, name, file_info):
+                        logger.info("%s is unchanged since its last "
+                                    "import, skipping", name)
+                        continue
+                    yield name, table_name, file_info
+
+        if source.streaming:
+            # Members go by once, so each is handled as it comes, scanned
+            # & spooled in one pass, then imported from the spool
+            members = wanted_members()
+            if jobs and jobs > 1 or staged or split_bytes or async_fn:
+                logger.warning("%s is read as a stream; ignoring --jobs, "
+                               "--parallel-load, --split-mb and --async",
+                               source.name)
+                jobs, staged, split_bytes, async_fn = None, None, None, None
+            single_pass = True
+        else:
+            members = list(wanted_members())
+        if not importing or create_only:
+            async_fn = None
+        if async_fn and (jobs and jobs > 1 or staged or split_bytes
+                         or single_pass):
+            logger.warning("--async scans in a thread of its own, from an "
+                           "inflated copy; ignoring --jobs, --parallel-load, "
+                           "--split-mb and --single-pass")
+            jobs, staged, split_bytes, single_pass = None, None, None, False
+        if async_fn and (every_rows or every_pct or every_secs):
+            logger.warning("--async would interleave per csv file progress "
+                           "lines; use --progress-archive instead")
+            every_rows = every_pct = every_secs = None
+        if single_pass and jobs and jobs > 1:
+            logger.warning("--single-pass applies to serial runs only; "
+                           "ignoring it for --jobs %d", jobs)
+            single_pass = False
+
+        if split_bytes and (max_rows is not None or sample_rows
+                            or converge):
+            logger.warning("--split-mb scans whole csv files; ignoring it "
+                           "without -n, or with --sample or --converge")
+            split_bytes = None
+
+        def splitting(file_info):
+            return (split_bytes and file_info.file_size
+                    and file_info.file_size > split_bytes)
+
+        progress = None
+        if archive_every_secs:
+            sizes = [] if source.streaming else [
+                file_info.file_size for _, _, file_info in members]
+            progress = stack.enter_context(ArchiveProgress(
+                source.name,
+                None if source.streaming or None in sizes else sum(sizes),
+                phases=(('scan', 'load') if importing and not create_only
+                        else ('scan',)),
+                progress_fh=std_err,
+                every_secs=archive_every_secs,
+            ))
+            # Per csv file progress lines would garble the archive's
+            every_rows = every_pct = every_secs = None
+
+        split_pool = None
+
+        def serial_split_pool():
+            # Serial runs only start a pool once a member needs splitting
+            nonlocal split_pool
+            if split_pool is None:
+                split_pool = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=(jobs if jobs and jobs > 1
+                                 else os.cpu_count()),
+                    initializer=_open_worker_source,
+                    initargs=(source, progress,
+                              pipeline_hooks.installed())))
+            return split_pool
+
+        def split_member(pool, name, table_name, file_info):
+            ss, spool = scan_member_split(pool, source, name, table_name,
+                                          file_info, split_bytes,
+                                          **scanner_kw)
+            if cache:
+                cache.put(name, file_info, scanner_kw, ss)
+            return ss, spool
+
+        def finish_member(name, table_name, file_info, ss, spool=None):
+            if show_struct:
+                buf = []
+                counters = ss.distinct
+                for fname, stats in ss.scan_stats.as_dict().items():
+                    nulls = ss.scan_stats.nulls(fname)
+                    counter = counters.get(fname)
+                    buf.append(
+                        f"    {fname}: "
+                        f"{', '.join([f'{typ}:{cnt}' for typ, cnt in stats.items()])}"
+                        f"{f' (empty: {nulls})' if nulls else ''}"
+                        f"{f' - {describe_distinct(counter)}' if counter else ''}")
+                print("Statistics\n", "\n".join(buf))
+                print("Decision\n", list(ss.result()))
+                print("Table structure\n", ss.sql_create_table())
+
+            if catalog:
+                catalog.put(table_name, source.name, name, file_info, ss)
+            elif save_struct:
+                structs[table_name] = {
+                    fname: f"{typ}{f'({var_size})' if var_size else ''}"
+                    for fname, typ, var_size in ss.result()
+                }
+                if ss.sketches:
+                    sketches[table_name] = ss.sketches
+                if ss.distinct:
+                    distinct[table_name] = {
+                        fname: counter.as_dict()
+                        for fname, counter in ss.distinct.items()}
+
+            if importing:
+                with phase(name, 'open'):
+                    src_fh = spool or source.open_for_import(file_info)
+                    if readahead and not spool:
+                        src_fh = read_ahead(src_fh, readahead)
+                with src_fh as csv_fh:
+                    show_progress = False
+                    if progress and not create_only:
+                        csv_fh = BytesIOProgressWrapper(
+                            source=csv_fh,
+                            object_name=name,
+                            every_pct=MEMBER_PCT_STEP,
+                            callback=progress.callback('load'),
+                            file_len=file_info.file_size,
+                        )
+                    elif show_progress := (every_rows or every_pct
+                                           or every_secs):
+                        csv_fh = BytesIOProgressWrapper(
+                            source=csv_fh,
                             object_name=name,
-                            file_len=file_len,
-                            progress_fh=std_err,
                             every_rows=every_rows,
                             every_pct=every_pct,
+                            every_secs=every_secs,
+                            progress_fh=std_err,
+                            file_len=file_info.file_size,
                         )
-                    else:
-                        csv_fh = TextIOWrapper(csv_fh)
+                    _ = csv_fh.readline()
 
-                    ss = CSVScanner(
-                        csv_fh,
-                        table_name,
-                        max_rows=max_rows,
+                    if registry:
+                        # Load alongside the live table, then swap it in
+                        registry.drop_shadow(table_name)
+                    output_fn(
+                        scanner=ss,
+                        table_name=(registry.shadow_name(table_name)
+                                    if registry else table_name),
+                        csv_fh=csv_fh,
+                        file_info=file_info,
+                        create_only=create_only,
                     )
-                    ss.scan()
+                    if registry:
+                        registry.replace(table_name, name, file_info)
+                    if progress and not create_only:
+                        progress.finish('load', name, file_info.file_size)
                     if show_progress:
                         std_err.write("\n")
-                if show_struct:
-                    buf = []
-                    for fname, stats in ss.stats.items():
-                        buf.append(
-                            f"    {fname}: "
-                            f"{', '.join([f'{typ}:{cnt}' for typ, cnt in stats.items()])}")
-                    print("Statistics\n", "\n".join(buf))
-                    print("Decision\n", list(ss.result()))
-                    print("Table structure\n", ss.sql_create_table())
-
-                if save_struct:
-                    structs[table_name] = {
-                        fname: f"{typ}{f'({var_size})' if var_size else ''}"
-                        for fname, typ, var_size in ss.result()
-                    }
-
-                if output_fn and not (show_struct or save_struct):
-                    with zip.open(name) as csv_fh:
-                        if show_progress := every_rows or every_pct:
-                            csv_fh = BytesIOProgressWrapper(
-                                source=csv_fh,
-                                object_name=name,
-                                every_rows=every_rows,
-                                every_pct=every_pct,
-                                progress_fh=std_err,
-                                file_len=file_len,
-                            )
-                        _ = csv_fh.readline()
-
-                        output_fn(
-                            scanner=ss,
-                            table_name=table_name,
-                            csv_fh=csv_fh,
-                            file_info=file_info,
-                            create_only=create_only,
-                        )
-                        if show_progress:
-                            std_err.write("\n")
+            else:
+                table_sql[table_name] = ss.sql_create_table()
+                if spool:
+                    spool.close()
+
+        if async_fn:
+            # The next member's inflated & scanned in threads while this
+            # one's loaded on the event loop
+            def inflate(name, table_name, file_info):
+                if source.extent(file_info) is not None:
+                    return None  # scanned & loaded as it is
+                with phase(name, 'open'):
+                    return inflate_to_temp(source, file_info)
+
+            def scan(name, table_name, file_info, spool):
+                ss = cache.get(name, file_info, scanner_kw) if cache else None
+                if ss is not None:
+                    if progress:
+                        progress.finish('scan', name, file_info.file_size)
+                    return ss
+                if spool:
+                    with open(spool.name, 'rb') as spool_fh:
+                        ss = scan_stream(spool_fh, name, table_name,
+                                         file_info.file_size,
+                                         progress=progress, **scanner_kw)
                 else:
-                    table_sql[table_name] = ss.sql_create_table()
+                    ss = scan_member(source, name, table_name,
+                                     file_info.file_size, progress=progress,
+                                     **scanner_kw)
+                if cache:
+                    cache.put(name, file_info, scanner_kw, ss)
+                return ss
+
+            async def load(name, table_name, file_info, ss, spool):
+                with phase(name, 'open'):
+                    src_fh = spool or source.open_for_import(file_info)
+                with src_fh as csv_fh:
+                    if progress:
+                        csv_fh = BytesIOProgressWrapper(
+                            source=csv_fh,
+                            object_name=name,
+                            every_pct=MEMBER_PCT_STEP,
+                            callback=progress.callback('load'),
+                            file_len=file_info.file_size,
+                        )
+                    _ = csv_fh.readline()
+                    if registry:
+                        registry.drop_shadow(table_name)
+                    await async_fn(
+                        scanner=ss,
+                        table_name=(registry.shadow_name(table_name)
+                                    if registry else table_name),
+                        csv_fh=csv_fh,
+                        file_info=file_info,
+                    )
+                    if registry:
+                        registry.replace(table_name, name, file_info)
+                if progress:
+                    progress.finish('load', name, file_info.file_size)
 
-    if save_struct:
+            AsyncPipeline(inflate, scan, load).run(members)
+        elif staged and importing and not create_only:
+            # Workers scan & load members into staging dbs concurrently,
+            # biggest first; the parent merges them into the target in
+            # archive order, so it comes out the same as a serial run
+            with ProcessPoolExecutor(
+                    max_workers=jobs or os.cpu_count(),
+                    initializer=_open_worker_source,
+                    initargs=(source, progress,
+                              pipeline_hooks.installed(),
+                              readahead)) as pool:
+                loads = {}
+                for name, table_name, file_info in sorted(
+                        members, key=size_order, reverse=True):
+                    ss = (cache.get(name, file_info, scanner_kw)
+                          if cache else None)
+                    if ss is not None and progress:
+                        progress.finish('scan', name, file_info.file_size)
+                    elif ss is None and splitting(file_info):
+                        ss, spool = split_member(pool, name, table_name,
+                                                 file_info)
+                        if spool:
+                            # The worker reads the member for itself
+                            spool.close()
+                    target_table = (registry.shadow_name(table_name)
+                                    if registry else table_name)
+                    load = pool.submit(_stage_member_in_worker, name,
+                                       table_name, target_table, file_info,
+                                       scanner_kw, staged, ss)
+                    loads[name] = (load, target_table, ss is not None)
+                for name, table_name, file_info in members:
+                    load, target_table, cached = loads[name]
+                    ss, drained = load.result()
+                    pipeline_hooks.absorb(drained)
+                    if cache and not cached:
+                        cache.put(name, file_info, scanner_kw, ss)
+                    if registry:
+                        registry.drop_shadow(table_name)
+                    staged.merge(target_table, member=name)
+                    if registry:
+                        registry.replace(table_name, name, file_info)
+        elif jobs and jobs > 1:
+            # Biggest members first, so the longest import isn't the one
+            # left running by itself at the end
+            members.sort(key=size_order, reverse=True)
+            with ProcessPoolExecutor(
+                    max_workers=jobs,
+                    initializer=_open_worker_source,
+                    initargs=(source, progress,
+                              pipeline_hooks.installed(),
+                              readahead)) as pool:
+                scans = []
+                for name, table_name, file_info in members:
+                    spool = None
+                    if cache and (ss := cache.get(name, file_info,
+                                                  scanner_kw)):
+                        scan = Future()
+                        scan.set_result((ss, None))
+                        if progress:
+                            progress.finish('scan', name, file_info.file_size)
+                    elif splitting(file_info):
+                        # Takes the whole pool, before the smaller members
+                        # are queued up behind it
+                        ss, spool = split_member(pool, name, table_name,
+                                                 file_info)
+                        scan = Future()
+                        scan.set_result((ss, None))
+                    else:
+                        scan = pool.submit(_scan_member_in_worker, name,
+                                           table_name, file_info.file_size,
+                                           scanner_kw)
+                        if cache:
+                            scan.add_done_callback(partial(
+                                _cache_scan, cache, name, file_info,
+                                scanner_kw))
+                    scans.append((name, table_name, file_info, scan, spool))
+                # Imports happen here in the parent, one at a time, while
+                # the pool carries on scanning the smaller members
+                for name, table_name, file_info, scan, spool in scans:
+                    ss, drained = scan.result()
+                    pipeline_hooks.absorb(drained)
+                    finish_member(name, table_name, file_info, ss, spool)
+        else:
+            for name, table_name, file_info in members:
+                spool = None
+                ss = cache.get(name, file_info, scanner_kw) if cache else None
+                if ss is not None and progress:
+                    progress.finish('scan', name, file_info.file_size)
+                if ss is None:
+                    if splitting(file_info):
+                        ss, spool = scan_member_split(
+                            serial_split_pool(), source, name, table_name,
+                            file_info, split_bytes, **scanner_kw)
+                    elif single_pass and importing:
+                        ss, spool = scan_member_once(
+                            source, name, table_name, file_info.file_size,
+                            every_rows=every_rows,
+                            every_pct=every_pct,
+                            every_secs=every_secs,
+                            progress=progress,
+                            spool_mem=spool_mem,
+                            readahead=readahead,
+                            **scanner_kw)
+                    else:
+                        ss = scan_member(
+                            source, name, table_name, file_info.file_size,
+                            every_rows=every_rows,
+                            every_pct=every_pct,
+                            every_secs=every_secs,
+                            progress=progress,
+                            readahead=readahead,
+                            **scanner_kw)
+                    if cache:
+                        cache.put(name, file_info, scanner_kw, ss)
+                finish_member(name, table_name, file_info, ss, spool)
+
+        if indexer and importing and not create_only:
+            # After the load, so each index is built in one go
+            indexer.build()
+
+    if save_struct and save_struct.endswith(LEGACY_EXTS):
         with open(save_struct, "wb") as struct_fh:
-            a = pickle.dumps(structs)
+            a = pickle.dumps({'version': STRUCTS_VERSION,
+                              'structs': structs,
+                              'sketches': sketches,
+                              'distinct': distinct})
             struct_fh.write(a)
 
     if not output_fn:
@@ -184,14 +898,17 @@ def create_import_sqlite(
     1. Create FIFO pathname using tempfile.mkdtenp and a random number
     2. Create table in Sqlite db
     3. Start sqlite import to table, piping input from FIFO, which blocks until...
-    4. Open the FIFO as a file
-    5. Read csv_fh and write it to FIFO, until complete
+    4. Open the FIFO as a file, once sqlite3 has opened its end
+    5. Transfer the rest of csv_fh (past the header row) to the FIFO
     6. Send '.quit' to Sqlite3
     7. Close 'proc' of Sqlite3
     8. Close FIFO, csv_fh
     """
 
+    member = file_info.filename if file_info else table_name
     proc, fifo_fname, tmpdir = None, None, None
+    # Closed last, so the import phase covers sqlite3 finishing up too
+    phases = ExitStack()
     try:
         tmpdir = tempfile.mkdtemp()
         fifo_fname = os.path.join(
@@ -201,46 +918,48 @@ def create_import_sqlite(
     except OSError as e:
         logger.exception("Failed to create FIFO: %s", e)
     else:
-        run([
-            which("sqlite3"),
-            '-cmd', scanner.sql_create_table_1line(),
-            db_path
-        ], stdin=PIPE, stdout=PIPE, stderr=PIPE, check=True)
+        with phase(member, 'create'):
+            run([
+                which("sqlite3"),
+                '-cmd', scanner.sql_create_table_1line(table_name),
+                db_path
+            ], stdin=PIPE, stdout=PIPE, stderr=PIPE, check=True)
         logger.debug("sqlite3: created table %s", table_name)
 
         if create_only:
             return
 
+        info = phases.enter_context(phase(member, 'import'))
+        proc_info = phases.enter_context(phase(member, 'sqlite3'))
         proc = Popen([
             which("sqlite3"),
             '-cmd', '.mode csv',
-            '-cmd', '.separator , \\n',
+            '-cmd', '.separator , "\\n"',
             '-cmd', f'.import {fifo_fname} {table_name}',
             db_path,
-            '>', '/tmp/sout.log',
-            '2>', '/tmp/serr.log',
         ], stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        proc_info['pid'] = proc.pid
         logger.debug("sqlite3: start blocking pipe import %s", table_name)
 
-        buf_size_power = 24  # 16MB
-        while buf_size_power > 0:
-            with open(fifo_fname, "wb") as fifo_fh:
+        try:
+            with open_fifo_for_write(fifo_fname, proc) as fifo_fh:
                 logger.debug("open fifo for write: %s", fifo_fname)
-                csv_fh.seek(0)
-                logger.debug("csv seek(0): %s", table_name)
-
-                try:
-                    finished = transfer(
-                        fifo_fh, csv_fh, file_info, 2 ** buf_size_power)
-                    logger.debug("Power that worked: %d", buf_size_power)
-                    break
-                except BrokenPipeError as ee:
-                    logger.warning("Power that failed: %d; backing off by 1",
-                                   buf_size_power)
-                    buf_size_power -= 1
-
-        logger.debug("csv -> fifo, %s -> %s, completed: %d",
-                     table_name, fifo_fname, )
+                with phase(member, 'transfer') as transfer_info:
+                    done = transfer(fifo_fh, csv_fh)
+                    transfer_info.update(bytes=done.nbytes,
+                                         buf_size=done.buf_size,
+                                         method=done.method)
+        except BrokenPipeError:
+            logger.error("sqlite3 stopped reading %s: %s", fifo_fname,
+                         proc.stderr.read().decode(errors='replace').strip())
+            raise
+
+        logger.info("csv -> fifo, %s: %d bytes in %.2fs, %.1f MB/s "
+                    "(%s, %d byte buffer)",
+                    table_name, done.nbytes, done.seconds,
+                    done.nbytes / 2 ** 20 / max(done.seconds, 1e-9),
+                    done.method, done.buf_size)
+        info.update(transfer_info)
 
     finally:
         if csv_fh:
@@ -274,50 +993,84 @@ def create_import_sqlite(
             logger.debug("create_import_sqlite: rmdir tmpdir %s", tmpdir)
             os.rmdir(tmpdir)
             logger.debug("create_import_sqlite: rmdir tmpdir %s done", tmpdir)
+        phases.close()
 
 
-def transfer(fifo_fh, csv_fh, file_info, buf_size):
-    left = file_info.file_size
-    while left > 0:
-        can_do = min(left, buf_size)
-        try:
-            logger.debug("write %d bytes to fifo, left: %d", buf_size, left)
-            fifo_fh.write(csv_fh.read(can_do))
-            fifo_fh.flush()
-            left -= can_do
-            logger.debug("  wrote %d bytes to fifo, left: %d", buf_size, left)
-        except Exception as e:
-            logger.exception("Failed on exception: %s", str(e), 3)
-            raise e
-        except BrokenPipeError as bpe:
-            logger.exception("Failed on buf_size %d" % buf_size, bpe)
-            raise bpe
-
-        if left <= 0:
-            return True
+LOADERS = {
+    'sqlite3': create_import_sqlite,
+    'python': import_sqlite_inproc,
+}
 
 
 def main(argv=None):
     if argv is None:
         argv = sys.argv
     args, parser = get_args(argv)
-    create_fn, name_filter = None, None
+    create_fn, name_filter, cache, registry = None, None, None, None
+    staged, indexer, async_fn = None, None, None
     if args.sqlite_db_file:
-        create_fn = partial(create_import_sqlite, args.sqlite_db_file)
+        create_fn = partial(LOADERS[args.loader], args.sqlite_db_file)
+        if args.async_load:
+            async_fn = (partial(import_sqlite_async, args.sqlite_db_file)
+                        if args.loader == 'sqlite3' else in_thread(create_fn))
+        if args.incremental:
+            registry = ImportRegistry(args.sqlite_db_file)
+        if args.index_keys:
+            indexer = KeyIndexer(args.sqlite_db_file, args.index_threads)
     if args.name_filter:
         name_filter = re.compile(args.name_filter, re.I)
-    if args.zip_file:
-        zip_walker(
-            zip_filename=args.zip_file,
-            name_filter=name_filter,
-            create_only=args.create_only,
-            show_struct=args.show_struct,
-            save_struct=args.save_struct,
-            max_rows=args.max_csv_rows,
-            output_fn=create_fn,
-            every_rows=args.every_rows,
-            every_pct=args.every_pct,
-        )
+    if args.cache_dir:
+        cache = ScanCache(args.cache_dir,
+                          max_age=args.cache_max_age * 24 * 3600,
+                          max_bytes=args.cache_max_mb * 2 ** 20)
+    hooks = []
+    if args.metrics_out:
+        hooks.append(RunMetrics(args.metrics_out))
+    if args.trace_out:
+        hooks.append(ChromeTrace(args.trace_out))
+    if args.profile_dir:
+        hooks.append(PhaseProfiler(args.profile_dir, args.profile_every))
+    if args.zip_file or args.source:
+        if args.sqlite_db_file and args.parallel_load:
+            # Only once there's something to load, as it makes its staging
+            # directory right away
+            staged = StagedLoad(args.sqlite_db_file, LOADERS[args.loader])
+        source = (ZipSource(args.zip_file) if args.zip_file
+                  else open_source(args.source))
+        with source:
+            source_walker(
+                source,
+                name_filter=name_filter,
+                create_only=args.create_only,
+                show_struct=args.show_struct,
+                save_struct=args.save_struct,
+                max_rows=args.max_csv_rows,
+                output_fn=create_fn,
+                every_rows=args.every_rows,
+                every_pct=args.every_pct,
+                every_secs=args.every_secs,
+                archive_every_secs=args.archive_every_secs,
+                jobs=args.jobs,
+                single_pass=args.single_pass,
+                spool_mem=args.spool_mb * 2 ** 20,
+                sample_rows=args.sample_rows,
+                converge=args.converge,
+                cache=cache,
+                registry=registry,
+                hooks=hooks,
+                staged=staged,
+                split_bytes=(args.split_mb * 2 ** 20 if args.split_mb
+                             else None),
+                indexer=indexer,
+                sketch_k=args.sketch_k,
+                distinct_limit=args.distinct_limit,
+                async_fn=async_fn,
+                readahead=args.readahead,
+            )
+        if cache:
+            cache.evict()
+        if registry:
+            registry.close()
     else:
         parser.print_help()
 
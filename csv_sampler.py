@@ -0,0 +1,141 @@
+import csv
+from io import IOBase
+from itertools import islice
+import random
+from typing import Callable, Iterable, List, Tuple
+
+from split_scan import QUOTE, record_start
+
+# Number of evenly spaced places a seekable member is sampled from
+SAMPLE_BLOCKS = 32
+
+# Bytes read at a time between blocks, and while looking for a record start
+SKIP_BLOCK = 2 ** 16
+
+Rows = Iterable[List[str]]
+
+# Called with the bytes read, and the rows among them, as sampling goes
+SampleProgress = Callable[[int, int], None]
+
+
+def _decoded_lines(raw_fh, encoding):
+    for line in iter(raw_fh.readline, b''):
+        yield line.decode(encoding, errors='replace')
+
+
+def _read_quotes(raw_fh, nbytes):
+    """
+    Read nbytes on from raw_fh, a record start, returning whether they end
+    inside a quoted field.
+    """
+    quotes = 0
+    while nbytes > 0 and (data := raw_fh.read(min(nbytes, SKIP_BLOCK))):
+        quotes += data.count(QUOTE)
+        nbytes -= len(data)
+    return quotes % 2 == 1
+
+
+def _to_record_start(raw_fh, quoted):
+    """
+    Move raw_fh on to the first record to start after where it is, given
+    whether that's inside a quoted field. False if there's none.
+    """
+    start = raw_fh.tell()
+    buf = bytearray()
+    while data := raw_fh.read(SKIP_BLOCK):
+        buf += data
+        pos = record_start(buf, 0, quoted, len(buf))
+        if pos < len(buf):
+            raw_fh.seek(start + pos)
+            return True
+    return False
+
+
+def sample_blocks(raw_fh: IOBase, file_len, sample_rows,
+                  blocks=SAMPLE_BLOCKS,
+                  encoding='utf-8',
+                  progress: SampleProgress = None) -> Tuple[List[str], Rows]:
+    """
+    Sample about sample_rows rows from a seekable binary stream, in runs
+    of consecutive rows taken at evenly spaced byte offsets.
+
+    A block starts at the first record after its offset, found by the
+    parity of the quotes since the last block ended, as split_scan does,
+    so newlines inside quoted fields aren't taken for record ends. The
+    bytes in between are read, but only their quotes counted. Rows of the
+    wrong width, e.g. from a file that doesn't quote the RFC 4180 way, are
+    left out of the sample rather than let shift values between columns.
+    """
+    rows_per_block = max(1, -(-sample_rows // blocks))
+    raw_fh.seek(0)
+    head = csv.reader(_decoded_lines(raw_fh, encoding))
+    field_names = next(head)
+    width = len(field_names)
+    reported = 0
+
+    def report(lines):
+        nonlocal reported
+        if progress:
+            pos = raw_fh.tell()
+            progress(pos - reported, lines)
+            reported = pos
+
+    def block(reader):
+        taken = list(islice(reader, rows_per_block))
+        report(len(taken))
+        return [row for row in taken if len(row) == width]
+
+    def rows():
+        yield from block(head)
+        for block_no in range(1, blocks):
+            offset = block_no * file_len // blocks
+            if offset <= raw_fh.tell():
+                continue  # the previous block already read past here
+            quoted = _read_quotes(raw_fh, offset - raw_fh.tell())
+            if not _to_record_start(raw_fh, quoted):
+                break
+            yield from block(csv.reader(_decoded_lines(raw_fh, encoding)))
+        if progress and file_len > reported:
+            progress(file_len - reported, 0)
+
+    return field_names, rows()
+
+
+def sample_reservoir(reader: Iterable[List[str]], sample_rows,
+                     seed=0) -> Rows:
+    """
+    Uniform sample of sample_rows rows from a stream that can't be seeked,
+    e.g. one being spooled or piped. Every row is parsed, but only the
+    sampled ones go on to be classified.
+    """
+    rnd = random.Random(seed)
+    reservoir = list(islice(reader, sample_rows))
+    for row_num, row in enumerate(reader, sample_rows):
+        pick = rnd.randrange(row_num + 1)
+        if pick < sample_rows:
+            reservoir[pick] = row
+    return reservoir
+
+
+def sample_records(csv_fh, file_len, sample_rows,
+                   encoding='utf-8') -> Tuple[List[str], Rows]:
+    """
+    Return the header and a bounded sample of rows from csv_fh, seeking
+    through it when the underlying binary stream allows, otherwise
+    reading it all through a reservoir.
+
+    Block sampling reads a text csv_fh's binary buffer, from under any
+    progress wrapper, so what it reads is counted by the wrapper's advance().
+    """
+    raw_fh = getattr(csv_fh, 'buffer', csv_fh)
+    if file_len and raw_fh.seekable():
+        progress = None if raw_fh is csv_fh \
+            else getattr(csv_fh, 'advance', None)
+        return sample_blocks(raw_fh, file_len, sample_rows,
+                             encoding=encoding, progress=progress)
+    if raw_fh is csv_fh:
+        reader = csv.reader(_decoded_lines(raw_fh, encoding))
+    else:
+        reader = csv.reader(csv_fh)
+    field_names = next(reader)
+    return field_names, sample_reservoir(reader, sample_rows)
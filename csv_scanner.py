@@ -1,27 +1,38 @@
-from collections import defaultdict as dd
 import csv
+from itertools import islice
 import logging
-import re
 import sys
 from typing import Callable
 
+from column_classifier import (
+    type_rx, classify_value, classify_column, transpose)
+from csv_sampler import sample_records
+from distinct_count import DistinctCounter
+from scan_stats import ScanStats
 from text_io_stats_wrapper import TextIOStatsWrapper
+from value_sketch import KMVSketch
 
 std_err = sys.stderr
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('csv_scanner')
 
-type_rx = re.compile(
-    r"(?P<date>^\d{4}[\-/]\d{2}[\-/]\d{2}$)"
-    r"|(?P<datetime>^\d{4}[\-/]\d{2}[\-/]\d{2}.\d{2}:\d{2}:\d{2}$)"
-    r"|(?P<time>^\d{2}:\d{2}:\d{2}$)"
-    r"|(?P<int>^[\-+0-9]+$)"
-    r"|(?P<decimal>^[\-+]?[0-9]*\.?[0-9]*$)"
-    r"|(?P<bool>^true|false$)"
-    r"|(?P<none>^None$)"
-    r"|(?P<str>^.*$)"
-)
+# Rows handed to the column classifier at a time
+SCAN_BATCH_ROWS = 4096
+
+# "Rule of three": after n rows without a change, the chance of a change
+# per row is below 3/n at 95% confidence
+CONVERGE_RULE = 3
+
+# Rows up to about this many bytes suit a WITHOUT ROWID table, per SQLite's
+# advice of no more than 1/20th of a (4KB) page
+WITHOUT_ROWID_MAX_ROW = 200
+
+# Bytes counted per value of a column without a str width
+NON_STR_WIDTH = 8
+
+# Key of a column's DistinctCounter.as_dict() in stats, beside its types
+DISTINCT = 'distinct'
 
 sql_type_conv = {
     "date": "DATE",
@@ -39,47 +50,194 @@ class CSVScanner:
     def __init__(self, csv_fh,
                  table_name: str,
                  max_rows: int = None,
+                 sample_rows: int = None,
+                 file_len: int = None,
+                 converge: float = None,
+                 sketch_k: int = None,
+                 distinct_limit: int = None,
                  ):
         self._csv_fh = csv_fh
         self._table_name = table_name
-        self._stats = dd(lambda: dd(int))
-        self._str_max_len = dd(int)
+        self._stats = ScanStats()
         self._max_rows = max_rows
+        self._sample_rows = sample_rows
+        self._file_len = file_len
+        self._converge = converge
+        # Per column KMVSketches of its distinct values, if asked for
+        self._sketch_k = sketch_k
+        self._sketches = {} if sketch_k else None
+        # Per column DistinctCounters, if asked for
+        self._distinct_limit = distinct_limit
+        self._distinct = {} if distinct_limit else None
 
     def destroy(self):
         self._csv_fh.close()
         del self._table_name
         del self._stats
-        del self._str_max_len
         del self._csv_fh
         del self._max_rows
+        del self._sample_rows
+        del self._file_len
+        del self._converge
+        del self._sketch_k
+        del self._sketches
+        del self._distinct_limit
+        del self._distinct
+
+    def __getstate__(self):
+        # File handles don't cross process boundaries; the scan results do
+        state = self.__dict__.copy()
+        state['_csv_fh'] = None
+        return state
 
     def scan(self):
-        reader = csv.reader(self._csv_fh)
-        field_names = next(reader)
-        for row_num, row in enumerate(reader):
-            if row_num > self._max_rows:
+        if self._sample_rows:
+            field_names, reader = sample_records(
+                self._csv_fh, self._file_len, self._sample_rows)
+        else:
+            reader = csv.reader(self._csv_fh)
+            field_names = next(reader)
+            if self._max_rows is not None:
+                reader = islice(reader, self._max_rows + 1)
+        if len(set(field_names)) != len(field_names):
+            # Same-named columns share counters, so keep their tallies
+            # interleaved in row order the way a per-cell pass would
+            return self._scan_cells(reader, field_names)
+        if self._converge:
+            return self._scan_until_converged(reader, field_names)
+        while batch := list(islice(reader, SCAN_BATCH_ROWS)):
+            self._stats.add_rows(len(batch))
+            for i, col in enumerate(transpose(batch)):
+                if i >= len(field_names):
+                    logger.warning("%s: ignoring values beyond the last "
+                                   "named field", self._table_name)
+                    break
+                self._tally(field_names[i], *classify_column(col),
+                            nulls=col.count(''))
+                self._sketch(field_names[i], col)
+
+    def _scan_until_converged(self, reader, field_names):
+        """
+        Like scan(), but once a column has seen a str it's retired: its type
+        can't change, so only its values' lengths are looked at from then on
+        (which makes its width an upper bound, and freezes its stats).
+        The scan stops once no column's decision has changed for long enough
+        to bound its per-row chance of changing below self._converge.
+        """
+        stable_rows = CONVERGE_RULE / self._converge
+        changed_at = dict.fromkeys(field_names, 0)
+        retired = set()
+        rows_seen = 0
+        while batch := list(islice(reader, SCAN_BATCH_ROWS)):
+            rows_seen += len(batch)
+            self._stats.add_rows(len(batch))
+            for fname, col in zip(field_names, transpose(batch)):
+                before = self._decide(fname)
+                self._sketch(fname, col)
+                if fname in retired:
+                    self._tally(fname, {}, max(map(len, col), default=0))
+                else:
+                    self._tally(fname, *classify_column(col),
+                                nulls=col.count(''))
+                    if self._stats.count(fname, 'str'):
+                        retired.add(fname)
+                if self._decide(fname) != before:
+                    changed_at[fname] = rows_seen
+            if all(rows_seen - last >= stable_rows
+                   for last in changed_at.values()):
+                logger.info("%s: types converged after %d rows",
+                            self._table_name, rows_seen)
                 break
+
+    def _scan_cells(self, reader, field_names):
+        for row in reader:
+            self._stats.add_rows(1)
             for i, val in enumerate(row):
-                tx = type_rx.match(val)
-                types = {typ for typ, value in tx.groupdict().items()
-                         if value is not None}
-                if len(types) != 1:
-                    logger.warning("Could not grok field '%s': %s",
-                                   field_names[i], str(val))
-                the_type = types.pop()
-                self._stats[field_names[i]][the_type] += 1
-                if the_type == 'str':
-                    self._str_max_len[field_names[i]] = max(
-                        self._str_max_len[field_names[i]], len(val))
+                the_type = classify_value(val)
+                self._tally(field_names[i], {the_type: 1},
+                            len(val) if the_type == 'str' else 0,
+                            nulls=0 if val else 1)
+                self._sketch(field_names[i], (val,))
+
+    def _tally(self, field_name, type_counts, str_max_len, nulls=0):
+        self._stats.add(field_name, type_counts, str_max_len, nulls)
+
+    def _sketch(self, field_name, values):
+        if self._distinct is not None:
+            counter = self._distinct.get(field_name)
+            if counter is None:
+                counter = self._distinct[field_name] = DistinctCounter(
+                    self._distinct_limit)
+            counter.add(values)
+        if self._sketches is None:
+            return
+        sketch = self._sketches.get(field_name)
+        if sketch is None:
+            sketch = self._sketches[field_name] = KMVSketch(self._sketch_k)
+        sketch.update(set(values))
+
+    def merge(self, other: 'CSVScanner'):
+        """
+        Add another scan's tallies to this one's, e.g. of the next chunk of
+        the same file. Columns stay in the order they were first seen.
+        """
+        self._stats.merge(other._stats)
+        if self._sketches is not None and other._sketches:
+            for field_name, sketch in other._sketches.items():
+                if field_name in self._sketches:
+                    self._sketches[field_name].merge(sketch)
+                else:
+                    self._sketches[field_name] = KMVSketch(
+                        self._sketch_k, sketch.hashes)
+        if self._distinct is not None and other._distinct:
+            for field_name, counter in other._distinct.items():
+                if field_name in self._distinct:
+                    self._distinct[field_name].merge(counter)
+                else:
+                    self._distinct[field_name] = DistinctCounter(
+                        self._distinct_limit)
+                    self._distinct[field_name].merge(counter)
+
+    def _decide(self, field_name):
+        typ = self._stats.type_counts(field_name)
+        if not typ:
+            return None, None
+        if 'str' in typ:
+            return 'str', self._stats.str_max_len(field_name)
+        return max(typ, key=typ.get), None
 
     @property
     def stats(self):
-        return {fname: dict(cnts.items())
-                for fname, cnts in self._stats.items()}
+        """
+        Per column counts by type, plus, if scanned with distinct_limit,
+        its distinct count & uniqueness under DISTINCT
+        """
+        stats = self._stats.as_dict()
+        for field_name, counter in (self._distinct or {}).items():
+            stats[field_name][DISTINCT] = counter.as_dict()
+        return stats
+
+    @property
+    def scan_stats(self) -> ScanStats:
+        return self._stats
+
+    @property
+    def sketches(self):
+        """ KMVSketch of each column's values, if scanned with sketch_k """
+        return dict(self._sketches or {})
+
+    @property
+    def distinct(self):
+        """ DistinctCounter of each column, if scanned with distinct_limit """
+        return dict(self._distinct or {})
+
+    @property
+    def row_count(self):
+        """ Data rows scanned, i.e. not counting the header """
+        return self._stats.row_count
 
     def result(self):
-        for field_name, typ in self.stats.items():
+        for field_name, typ in self._stats.as_dict().items():
             typ_keys = typ.keys()
             the_typ = list(typ_keys)[0] if len(typ_keys) == 1 \
                 else sorted(typ_keys, key=lambda key: typ[key], reverse=True)[
@@ -92,11 +250,34 @@ class CSVScanner:
                         self._table_name, field_name, str(typ), the_typ)
                 )
             if the_typ == 'str':
-                str_len = self._str_max_len[field_name]
+                str_len = self._stats.str_max_len(field_name)
             else:
                 str_len = None
             yield field_name, the_typ, str_len
 
+    @property
+    def full_scan(self):
+        """ Whether every row was scanned """
+        return (self._max_rows is None and not self._sample_rows
+                and not self._converge)
+
+    def primary_key(self, fields=None):
+        """
+        The first column proven unique, by a full scan, with no empty
+        values, of a type SQLite stores as written (ints only if they're
+        canonical), or None. fields is what result() yields, if at hand.
+        """
+        if not self._distinct or not self.full_scan:
+            return None
+        rows = self.row_count
+        for field_name, the_typ, _ in fields or self.result():
+            counter = self._distinct.get(field_name)
+            if (counter and counter.unique and counter.values == rows
+                    and (the_typ == 'str' or the_typ == 'int'
+                         and counter.canonical_ints)):
+                return field_name
+        return None
+
     def __str__(self):
         buffer = []
         for field_name, the_typ, str_len in self.result():
@@ -106,16 +287,26 @@ class CSVScanner:
         return "\n".join(buffer)
 
     def sql_create_table(
-            self):
-        buffer = [f"CREATE TABLE {self._table_name} ("]
+            self, table_name=None):
+        buffer = [f"CREATE TABLE {table_name or self._table_name} ("]
         field_defs = []
-        for field_name, the_typ, str_len in self.result():
+        fields = list(self.result())
+        key = self.primary_key(fields)
+        without_rowid = False
+        for field_name, the_typ, str_len in fields:
             fname = field_name.replace(' ', '_')
             field_defs.append(f'{fname} {sql_type_conv[the_typ]}'
-                              f'{f"({str(str_len)})" if str_len else ""}')
+                              f'{f"({str(str_len)})" if str_len else ""}'
+                              f'{" PRIMARY KEY" if field_name == key else ""}')
+            if field_name == key and the_typ == 'str':
+                # An INTEGER PRIMARY KEY is the rowid already; other keys
+                # can be the table's b-tree key, if rows are small
+                without_rowid = sum(
+                    width or NON_STR_WIDTH for _, _, width in fields
+                ) <= WITHOUT_ROWID_MAX_ROW
         buffer.append("    " + (",\n    ".join(field_defs)))
-        buffer.append(');\n')
+        buffer.append(f'){" WITHOUT ROWID" if without_rowid else ""};\n')
         return "\n".join(buffer)
 
-    def sql_create_table_1line(self):
-        return self.sql_create_table().replace('\n', ' ')
+    def sql_create_table_1line(self, table_name=None):
+        return self.sql_create_table(table_name).replace('\n', ' ')
@@ -0,0 +1,154 @@
+from array import array
+import re
+from typing import Iterable
+
+from value_sketch import DEFAULT_K, KMVSketch, value_hash
+
+# Distinct values counted exactly per column while none has repeated, the
+# default for --distinct; past this the count is a KMV estimate
+UNIQUE_LIMIT = 1000000
+
+# A column with a repeated value can't be a key, so an exact count of it
+# isn't worth more memory than this
+REPEATED_LIMIT = 10000
+
+# Ints that SQLite keeps as written, so that distinct text means distinct
+# INTEGER PRIMARY KEYs: no leading zeros, + or -0, and well within 64 bits
+CANONICAL_INT_RX = re.compile(r'(?:0|-?[1-9][0-9]{0,17})\Z')
+
+
+class DistinctCounter:
+    """
+    Counts a column's distinct non-empty values: exactly, for as long as it
+    takes to tell whether the column's unique, i.e. up to limit values if
+    none repeats, then in a KMVSketch's worth of memory.
+
+    While exact, the values themselves are kept, as hashing every one costs
+    more than the rest of the scan; they're swapped for their 64 bit hashes
+    once the counter's pickled, e.g. from a pool worker, or merged with one
+    that was. Distinct hashes mean distinct values, so unique is never
+    wrong; a hash collision can only make a unique column look otherwise.
+    """
+    __slots__ = ('limit', 'k', 'values', '_seen', '_hashed', '_canonical',
+                 '_sketch')
+
+    def __init__(self, limit=UNIQUE_LIMIT, k=DEFAULT_K):
+        self.limit = limit
+        self.k = k
+        self.values = 0  # non-empty values counted
+        self._seen = set()  # values, or their hashes; None once estimating
+        self._hashed = False
+        # canonical_ints, None till it's asked for or the values change
+        self._canonical = None
+        self._sketch = None
+
+    @property
+    def exact(self):
+        return self._seen is not None
+
+    @property
+    def unique(self):
+        """ Whether no value repeats, as far as can be shown. """
+        return self.exact and len(self._seen) == self.values
+
+    @property
+    def canonical_ints(self):
+        """ Whether every value is a CANONICAL_INT_RX int, while exact """
+        if not self.exact:
+            return False
+        if self._canonical is None:
+            self._canonical = all(map(CANONICAL_INT_RX.match, self._seen))
+        return self._canonical
+
+    def distinct(self):
+        return len(self._seen) if self.exact else self._sketch.distinct()
+
+    def as_dict(self):
+        return {'distinct': self.distinct(), 'exact': self.exact,
+                'unique': self.unique}
+
+    def add(self, values: Iterable[str]):
+        values = [val for val in values if val]
+        if not values:
+            return
+        self.values += len(values)
+        if not self.exact:
+            self._sketch.update(values)
+            return
+        if self._hashed:
+            if self._canonical:
+                self._canonical = all(map(CANONICAL_INT_RX.match, values))
+            values = map(value_hash, values)
+        elif self._canonical:
+            self._canonical = None
+        self._seen.update(values)
+        self._check_limit()
+
+    def _hash(self):
+        """ Swap the values kept for their hashes. """
+        if not self._hashed:
+            self._canonical = self.canonical_ints
+            self._seen = set(map(value_hash, self._seen))
+            self._hashed = True
+
+    def _estimate(self):
+        self._hash()
+        self._sketch = KMVSketch(self.k, self._seen)
+        self._seen = self._canonical = None
+
+    def _check_limit(self):
+        limit = (self.limit if self.unique
+                 else min(self.limit, REPEATED_LIMIT))
+        if len(self._seen) > limit:
+            self._estimate()
+
+    def merge(self, other: 'DistinctCounter'):
+        """ Count other's values too, e.g. of the next chunk of a file. """
+        self.values += other.values
+        if self.exact and other.exact:
+            if self._hashed or other._hashed:
+                self._hash()
+                canonical = other.canonical_ints
+                other_seen = (other._seen if other._hashed
+                              else map(value_hash, other._seen))
+                self._seen.update(other_seen)
+                self._canonical = self._canonical and canonical
+            else:
+                self._seen |= other._seen
+                if self._canonical:
+                    self._canonical = None
+            self._check_limit()
+            return
+        if self.exact:
+            self._estimate()
+        if other.exact:
+            self._sketch.add_hashes(other._seen if other._hashed
+                                    else map(value_hash, other._seen))
+        else:
+            self._sketch.merge(other._sketch)
+
+    def __reduce__(self):
+        if self.exact:
+            self._hash()
+        return _restore, (self.limit, self.k, self.values, self._canonical,
+                          (array('Q', self._seen).tobytes() if self.exact
+                           else None),
+                          self._sketch)
+
+    def __repr__(self):
+        return (f"DistinctCounter({'' if self.exact else '~'}"
+                f"{self.distinct()}{', unique' if self.unique else ''})")
+
+
+def _restore(limit, k, values, canonical, hashes, sketch):
+    counter = DistinctCounter(limit, k)
+    counter.values = values
+    if hashes is None:
+        counter._seen, counter._sketch = None, sketch
+    else:
+        arr = array('Q')
+        arr.frombytes(hashes)
+        counter._seen = set(arr)
+        counter._hashed = True
+        counter._canonical = canonical
+    return counter
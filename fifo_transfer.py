@@ -0,0 +1,150 @@
+from collections import namedtuple
+import errno
+import io
+import logging
+import os
+import stat
+import time
+from tempfile import SpooledTemporaryFile
+
+try:
+    from fcntl import fcntl, F_GETPIPE_SZ, F_SETPIPE_SZ
+except ImportError:  # not Linux
+    fcntl = None
+
+logger = logging.getLogger('csv2db')
+
+# Ask the kernel for pipes this big; it caps the request at
+# /proc/sys/fs/pipe-max-size (1MB by default)
+PIPE_SIZE_TARGET = 2 ** 20
+PIPE_SIZE_DEFAULT = 2 ** 16
+PIPE_MAX_SIZE_PATH = "/proc/sys/fs/pipe-max-size"
+
+FIFO_OPEN_POLL_SECS = 0.01
+
+TransferStats = namedtuple(
+    'TransferStats', ['nbytes', 'seconds', 'method', 'buf_size'])
+
+
+def pipe_capacity(fd, want=PIPE_SIZE_TARGET):
+    """
+    Grow the pipe behind fd towards want bytes, if the platform allows it,
+    and return its resulting capacity.
+    """
+    if fcntl is None:
+        return PIPE_SIZE_DEFAULT
+    try:
+        with open(PIPE_MAX_SIZE_PATH) as fh:
+            want = min(want, int(fh.read()))
+    except (OSError, ValueError):
+        pass
+    try:
+        fcntl(fd, F_SETPIPE_SZ, want)
+    except OSError as e:
+        logger.debug("F_SETPIPE_SZ %d failed: %s", want, e)
+    return fcntl(fd, F_GETPIPE_SZ)
+
+
+def open_fifo_for_write(fifo_fname, reader_proc=None):
+    """
+    Open a FIFO for writing once its reader has opened the other end.
+    Unlike a plain open(), gives up if reader_proc exits first, rather than
+    blocking forever.
+    """
+    while True:
+        try:
+            fd = os.open(fifo_fname, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO:  # ENXIO: no reader yet
+                raise
+        if reader_proc is not None and reader_proc.poll() is not None:
+            raise BrokenPipeError(
+                f"FIFO reader exited with {reader_proc.returncode} before "
+                f"opening {fifo_fname}")
+        time.sleep(FIFO_OPEN_POLL_SECS)
+    os.set_blocking(fd, True)
+    return open(fd, "wb", buffering=0)
+
+
+def _unwrap(fh):
+    # Peel off the stats/progress wrappers to get at the real source
+    while hasattr(fh, 'source'):
+        fh = fh.source
+    return fh
+
+
+def file_span(fh):
+    """
+    (fd, offset, nbytes) of what's left to read from fh, if it's backed by
+    a file descriptor the kernel can copy from without our help, else None.
+    """
+    fh = _unwrap(fh)
+    if hasattr(fh, 'data_span'):
+        return fh.data_span()
+    if isinstance(fh, SpooledTemporaryFile):
+        if not fh._rolled:
+            return None  # fileno() would force it out to disk
+    elif not isinstance(getattr(fh, 'raw', fh), io.FileIO):
+        return None  # e.g. a GzipFile, whose fileno() is the compressed file
+    try:
+        fd = fh.fileno()
+        mode = os.fstat(fd).st_mode
+    except (AttributeError, OSError, ValueError):
+        return None
+    if stat.S_ISREG(mode):
+        offset = fh.tell()
+        return fd, offset, os.fstat(fd).st_size - offset
+    if stat.S_ISFIFO(mode):
+        return fd, None, None
+    return None
+
+
+def transfer(fifo_fh, csv_fh, buf_size=None) -> TransferStats:
+    """
+    Copy the rest of csv_fh into fifo_fh, in pipe-sized pieces.
+
+    Regular files, including stored zip members, go through os.sendfile()
+    and pipes through os.splice(), so the data never enters userspace.
+    Anything else, e.g. a deflated member, is read into one reused buffer.
+    """
+    out_fd = fifo_fh.fileno()
+    buf_size = buf_size or pipe_capacity(out_fd)
+    started = time.perf_counter()
+    span = file_span(csv_fh) if hasattr(os, 'sendfile') else None
+
+    if span and span[1] is not None:
+        method = 'sendfile'
+        in_fd, offset, left = span
+        nbytes = 0
+        while left > 0:
+            sent = os.sendfile(out_fd, in_fd, offset + nbytes,
+                               min(left, buf_size))
+            if not sent:
+                break
+            nbytes += sent
+            left -= sent
+            if hasattr(csv_fh, 'advance'):
+                csv_fh.advance(sent)
+        _unwrap(csv_fh).seek(nbytes, os.SEEK_CUR)
+    elif span and hasattr(os, 'splice'):
+        method = 'splice'
+        in_fd = span[0]
+        nbytes = 0
+        while moved := os.splice(in_fd, out_fd, buf_size):
+            nbytes += moved
+            if hasattr(csv_fh, 'advance'):
+                csv_fh.advance(moved)
+    else:
+        method = 'copy'
+        buf = bytearray(buf_size)
+        view = memoryview(buf)
+        nbytes = 0
+        while n := csv_fh.readinto(buf):
+            written = 0
+            while written < n:
+                written += fifo_fh.write(view[written:n])
+            nbytes += n
+
+    return TransferStats(nbytes, time.perf_counter() - started,
+                         method, buf_size)
@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+import logging
+import sqlite3
+from zipfile import ZipInfo
+
+logger = logging.getLogger('csv2db')
+
+IMPORTS_TABLE = '_csv2db_imports'
+SHADOW_SUFFIX = '__csv2db_new'
+
+
+class ImportRegistry:
+    """
+    Per-table import metadata kept in the target SQLite db: which member a
+    table came from, that member's CRC and size, the row count and when it
+    was loaded. Lets a rerun skip members that haven't changed, and swap in
+    reloaded tables atomically from a shadow table.
+    """
+
+    def __init__(self, db_path):
+        self._con = sqlite3.connect(db_path, isolation_level=None)
+        self._con.execute(
+            f"CREATE TABLE IF NOT EXISTS {IMPORTS_TABLE} ("
+            "table_name TEXT PRIMARY KEY, "
+            "member TEXT NOT NULL, "
+            "crc INTEGER NOT NULL, "
+            "file_size INTEGER NOT NULL, "
+            "row_count INTEGER NOT NULL, "
+            "imported_at TEXT NOT NULL)")
+
+    @staticmethod
+    def shadow_name(table_name):
+        return f"{table_name}{SHADOW_SUFFIX}"
+
+    def _table_exists(self, table_name):
+        return self._con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table_name,)).fetchone() is not None
+
+    def is_current(self, table_name, member, file_info: ZipInfo):
+        """ Whether table_name was already loaded from this exact member. """
+        if file_info.CRC is None or file_info.file_size is None:
+            return False  # nothing to tell one version from another
+        row = self._con.execute(
+            f"SELECT member, crc, file_size FROM {IMPORTS_TABLE} "
+            "WHERE table_name = ?", (table_name,)).fetchone()
+        return (row == (member, file_info.CRC, file_info.file_size)
+                and self._table_exists(table_name))
+
+    def drop_shadow(self, table_name):
+        """ Clear out a shadow table left behind by an interrupted run. """
+        self._con.execute(
+            f"DROP TABLE IF EXISTS {self.shadow_name(table_name)}")
+
+    def replace(self, table_name, member, file_info: ZipInfo):
+        """
+        Swap the freshly loaded shadow table in for table_name and record
+        where it came from, all in one transaction.
+        """
+        shadow = self.shadow_name(table_name)
+        self._con.execute("BEGIN IMMEDIATE")
+        try:
+            row_count, = self._con.execute(
+                f"SELECT count(*) FROM {shadow}").fetchone()
+            self._con.execute(f"DROP TABLE IF EXISTS {table_name}")
+            self._con.execute(f"ALTER TABLE {shadow} RENAME TO {table_name}")
+            self._con.execute(
+                f"INSERT OR REPLACE INTO {IMPORTS_TABLE} VALUES "
+                "(?, ?, ?, ?, ?, ?)",
+                (table_name, member, file_info.CRC or 0,
+                 file_info.file_size or 0, row_count,
+                 datetime.now(timezone.utc).isoformat()))
+            self._con.execute("COMMIT")
+        except BaseException:
+            self._con.execute("ROLLBACK")
+            raise
+        logger.info("Replaced %s from %s: %d rows",
+                    table_name, member, row_count)
+        return row_count
+
+    def close(self):
+        self._con.close()
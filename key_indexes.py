@@ -0,0 +1,97 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List
+
+from choose_key_fields import Candidate, key_candidates
+from import_registry import IMPORTS_TABLE, SHADOW_SUFFIX
+from pipeline_hooks import phase
+from sqlite_loader import BULK_LOAD_PRAGMAS
+
+logger = logging.getLogger('csv2db')
+
+# KiB, i.e. 1GB; SQLite only allocates what the sorts actually use
+INDEX_CACHE_KB = 2 ** 20
+
+
+def index_name(table, column):
+    return f"{table}__{column.replace(' ', '_')}__idx"
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class KeyIndexer:
+    """
+    Once all tables are loaded, indexes their likely key & join columns,
+    as picked by choose_key_fields.key_candidates() from every table in
+    db_path, not only those just loaded, so a rerun of an incremental load
+    still indexes the columns its reloaded tables share with the rest.
+
+    Each index is built in one sort over the loaded table, rather than kept
+    up to date row by row during the load. SQLite takes one writer at a
+    time, so indexes are built one after another, each sort spread across
+    threads helper threads, as far as the SQLite library allows.
+    """
+
+    def __init__(self, db_path, threads=None, cache_kb=INDEX_CACHE_KB):
+        self.db_path = db_path
+        self._threads = threads or os.cpu_count()
+        self._cache_kb = cache_kb
+
+    @staticmethod
+    def structs(con) -> Dict[str, Dict[str, str]]:
+        """ Every csv2db table's columns & declared types, from con's db """
+        structs = {}
+        for table, in con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY name"):
+            if table == IMPORTS_TABLE or table.endswith(SHADOW_SUFFIX):
+                continue
+            structs[table] = {
+                name: decl_type for _, name, decl_type, *_ in con.execute(
+                    f"PRAGMA table_info({_quote(table)})")}
+        return structs
+
+    def candidates(self, con) -> List[Candidate]:
+        return key_candidates(self.structs(con))
+
+    def build(self):
+        """
+        Create whichever candidate indexes don't exist yet, returning the
+        seconds each one took, by index name.
+        """
+        con = sqlite3.connect(self.db_path, isolation_level=None)
+        timings = {}
+        try:
+            for pragma in BULK_LOAD_PRAGMAS:
+                con.execute(pragma)
+            con.execute(f"PRAGMA cache_size = -{int(self._cache_kb)}")
+            threads, = con.execute(
+                f"PRAGMA threads = {int(self._threads)}").fetchone()
+            existing = {name for name, in con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")}
+            for candidate in self.candidates(con):
+                name = index_name(candidate.table, candidate.column)
+                if name in existing:
+                    continue
+                started = time.perf_counter()
+                with phase(candidate.table, 'index',
+                           column=candidate.column):
+                    con.execute(
+                        f"CREATE INDEX {_quote(name)} ON "
+                        f"{_quote(candidate.table)} "
+                        f"({_quote(candidate.column)})")
+                timings[name] = time.perf_counter() - started
+                logger.info("indexed %s.%s%s in %.2fs (%d sort threads)",
+                            candidate.table, candidate.column,
+                            " (key?)" if candidate.key else "",
+                            timings[name], threads)
+        finally:
+            con.close()
+        if timings:
+            logger.info("built %d indexes in %.2fs", len(timings),
+                        sum(timings.values()))
+        return timings
@@ -0,0 +1,86 @@
+import cProfile
+from collections import defaultdict
+import logging
+import os
+import pstats
+import re
+from zlib import crc32
+
+from pipeline_hooks import PipelineHook
+
+logger = logging.getLogger('csv2db')
+
+PROFILED_PHASES = ('scan', 'import')
+SUMMARY_FILE = 'summary.txt'
+SUMMARY_TOP = 30
+
+_UNSAFE_RX = re.compile(r'[^\w.-]+')
+
+
+class PhaseProfiler(PipelineHook):
+    """
+    cProfiles the scan & import phases of one in every_n members, each
+    into its own profile_dir/<member>.<phase>.pstats, and on close()
+    writes profile_dir/summary.txt with the top functions of each phase
+    across all the profiled members.
+
+    Members are picked by a hash of their name, so the same ones are
+    profiled in every process and on every rerun.
+    """
+
+    def __init__(self, profile_dir, every_n=1, phases=PROFILED_PHASES,
+                 top=SUMMARY_TOP):
+        self._profile_dir = profile_dir
+        self._every_n = max(1, every_n)
+        self._phases = phases
+        self._top = top
+        self._running = {}
+        self._written = []
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def profiled(self, member, phase):
+        return (phase in self._phases
+                and crc32(member.encode()) % self._every_n == 0)
+
+    def pstats_path(self, member, phase):
+        return os.path.join(self._profile_dir,
+                            f"{_UNSAFE_RX.sub('_', member)}.{phase}.pstats")
+
+    def enter(self, member, phase, info):
+        if self.profiled(member, phase):
+            profile = cProfile.Profile()
+            self._running[(member, phase)] = profile
+            profile.enable()
+
+    def exit(self, member, phase, info):
+        profile = self._running.pop((member, phase), None)
+        if profile is None:
+            return
+        profile.disable()
+        path = self.pstats_path(member, phase)
+        profile.dump_stats(path)
+        self._written.append((phase, path))
+
+    def drain(self):
+        written, self._written = self._written, []
+        return written
+
+    def absorb(self, drained):
+        self._written.extend(drained)
+
+    def close(self):
+        by_phase = defaultdict(list)
+        for phase, path in self._written:
+            by_phase[phase].append(path)
+        if not by_phase:
+            return
+        summary_path = os.path.join(self._profile_dir, SUMMARY_FILE)
+        with open(summary_path, "w") as fh:
+            for phase, paths in by_phase.items():
+                fh.write(f"=== {phase}: {len(paths)} member(s), "
+                         f"top {self._top} by own time ===\n")
+                stats = pstats.Stats(*paths, stream=fh)
+                stats.strip_dirs().sort_stats('tottime').print_stats(
+                    self._top)
+        logger.info("Wrote %d profiles and %s", len(self._written),
+                    summary_path)
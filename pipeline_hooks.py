@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+
+# Hooks installed in this process, called around every phase()
+_hooks = []
+
+
+class PipelineHook:
+    """
+    Something that observes the phases of each member's trip through
+    csv2db: 'open', 'scan', 'create' and 'import'. enter() and exit() are
+    called around each phase; by exit() its info dict holds whatever the
+    phase knew to report, e.g. bytes, rows, buf_size.
+
+    A hook copied into a worker process records there; drain() hands back
+    what it recorded since the last drain, as something picklable, for the
+    parent's copy to absorb().
+    """
+
+    def enter(self, member, phase, info):
+        pass
+
+    def exit(self, member, phase, info):
+        pass
+
+    def drain(self):
+        return None
+
+    def absorb(self, drained):
+        pass
+
+    def close(self):
+        pass
+
+
+def installed():
+    return list(_hooks)
+
+
+@contextmanager
+def install(hook: PipelineHook):
+    """ Call hook around every phase() until the block exits. """
+    _hooks.append(hook)
+    try:
+        yield hook
+    finally:
+        _hooks.remove(hook)
+        hook.close()
+
+
+def adopt(hooks):
+    """
+    Install hooks in a freshly started worker process, dropping anything
+    their copies recorded in the parent before the fork.
+    """
+    _hooks[:] = hooks
+    for hook in _hooks:
+        hook.drain()
+
+
+def drain():
+    return [hook.drain() for hook in _hooks]
+
+
+def absorb(drained):
+    for hook, hook_drained in zip(_hooks, drained or ()):
+        if hook_drained is not None:
+            hook.absorb(hook_drained)
+
+
+@contextmanager
+def phase(member, name, **info):
+    """
+    Mark a phase of member's processing for any installed hooks. The body
+    can add to the info dict it's given, for the hooks to see on exit.
+    """
+    if not _hooks:
+        yield info
+        return
+    hooks = list(_hooks)
+    for hook in hooks:
+        hook.enter(member, name, info)
+    try:
+        yield info
+    finally:
+        for hook in reversed(hooks):
+            hook.exit(member, name, info)
@@ -0,0 +1,129 @@
+import sys
+import time
+from typing import Callable
+
+ProgressCallback = Callable[[str, int, int, int], None]
+
+# With every_secs, look at the clock only this often
+PROBE_ROWS = 4096
+PROBE_BYTES = 2 ** 20
+
+# Least time between two progress_fh lines, besides the final one
+MIN_WRITE_INTERVAL = 0.1
+
+NEVER = sys.maxsize
+
+
+def format_eta(seconds):
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{secs:02}" if hours \
+        else f"{minutes}:{secs:02}"
+
+
+class ProgressMeter:
+    """
+    Decides when a progress wrapper reports, and what it says.
+
+    The wrapper only compares its line & char counters against next_line
+    and next_char, two ints, on each read; update() runs when either is
+    reached, reports, and moves them on. Reports go to callback, with the
+    same arguments as always, or as a line to progress_fh with throughput
+    and an ETA, no more often than min_interval seconds apart.
+    """
+
+    def __init__(self, object_name, file_len,
+                 every_rows=None,
+                 every_pct=None,
+                 every_secs=None,
+                 callback: ProgressCallback = None,
+                 progress_fh=None,
+                 min_interval=MIN_WRITE_INTERVAL):
+        outputting = any((callback, progress_fh))
+        output_both = all((callback, progress_fh))
+        everys = sum(bool(every) for every in
+                     (every_rows, every_pct, every_secs))
+
+        if outputting and not everys:
+            raise ValueError(
+                "When using 'callback' or 'progress_fh' you "
+                "need to specify either 'every_rows', 'every_pct' or "
+                "'every_secs' to tell how often to report on progress")
+        if everys and not outputting:
+            raise ValueError(
+                "When specifying 'every_rows', 'every_pct' or 'every_secs' "
+                "you also need to specify 'callback' or 'progress_fh'")
+        if output_both:
+            raise ValueError("Specify either 'callback' or 'progress_fh' "
+                             "but not both")
+        if everys > 1:
+            raise ValueError("Specify only one of 'every_row', 'every_pct' "
+                             "or 'every_secs'")
+
+        self._object_name = object_name
+        self._file_len = file_len
+        self._every_rows = every_rows
+        self._every_secs = every_secs
+        # Without a file_len, every_pct falls back to reporting on each probe
+        self._pct_step = max(1, int(file_len * every_pct / 100)) \
+            if every_pct and file_len is not None else None
+        self._callback = callback
+        self._progress_fh = progress_fh
+        self._min_interval = min_interval
+        self._started = self._last_report = self._last_write = \
+            time.monotonic()
+        self.next_line = self.next_char = NEVER
+        if outputting:
+            self._rearm(0, 0)
+
+    def _rearm(self, line_num, char_num):
+        end = NEVER if self._file_len is None else self._file_len - 1
+        if self._every_rows:
+            self.next_line, self.next_char = line_num + self._every_rows, end
+        elif self._pct_step:
+            self.next_line = NEVER
+            self.next_char = min(char_num + self._pct_step, end)
+        else:
+            self.next_line = line_num + PROBE_ROWS
+            self.next_char = min(char_num + PROBE_BYTES, end)
+
+    def update(self, line_num, char_num):
+        at_end = (self._file_len is not None
+                  and char_num >= self._file_len - 1)
+        now = time.monotonic()
+        if at_end:
+            self.next_line = self.next_char = NEVER
+        else:
+            self._rearm(line_num, char_num)
+            if (self._every_secs
+                    and now - self._last_report < self._every_secs):
+                return
+        self._last_report = now
+
+        if self._callback:
+            self._callback(self._object_name, line_num, char_num,
+                           self._file_len)
+        elif self._progress_fh:
+            if not at_end and now - self._last_write < self._min_interval:
+                return
+            self._last_write = now
+            self._progress_fh.write(
+                self.describe(line_num, char_num, now - self._started))
+
+    def describe(self, line_num, char_num, elapsed):
+        elapsed = max(elapsed, 1e-9)
+        bytes_per_sec = char_num / elapsed
+        if self._file_len is None:
+            return (f"\r{self._object_name}: "
+                    f"row {line_num:,} - "
+                    f"{line_num / elapsed:,.0f} rows/s, "
+                    f"{bytes_per_sec / 2 ** 20:,.1f} MB/s")
+        file_len = max(1, self._file_len)
+        rows_est = file_len / (max(1, char_num) / max(1, line_num))
+        eta = (file_len - char_num) / bytes_per_sec if char_num else 0
+        return (f"\r{self._object_name}: "
+                f"row {line_num:,} of {int(rows_est):,} - "
+                f"{int(char_num / file_len * 100)}% - "
+                f"{line_num / elapsed:,.0f} rows/s, "
+                f"{bytes_per_sec / 2 ** 20:,.1f} MB/s, "
+                f"ETA {format_eta(max(0, eta))}")
@@ -0,0 +1,103 @@
+from io import BufferedIOBase, BufferedReader, RawIOBase
+from queue import Queue
+from threading import Event, Thread
+
+from fifo_transfer import file_span
+
+# Bytes inflated per buffer, and buffers in the ring, i.e. how far ahead of
+# its reader the thread may get
+READ_AHEAD_BLOCK = 2 ** 20
+READ_AHEAD_BLOCKS = 4
+
+
+class ReadAheadReader(RawIOBase):
+    """
+    Reads source, e.g. a deflated zip member, in a thread of its own, into
+    a ring of blocks reused buffers of block_size bytes, which readinto()
+    hands on in order. zlib lets go of the GIL while it inflates, so the
+    member's inflated while the caller is parsing what came before.
+    """
+
+    def __init__(self, source: BufferedIOBase, block_size=READ_AHEAD_BLOCK,
+                 blocks=READ_AHEAD_BLOCKS):
+        self._source = source
+        self._free = Queue()
+        for _ in range(blocks):
+            self._free.put(bytearray(block_size))
+        self._filled = Queue()
+        self._stop = Event()
+        self._buf, self._pos, self._end = None, 0, 0
+        self._eof = False
+        self._tell = 0  # bytes handed out by readinto()
+        self._thread = Thread(target=self._fill, name='csv2db-readahead',
+                              daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        readinto = getattr(self._source, 'readinto', None)
+        try:
+            while not self._stop.is_set():
+                buf = self._free.get()
+                if buf is None:  # close() wants the thread gone
+                    break
+                if readinto:
+                    n = readinto(buf)
+                else:
+                    data = self._source.read(len(buf))
+                    n = len(data)
+                    buf[:n] = data
+                self._filled.put((buf, n))
+                if not n:
+                    break
+        except BaseException as e:
+            self._filled.put((e, 0))
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        """ Bytes read so far, e.g. for a loader to count what it loaded """
+        return self._tell
+
+    def readinto(self, b):
+        if self._pos == self._end:
+            if self._eof:
+                return 0
+            if self._buf is not None:
+                self._free.put(self._buf)
+            self._buf, self._end = self._filled.get()
+            self._pos = 0
+            if isinstance(self._buf, BaseException):
+                self._eof = True
+                raise self._buf
+            if not self._end:
+                self._eof = True
+                return 0
+        n = min(len(b), self._end - self._pos)
+        b[:n] = memoryview(self._buf)[self._pos:self._pos + n]
+        self._pos += n
+        self._tell += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._free.put(None)
+            self._thread.join()
+            self._source.close()
+        super().close()
+
+
+def read_ahead(fh, blocks=READ_AHEAD_BLOCKS):
+    """
+    fh, read ahead in a thread, buffered for csv parsing & readline(),
+    unless it's a file the kernel can copy from as it is, e.g. a stored
+    member headed for sendfile().
+    """
+    if file_span(fh) is not None:
+        return fh
+    return BufferedReader(ReadAheadReader(fh, blocks=blocks),
+                          READ_AHEAD_BLOCK)
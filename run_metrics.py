@@ -0,0 +1,123 @@
+from collections import defaultdict
+import json
+import os
+import resource
+import sys
+import time
+
+from pipeline_hooks import PipelineHook
+
+# ru_maxrss is in KB on Linux, bytes on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# info keys that add up across repeats of a member's phase; the rest,
+# e.g. buf_size, keep their latest value
+SUMMED = ('bytes', 'rows')
+
+
+def peak_rss(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss * RSS_UNIT
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _with_rates(record):
+    if record.get('rows') and record['wall']:
+        record['rows_per_sec'] = record['rows'] / record['wall']
+    if record.get('bytes') and record['wall']:
+        record['mb_per_sec'] = record['bytes'] / 2 ** 20 / record['wall']
+    return record
+
+
+class RunMetrics(PipelineHook):
+    """
+    Wall & CPU time, bytes, rows and peak RSS of each member's phases, and
+    of the run as a whole, written as JSON to out_path on close().
+
+    CPU time is this process' own plus that of its finished children, so
+    it includes the sqlite3 CLI's imports.
+    """
+
+    def __init__(self, out_path):
+        self._out_path = out_path
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time() + child_cpu()
+        self._members = defaultdict(dict)
+        self._open = {}
+
+    def enter(self, member, phase, info):
+        self._open[(member, phase)] = (
+            time.perf_counter(), time.process_time(), child_cpu())
+
+    def exit(self, member, phase, info):
+        wall0, cpu0, child0 = self._open.pop((member, phase))
+        record = self._members[member].setdefault(
+            phase, {'wall': 0.0, 'cpu': 0.0, 'child_cpu': 0.0, 'count': 0})
+        record['wall'] += time.perf_counter() - wall0
+        record['cpu'] += time.process_time() - cpu0
+        record['child_cpu'] += child_cpu() - child0
+        record['count'] += 1
+        for key, val in info.items():
+            if val is None:
+                continue
+            record[key] = record.get(key, 0) + val if key in SUMMED else val
+        record.setdefault('pid', os.getpid())
+        record['peak_rss'] = max(record.get('peak_rss', 0), peak_rss())
+
+    def drain(self):
+        members, self._members = dict(self._members), defaultdict(dict)
+        return members
+
+    def absorb(self, drained):
+        """
+        Add another process' drain() to these, record by record, as exit()
+        adds up repeats of a phase.
+        """
+        for member, phases in drained.items():
+            member_phases = self._members[member]
+            for phase, theirs in phases.items():
+                record = member_phases.get(phase)
+                if record is None:
+                    member_phases[phase] = dict(theirs)
+                    continue
+                for key, val in theirs.items():
+                    if key in ('wall', 'cpu', 'child_cpu', 'count') + SUMMED:
+                        record[key] = record.get(key, 0) + val
+                    elif key == 'peak_rss':
+                        record[key] = max(record.get(key, 0), val)
+                    elif key != 'pid':
+                        record[key] = val
+                record.setdefault('pid', theirs.get('pid'))
+
+    def report(self):
+        phases = defaultdict(dict)
+        for member_phases in self._members.values():
+            for phase, record in member_phases.items():
+                totals = phases[phase]
+                for key in ('wall', 'cpu', 'child_cpu') + SUMMED:
+                    if key in record:
+                        totals[key] = totals.get(key, 0) + record[key]
+        return {
+            'overall': {
+                'wall': time.perf_counter() - self._started,
+                'cpu': (time.process_time() + child_cpu()
+                        - self._cpu_started),
+                'peak_rss': peak_rss(),
+                'peak_rss_children': peak_rss(resource.RUSAGE_CHILDREN),
+                'phases': {phase: _with_rates(dict(totals))
+                           for phase, totals in phases.items()},
+            },
+            'members': {
+                member: {phase: _with_rates(dict(record))
+                         for phase, record in member_phases.items()}
+                for member, member_phases in self._members.items()
+            },
+        }
+
+    def close(self):
+        with open(self._out_path, 'w') as fh:
+            json.dump(self.report(), fh, indent=2)
+            fh.write('\n')
@@ -0,0 +1,104 @@
+from hashlib import sha1
+import logging
+import os
+import pickle
+import tempfile
+import time
+from zipfile import ZipInfo
+
+from csv_scanner import CSVScanner
+
+logger = logging.getLogger('csv2db')
+
+# Bump when CSVScanner's results change for the same input & settings
+CACHE_VERSION = 5
+CACHE_EXT = '.scan'
+
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+class ScanCache:
+    """
+    On-disk cache of finished CSVScanners, one pickle per entry, keyed by
+    the zip member's name, CRC and size plus the scanner settings.
+    A hit refreshes the entry's mtime, so eviction by age or total size
+    drops the least recently used entries first.
+    """
+
+    def __init__(self, cache_dir,
+                 max_age=DEFAULT_MAX_AGE,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self._cache_dir = cache_dir
+        self._max_age = max_age
+        self._max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(name, file_info: ZipInfo, scanner_kw: dict):
+        parts = (CACHE_VERSION, name, file_info.CRC, file_info.file_size,
+                 sorted(scanner_kw.items()))
+        return sha1(repr(parts).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, key + CACHE_EXT)
+
+    @staticmethod
+    def cacheable(file_info: ZipInfo):
+        return file_info.CRC is not None and file_info.file_size is not None
+
+    def get(self, name, file_info: ZipInfo, scanner_kw: dict):
+        if not self.cacheable(file_info):
+            return None
+        path = self._path(self.key(name, file_info, scanner_kw))
+        try:
+            with open(path, "rb") as fh:
+                scanner = pickle.load(fh)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError,
+                AttributeError) as e:
+            logger.warning("Dropping unreadable scan cache entry %s: %s",
+                           path, e)
+            self._remove(path)
+            return None
+        logger.debug("scan cache hit: %s", name)
+        return scanner
+
+    def put(self, name, file_info: ZipInfo, scanner_kw: dict,
+            scanner: CSVScanner):
+        if not self.cacheable(file_info):
+            return
+        path = self._path(self.key(name, file_info, scanner_kw))
+        # Write then rename, so concurrent runs never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(scanner, fh)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """ Drop expired entries, then the oldest until under max_bytes. """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            if not entry.name.endswith(CACHE_EXT):
+                continue
+            st = entry.stat()
+            if self._max_age and now - st.st_mtime > self._max_age:
+                self._remove(entry.path)
+            else:
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if not self._max_bytes or total <= self._max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
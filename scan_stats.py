@@ -0,0 +1,196 @@
+from array import array
+from typing import Dict, Iterable
+
+# Every type column_classifier.classify_value() can come up with
+TYPES = ('date', 'datetime', 'time', 'int', 'decimal', 'bool', 'none', 'str')
+TYPE_INDEX = {typ: i for i, typ in enumerate(TYPES)}
+N_TYPES = len(TYPES)
+
+MAGIC = b'CSS\x02'
+
+
+def _put_varint(out: bytearray, val):
+    while val > 0x7f:
+        out.append(val & 0x7f | 0x80)
+        val >>= 7
+    out.append(val)
+
+
+def _get_varint(data, pos):
+    val = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        val |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return val, pos
+        shift += 7
+
+
+class ScanStats:
+    """
+    Per column tallies of a scan: how many values of each type, the types
+    in the order they were first seen, the longest str value, and how many
+    values were empty; and how many rows were scanned.
+
+    Columns are numbered in the order they were first tallied, and their
+    counters live in flat arrays, N_TYPES to a column, so merge() adds up
+    partial scans, e.g. of a file's chunks, counter by counter. They
+    pickle as to_bytes(), a dozen or so bytes per column plus its name.
+    """
+    __slots__ = ('field_names', '_columns', '_counts', '_order',
+                 '_str_max_len', '_nulls', '_rows')
+
+    def __init__(self, field_names: Iterable[str] = ()):
+        self.field_names = []
+        self._columns = {}
+        self._counts = array('q')
+        # Per column & type, its rank in order of first appearance, 0 if
+        # it hasn't been seen
+        self._order = array('B')
+        self._str_max_len = array('q')
+        self._nulls = array('q')
+        self._rows = 0
+        for field_name in field_names:
+            self.column(field_name)
+
+    def column(self, field_name) -> int:
+        """ field_name's column number, adding the column if it's new. """
+        col = self._columns.get(field_name)
+        if col is None:
+            col = self._columns[field_name] = len(self.field_names)
+            self.field_names.append(field_name)
+            self._counts.extend([0] * N_TYPES)
+            self._order.extend([0] * N_TYPES)
+            self._str_max_len.append(0)
+            self._nulls.append(0)
+        return col
+
+    def add(self, field_name, type_counts: Dict[str, int],
+            str_max_len=0, nulls=0):
+        col = self.column(field_name)
+        base = col * N_TYPES
+        counts, order = self._counts, self._order
+        for typ, cnt in type_counts.items():
+            idx = base + TYPE_INDEX[typ]
+            if not order[idx]:
+                order[idx] = max(order[base:base + N_TYPES]) + 1
+            counts[idx] += cnt
+        if str_max_len > self._str_max_len[col]:
+            self._str_max_len[col] = str_max_len
+        self._nulls[col] += nulls
+
+    def add_rows(self, rows):
+        self._rows += rows
+
+    def merge(self, other: 'ScanStats'):
+        """
+        Add other's tallies to these. Columns & types new to these go after
+        the ones already here.
+        """
+        self._rows += other._rows
+        for col, field_name in enumerate(other.field_names):
+            self.add(field_name, other.type_counts(field_name),
+                     other._str_max_len[col], other._nulls[col])
+
+    def type_counts(self, field_name) -> Dict[str, int]:
+        """ Counts by type, in the order the types were first seen. """
+        col = self._columns.get(field_name)
+        if col is None:
+            return {}
+        base = col * N_TYPES
+        order = self._order[base:base + N_TYPES]
+        return {TYPES[idx]: self._counts[base + idx]
+                for idx in sorted((idx for idx in range(N_TYPES)
+                                   if order[idx]),
+                                  key=order.__getitem__)}
+
+    def count(self, field_name, typ):
+        col = self._columns.get(field_name)
+        return (0 if col is None
+                else self._counts[col * N_TYPES + TYPE_INDEX[typ]])
+
+    def str_max_len(self, field_name):
+        col = self._columns.get(field_name)
+        return 0 if col is None else self._str_max_len[col]
+
+    def nulls(self, field_name):
+        col = self._columns.get(field_name)
+        return 0 if col is None else self._nulls[col]
+
+    def as_dict(self) -> Dict[str, Dict[str, int]]:
+        return {field_name: self.type_counts(field_name)
+                for field_name in self.field_names}
+
+    @property
+    def row_count(self):
+        """ Rows scanned, as counted by add_rows() """
+        return self._rows
+
+    def to_bytes(self) -> bytes:
+        """
+        MAGIC, then the number of rows and of columns, then each column's
+        name, the types it has seen, in order, their counts, its longest str
+        and its number of empty values, all as varints but the type numbers.
+        """
+        out = bytearray(MAGIC)
+        _put_varint(out, self._rows)
+        _put_varint(out, len(self.field_names))
+        for col, field_name in enumerate(self.field_names):
+            name = field_name.encode()
+            _put_varint(out, len(name))
+            out += name
+            base = col * N_TYPES
+            seen = sorted((idx for idx in range(N_TYPES)
+                           if self._order[base + idx]),
+                          key=lambda idx: self._order[base + idx])
+            out.append(len(seen))
+            out += bytes(seen)
+            for idx in seen:
+                _put_varint(out, self._counts[base + idx])
+            _put_varint(out, self._str_max_len[col])
+            _put_varint(out, self._nulls[col])
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'ScanStats':
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not serialized ScanStats of this version")
+        stats = cls()
+        stats._rows, pos = _get_varint(data, len(MAGIC))
+        n_cols, pos = _get_varint(data, pos)
+        for _ in range(n_cols):
+            name_len, pos = _get_varint(data, pos)
+            col = stats.column(bytes(data[pos:pos + name_len]).decode())
+            pos += name_len
+            base = col * N_TYPES
+            n_seen = data[pos]
+            seen = data[pos + 1:pos + 1 + n_seen]
+            pos += 1 + n_seen
+            for rank, idx in enumerate(seen, 1):
+                stats._order[base + idx] = rank
+                stats._counts[base + idx], pos = _get_varint(data, pos)
+            stats._str_max_len[col], pos = _get_varint(data, pos)
+            stats._nulls[col], pos = _get_varint(data, pos)
+        return stats
+
+    def __reduce__(self):
+        # Pickles, e.g. to & from pool workers and the scan cache, as
+        # to_bytes()
+        return _from_bytes, (self.to_bytes(),)
+
+    def __eq__(self, other):
+        if not isinstance(other, ScanStats):
+            return NotImplemented
+        return (self._rows == other._rows
+                and self.as_dict() == other.as_dict()
+                and all(self.str_max_len(name) == other.str_max_len(name)
+                        and self.nulls(name) == other.nulls(name)
+                        for name in self.field_names))
+
+    def __repr__(self):
+        return f"ScanStats({self.as_dict()!r})"
+
+
+def _from_bytes(data):
+    return ScanStats.from_bytes(data)
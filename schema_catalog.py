@@ -0,0 +1,230 @@
+from collections.abc import Mapping
+from datetime import datetime, timezone
+import json
+import logging
+import sqlite3
+from typing import Dict, Iterator
+from zipfile import ZipInfo
+
+from csv_scanner import CSVScanner
+from value_sketch import KMVSketch
+
+logger = logging.getLogger('csv2db')
+
+# Kept in the catalog's PRAGMA user_version; bump when its tables change
+CATALOG_VERSION = 1
+
+# What every SQLite file starts with, to tell a catalog from a pickle
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+# --save-struct paths ending so get the pickled dict of old
+LEGACY_EXTS = ('.pkl', '.pickle')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    table_name TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    member TEXT NOT NULL,
+    crc INTEGER,
+    file_size INTEGER,
+    row_count INTEGER NOT NULL,
+    full_scan INTEGER NOT NULL,
+    create_sql TEXT NOT NULL,
+    scanned_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS columns (
+    table_name TEXT NOT NULL REFERENCES tables ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    column_name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    str_len INTEGER,
+    type_counts TEXT NOT NULL,
+    nulls INTEGER NOT NULL,
+    distinct_count INTEGER,
+    distinct_exact INTEGER,
+    is_unique INTEGER,
+    sketch BLOB,
+    PRIMARY KEY (table_name, position)
+) WITHOUT ROWID;
+"""
+
+
+def is_catalog(path):
+    """ Whether path is a SQLite file, rather than a --save-struct pickle """
+    with open(path, 'rb') as fh:
+        return fh.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+def struct_type(typ, str_len):
+    """ A column's type as --save-struct has always put it, e.g. str(12) """
+    return f"{typ}({str_len})" if str_len else typ
+
+
+class _TableMap(Mapping):
+    """ Table name -> what get(table) returns, each read when first asked """
+
+    def __init__(self, get, names):
+        self._get = get
+        self._names = names
+        self._known = set(names)
+        self._got = {}
+
+    def __getitem__(self, table_name):
+        if table_name not in self._got:
+            if table_name not in self._known:
+                raise KeyError(table_name)
+            self._got[table_name] = self._get(table_name)
+        return self._got[table_name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+class SchemaCatalog:
+    """
+    What --save-struct records of each scanned table, in a small SQLite
+    file: where the table came from & that member's CRC, its CREATE TABLE,
+    and per column its type, type counts, empties, distinct count & sketch.
+
+    Each table is written in its own transaction as soon as its member's
+    scanned, replacing what an earlier run said about a table of the same
+    name, so a catalog grows across runs & archives, and an interrupted
+    run keeps what it finished. Readers query one table at a time; nothing
+    in it is pickled.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._con = sqlite3.connect(path, isolation_level=None)
+        version, = self._con.execute("PRAGMA user_version").fetchone()
+        if version not in (0, CATALOG_VERSION):
+            self._con.close()
+            raise ValueError(f"{path} is a version {version} schema "
+                             f"catalog, not {CATALOG_VERSION}")
+        self._con.execute("PRAGMA foreign_keys = ON")
+        self._con.executescript(SCHEMA)
+        self._con.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+
+    def close(self):
+        self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def put(self, table_name, source_name, member, file_info: ZipInfo,
+            ss: CSVScanner):
+        """ Record table_name's scan, replacing any earlier one. """
+        fields = list(ss.result())
+        stats, sketches, counters = ss.scan_stats, ss.sketches, ss.distinct
+        rows = []
+        for position, (fname, typ, str_len) in enumerate(fields):
+            sketch, counter = sketches.get(fname), counters.get(fname)
+            rows.append((
+                table_name, position, fname, typ, str_len,
+                json.dumps(stats.type_counts(fname)), stats.nulls(fname),
+                *((counter.distinct(), counter.exact, counter.unique)
+                  if counter else (None, None, None)),
+                None if sketch is None else sketch.to_bytes()))
+        self._con.execute("BEGIN IMMEDIATE")
+        try:
+            self._con.execute(
+                "DELETE FROM tables WHERE table_name = ?", (table_name,))
+            self._con.execute(
+                "INSERT INTO tables VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (table_name, source_name, member, file_info.CRC,
+                 file_info.file_size, ss.row_count, ss.full_scan,
+                 ss.sql_create_table(table_name),
+                 datetime.now(timezone.utc).isoformat()))
+            self._con.executemany(
+                "INSERT INTO columns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            self._con.execute("COMMIT")
+        except BaseException:
+            self._con.execute("ROLLBACK")
+            raise
+
+    def merge(self, other_path):
+        """
+        Copy in every table of another catalog, e.g. another archive's,
+        replacing those of the same name here.
+        """
+        if not is_catalog(other_path):
+            raise ValueError(f"{other_path} isn't a schema catalog")
+        self._con.execute("ATTACH DATABASE ? AS other", (other_path,))
+        try:
+            version, = self._con.execute(
+                "PRAGMA other.user_version").fetchone()
+            if version != CATALOG_VERSION:
+                raise ValueError(f"{other_path} is a version {version} "
+                                 f"schema catalog, not {CATALOG_VERSION}")
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                self._con.execute(
+                    "DELETE FROM tables WHERE table_name IN "
+                    "(SELECT table_name FROM other.tables)")
+                self._con.execute(
+                    "INSERT INTO tables SELECT * FROM other.tables")
+                self._con.execute(
+                    "INSERT INTO columns SELECT * FROM other.columns")
+                self._con.execute("COMMIT")
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+        finally:
+            self._con.execute("DETACH DATABASE other")
+
+    def table_names(self):
+        return [name for name, in self._con.execute(
+            "SELECT table_name FROM tables ORDER BY table_name")]
+
+    def source_of(self, table_name):
+        """ (source, member, crc, file_size) table_name was scanned from """
+        return self._con.execute(
+            "SELECT source, member, crc, file_size FROM tables "
+            "WHERE table_name = ?", (table_name,)).fetchone()
+
+    def _columns(self, table_name, *names) -> Iterator[tuple]:
+        return self._con.execute(
+            f"SELECT column_name, {', '.join(names)} FROM columns "
+            "WHERE table_name = ? ORDER BY position", (table_name,))
+
+    def struct(self, table_name) -> Dict[str, str]:
+        """ table_name's columns & types, as the legacy structs have them """
+        return {fname: struct_type(typ, str_len)
+                for fname, typ, str_len in self._columns(
+                    table_name, 'type', 'str_len')}
+
+    def sketches(self, table_name) -> Dict[str, KMVSketch]:
+        return {fname: KMVSketch.from_bytes(sketch)
+                for fname, sketch in self._columns(table_name, 'sketch')
+                if sketch is not None}
+
+    def type_counts(self, table_name) -> Dict[str, Dict[str, int]]:
+        return {fname: json.loads(counts)
+                for fname, counts in self._columns(
+                    table_name, 'type_counts')}
+
+    def distinct(self, table_name) -> Dict[str, dict]:
+        return {fname: {'distinct': count, 'exact': bool(exact),
+                        'unique': bool(unique)}
+                for fname, count, exact, unique in self._columns(
+                    table_name, 'distinct_count', 'distinct_exact',
+                    'is_unique')
+                if count is not None}
+
+    def structs(self) -> Mapping:
+        """ Every table's struct(), each read when it's first looked up """
+        return _TableMap(self.struct, self.table_names())
+
+    def all_sketches(self) -> Mapping:
+        """ Every sketched table's sketches(), read as they're looked up """
+        return _TableMap(self.sketches, [
+            name for name, in self._con.execute(
+                "SELECT DISTINCT table_name FROM columns "
+                "WHERE sketch IS NOT NULL ORDER BY table_name")])
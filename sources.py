@@ -0,0 +1,305 @@
+from abc import ABC, abstractmethod
+import bz2
+import gzip
+import lzma
+import os
+import re
+import struct
+import sys
+import tarfile
+import zipfile
+from zlib import crc32
+
+try:
+    import zstandard
+except ImportError:  # only needed for .tar.zst
+    zstandard = None
+
+from stored_member_reader import (
+    StoredMemberReader, is_stored, member_data_offset)
+
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+TAR_RX = re.compile(r'.*\.(tar|tgz|tbz2?|txz|tar\.(gz|bz2|xz|zst))$', re.I)
+
+STDIN = '-'
+STDIN_MEMBER = 'stdin.csv'
+
+
+class MemberInfo:
+    """
+    The parts of a ZipInfo the rest of csv2db relies on, for members of
+    other sources. file_size is None when it can't be known up front; CRC
+    is a fingerprint of the member's size & mtime, or None if there's
+    nothing to tell one version from the next, e.g. for stdin.
+    """
+    __slots__ = ('filename', 'file_size', 'CRC', 'path')
+
+    def __init__(self, filename, file_size=None, CRC=None, path=None):
+        self.filename = filename
+        self.file_size = file_size
+        self.CRC = CRC
+        self.path = path
+
+    def __repr__(self):
+        return (f"MemberInfo({self.filename!r}, file_size={self.file_size},"
+                f" CRC={self.CRC})")
+
+
+def fingerprint(*parts):
+    return crc32(repr(parts).encode())
+
+
+def _member_name(path):
+    # Name a member by what it decompresses to, e.g. a.csv for a.csv.gz
+    root, ext = os.path.splitext(path)
+    return root if ext.lower() in COMPRESSED_OPENERS else path
+
+
+def _open_file(path):
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(path)[1].lower())
+    return opener(path, 'rb') if opener else open(path, 'rb')
+
+
+def _gzip_size(path, compressed_size):
+    # A gzip's trailer holds its size mod 2**32; trust it unless it
+    # evidently wrapped around, i.e. it's less than deflate could have
+    # stored incompressible data in, header & stored block overheads aside
+    with open(path, 'rb') as fh:
+        fh.seek(-4, os.SEEK_END)
+        size, = struct.unpack('<I', fh.read(4))
+    return size if size + size // 1000 + 1024 >= compressed_size else None
+
+
+def _file_extent(file_info: MemberInfo):
+    if os.path.splitext(file_info.path)[1].lower() in COMPRESSED_OPENERS:
+        return None
+    return file_info.path, 0, file_info.file_size
+
+
+def _file_info(path, name):
+    st = os.stat(path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in COMPRESSED_OPENERS:
+        size = st.st_size
+    elif ext == '.gz' and st.st_size >= 18:
+        size = _gzip_size(path, st.st_size)
+    else:
+        size = None
+    return MemberInfo(name, size, fingerprint(st.st_size, st.st_mtime_ns),
+                      path)
+
+
+class Source(ABC):
+    """
+    Somewhere csv files come from, as a series of members, each opened as
+    a binary stream that's decompressed as it's read.
+
+    A streaming source, like a tar read from start to end or stdin, can
+    only open the member members() has just yielded, and only once.
+    Other sources can open any member, any number of times, and can be
+    reopened by pool workers.
+    """
+    streaming = False
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def name(self):
+        return os.path.basename(self.path.rstrip(os.sep)) or self.path
+
+    @abstractmethod
+    def members(self):
+        """ Yields a MemberInfo, or a ZipInfo, per csv file. """
+
+    @abstractmethod
+    def open(self, member):
+        """ A binary stream of member's decompressed bytes. """
+
+    def open_for_import(self, file_info):
+        return self.open(file_info)
+
+    def extent(self, file_info):
+        """
+        (path, offset, size) of a member's bytes, if they're in a file as
+        they are, uncompressed, so they can be mapped & read at random.
+        """
+        return None
+
+    def reopen(self):
+        """ A fresh instance, e.g. for a pool worker to read with. """
+        return type(self)(self.path)
+
+    def close(self):
+        pass
+
+    def __reduce__(self):
+        return type(self), (self.path,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ZipSource(Source):
+    def __init__(self, path):
+        super().__init__(path)
+        self._zip = zipfile.ZipFile(path, "r")
+
+    def members(self):
+        return [info for info in self._zip.infolist() if not info.is_dir()]
+
+    def open(self, member):
+        return self._zip.open(member)
+
+    def open_for_import(self, file_info):
+        # Stored members are read straight out of the archive file, which
+        # lets the transfer to sqlite3 use sendfile()
+        if is_stored(file_info):
+            return StoredMemberReader(self.path, file_info)
+        return self._zip.open(file_info)
+
+    def extent(self, file_info):
+        if not is_stored(file_info):
+            return None
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            return (self.path, member_data_offset(fd, file_info),
+                    file_info.file_size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self._zip.close()
+
+
+class DirectorySource(Source):
+    """ Every file under a directory, decompressing .gz, .bz2 & .xz """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._infos = None
+
+    def members(self):
+        if self._infos is None:
+            self._infos = {}
+            for root, dirs, files in os.walk(self.path):
+                dirs.sort()
+                for fname in sorted(files):
+                    path = os.path.join(root, fname)
+                    name = _member_name(
+                        os.path.relpath(path, self.path).replace(os.sep, '/'))
+                    self._infos[name] = _file_info(path, name)
+        return list(self._infos.values())
+
+    def open(self, member):
+        if isinstance(member, str):
+            self.members()
+            member = self._infos[member]
+        return _open_file(member.path)
+
+    def extent(self, file_info):
+        return _file_extent(file_info)
+
+
+class FileSource(Source):
+    """ A single csv file, maybe compressed """
+
+    def members(self):
+        return [_file_info(self.path,
+                           _member_name(os.path.basename(self.path)))]
+
+    def open(self, member):
+        return _open_file(self.path)
+
+    def extent(self, file_info):
+        return _file_extent(file_info)
+
+
+class TarSource(Source):
+    """
+    A tar, optionally compressed, read as a stream from start to end, so
+    each member is decompressed just once, and the tar can be a pipe.
+    """
+    streaming = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._current = None
+
+    def _open_stream(self):
+        fh = open(self.path, 'rb')
+        if self.path.lower().endswith('.zst'):
+            if zstandard is None:
+                fh.close()
+                raise ValueError(
+                    f"{self.path}: reading .zst needs the zstandard package")
+            return fh, tarfile.open(
+                fileobj=zstandard.ZstdDecompressor().stream_reader(fh),
+                mode='r|')
+        return fh, tarfile.open(fileobj=fh, mode='r|*')
+
+    def members(self):
+        fh, tar = self._open_stream()
+        try:
+            for tarinfo in tar:
+                if not tarinfo.isfile():
+                    continue
+                self._current = (tarinfo.name, tar.extractfile(tarinfo))
+                yield MemberInfo(tarinfo.name, tarinfo.size,
+                                 fingerprint(tarinfo.size, tarinfo.mtime))
+        finally:
+            self._current = None
+            tar.close()
+            fh.close()
+
+    def open(self, member):
+        name = getattr(member, 'filename', member)
+        if not self._current or self._current[0] != name:
+            raise ValueError(f"{self.path} is read as a stream; only its "
+                             f"current member can be opened, not {name}")
+        _, fh = self._current
+        self._current = None
+        return fh
+
+
+class StdinSource(Source):
+    """ One csv file, read from stdin """
+    streaming = True
+
+    def __init__(self, path=STDIN):
+        super().__init__(path)
+        self._opened = False
+
+    @property
+    def name(self):
+        return 'stdin'
+
+    def members(self):
+        return [MemberInfo(STDIN_MEMBER)]
+
+    def open(self, member):
+        if self._opened:
+            raise ValueError("stdin can only be read once")
+        self._opened = True
+        return sys.stdin.buffer
+
+
+def open_source(spec) -> Source:
+    """ The Source for a path: a zip, tar, directory, csv file, or - """
+    if spec == STDIN:
+        return StdinSource()
+    if os.path.isdir(spec):
+        return DirectorySource(spec)
+    if TAR_RX.match(spec):
+        return TarSource(spec)
+    if zipfile.is_zipfile(spec):
+        return ZipSource(spec)
+    return FileSource(spec)
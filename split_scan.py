@@ -0,0 +1,130 @@
+from io import RawIOBase
+import mmap
+from typing import List, Tuple
+
+QUOTE = b'"'
+NEWLINE = b'\n'
+
+# Bytes of a chunk counted for quotes at a time
+COUNT_BLOCK = 2 ** 24
+
+Span = Tuple[int, int]
+
+
+def map_file(path):
+    """ A read-only mmap of the whole of path. """
+    with open(path, 'rb') as fh:
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def count_quotes(buf, start, end):
+    count = 0
+    for pos in range(start, end, COUNT_BLOCK):
+        count += buf[pos:min(pos + COUNT_BLOCK, end)].count(QUOTE)
+    return count
+
+
+def count_quotes_in_file(path, start, end):
+    """ count_quotes() for a pool worker, which maps path itself. """
+    with map_file(path) as buf:
+        return count_quotes(buf, start, end)
+
+
+def record_start(buf, pos, quoted, end):
+    """
+    Offset of the first record to start after pos, i.e. just past the first
+    newline that isn't inside a quoted field, given whether pos itself is
+    inside one, or end if there's none.
+
+    In a csv file that quotes fields the RFC 4180 way, quotes pair up, with
+    "" inside a quoted field counting as a pair, so whether a byte is inside
+    a quoted field only depends on the parity of the quotes before it.
+    """
+    while pos < end:
+        quote = buf.find(QUOTE, pos, end)
+        if not quoted:
+            newline = buf.find(NEWLINE, pos, end)
+            if newline < 0:
+                return end
+            if quote < 0 or newline < quote:
+                return newline + 1
+        if quote < 0:
+            return end
+        quoted = not quoted
+        pos = quote + 1
+    return end
+
+
+def split_points(offset, size, chunk_bytes) -> List[int]:
+    """ Where to cut offset..offset+size into chunks, boundaries aside. """
+    chunks = max(1, -(-size // max(1, chunk_bytes)))
+    step = -(-size // chunks)
+    return [offset + i * step for i in range(1, chunks)]
+
+
+def chunk_spans(buf, offset, size, points, quote_counts) -> List[Span]:
+    """
+    Byte spans of the chunks of offset..offset+size, cut at the first
+    record to start after each of points. quote_counts[i] is the number of
+    quotes from the point before points[i], or offset, up to points[i].
+    """
+    end = offset + size
+    starts = [offset]
+    quotes = 0
+    for point, count in zip(points, quote_counts):
+        quotes += count
+        start = record_start(buf, point, quotes % 2 == 1, end)
+        if start > starts[-1]:
+            starts.append(start)
+    starts.append(end)
+    return [(start, stop) for start, stop in zip(starts, starts[1:])
+            if stop > start]
+
+
+class SpanReader(RawIOBase):
+    """
+    Reads the given byte spans of a file one after the other, as if they
+    were one file, e.g. a csv file's header followed by one of its chunks.
+    """
+
+    def __init__(self, path, spans: List[Span]):
+        self._buf = map_file(path)
+        self._spans = list(spans)
+        self._span = 0
+        self._pos = self._spans[0][0] if self._spans else 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while self._span < len(self._spans):
+            end = self._spans[self._span][1]
+            want = min(len(buf), end - self._pos)
+            if want > 0:
+                buf[:want] = self._buf[self._pos:self._pos + want]
+                self._pos += want
+                return want
+            self._span += 1
+            if self._span < len(self._spans):
+                self._pos = self._spans[self._span][0]
+        return 0
+
+    def close(self):
+        if not self.closed:
+            self._buf.close()
+        super().close()
+
+
+def header_span(buf, offset, size) -> Span:
+    """ The span of a csv file's header row, quoted newlines and all. """
+    return offset, record_start(buf, offset, False, offset + size)
+
+
+def chunk_reads(buf, offset, size, spans: List[Span]) -> List[List[Span]]:
+    """
+    What to read for each chunk: the first reads the start of the file, the
+    others the header row, then their own span.
+    """
+    header = header_span(buf, offset, size)
+    return [[span] if span[0] == offset else [header, span]
+            for span in spans]
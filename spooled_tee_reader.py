@@ -0,0 +1,36 @@
+from io import RawIOBase, BufferedIOBase
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+
+# Spool this much of a member in memory before rolling over to a temp file
+SPOOL_MAX_MEM = 64 * 2 ** 20
+
+
+class SpooledTeeReader(RawIOBase):
+    """
+    Reads from source, keeping a copy of every byte read in a spooled
+    temporary file, so a decompressed zip member can be consumed twice
+    while only being inflated once.
+    """
+
+    def __init__(self, source: BufferedIOBase, max_mem=SPOOL_MAX_MEM):
+        self._source = source
+        self._spool = SpooledTemporaryFile(max_size=max_mem)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = self._source.readinto(buf)
+        if n:
+            self._spool.write(memoryview(buf)[:n])
+        return n
+
+    def spooled(self) -> SpooledTemporaryFile:
+        """
+        Copy whatever of the source hasn't been read yet into the spool,
+        then return the spool rewound to its start.
+        """
+        copyfileobj(self._source, self._spool)
+        self._spool.seek(0)
+        return self._spool
@@ -0,0 +1,106 @@
+import codecs
+import csv
+from io import StringIO
+from itertools import islice
+import logging
+import sqlite3
+import time
+from zipfile import ZipInfo
+
+from csv_scanner import CSVScanner
+from pipeline_hooks import phase
+
+logger = logging.getLogger('csv2db')
+
+# Bytes of csv_fh decoded at a time, and rows handed to each executemany()
+LOAD_BLOCK_SIZE = 2 ** 22
+INSERT_BATCH_ROWS = 50000
+
+# Nothing else is reading the db while a table is being bulk loaded, so
+# trade durability for speed for the connection doing the load. The journal
+# is kept in memory rather than turned off, so a failed load still rolls back
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # KiB, i.e. 256MB
+)
+
+
+def iter_text_lines(csv_fh, encoding='utf-8', block_size=LOAD_BLOCK_SIZE):
+    """
+    Decode a binary file handle into lines for csv.reader, reading
+    block_size bytes at a time.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ''
+    while block := csv_fh.read(block_size):
+        text = tail + decoder.decode(block)
+        cut = text.rfind('\n') + 1
+        tail = text[cut:]
+        yield from StringIO(text[:cut], newline='')
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _fit_rows(rows, width):
+    # Pad short rows with NULLs and drop extra values, as sqlite3's .import
+    # does, rather than letting executemany() reject the batch
+    for row in rows:
+        if not row:
+            continue
+        if len(row) != width:
+            row = (row + [None] * width)[:width]
+        yield row
+
+
+def import_sqlite_inproc(
+        db_path, scanner: CSVScanner, table_name, csv_fh,
+        file_info: ZipInfo,
+        create_only: bool = False):
+    """
+    In-process counterpart to csv2db.create_import_sqlite, taking the same
+    arguments: creates the table, then bulk inserts csv_fh's rows through
+    the sqlite3 module, in one transaction.
+
+    csv_fh must be positioned past the header row.
+    """
+    member = file_info.filename if file_info else table_name
+    con = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        for pragma in BULK_LOAD_PRAGMAS:
+            con.execute(pragma)
+        with phase(member, 'create'):
+            con.execute(scanner.sql_create_table(table_name))
+        logger.debug("sqlite: created table %s", table_name)
+
+        if create_only:
+            return
+
+        width = len(list(scanner.result()))
+        insert_sql = (f"INSERT INTO {table_name} "
+                      f"VALUES ({', '.join('?' * width)})")
+        rows = _fit_rows(csv.reader(iter_text_lines(csv_fh)), width)
+        row_count = 0
+        started = time.perf_counter()
+        with phase(member, 'import') as info:
+            start_pos = csv_fh.tell()
+            con.execute("BEGIN")
+            try:
+                while batch := list(islice(rows, INSERT_BATCH_ROWS)):
+                    con.executemany(insert_sql, batch)
+                    row_count += len(batch)
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            info.update(rows=row_count, bytes=csv_fh.tell() - start_pos)
+        elapsed = time.perf_counter() - started
+        logger.info("sqlite: loaded %s, %d rows in %.2fs (%.0f rows/s)",
+                    table_name, row_count, elapsed,
+                    row_count / max(elapsed, 1e-9))
+    finally:
+        con.close()
+        if csv_fh:
+            csv_fh.close()
@@ -0,0 +1,81 @@
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Callable
+from zipfile import ZipInfo
+
+from csv_scanner import CSVScanner
+from pipeline_hooks import phase
+
+logger = logging.getLogger('csv2db')
+
+
+class StagedLoad:
+    """
+    Loads each table into a SQLite file of its own, so several can be
+    loaded at once by pool workers, then merges them one at a time into
+    db_path, SQLite's single writer.
+
+    loader is one of csv2db.LOADERS. The staging files live beside db_path,
+    so they're on the same filesystem, and go away on close().
+    """
+
+    def __init__(self, db_path, loader: Callable):
+        self.db_path = db_path
+        self._loader = loader
+        self._stage_dir = tempfile.mkdtemp(
+            prefix='.csv2db-stage-',
+            dir=os.path.dirname(os.path.abspath(db_path)))
+
+    def stage_path(self, table_name):
+        return os.path.join(self._stage_dir, f"{table_name}.db")
+
+    def load(self, scanner: CSVScanner, table_name, csv_fh,
+             file_info: ZipInfo):
+        """ Load csv_fh into table_name's staging db; runs in a worker. """
+        path = self.stage_path(table_name)
+        if os.path.exists(path):
+            os.remove(path)
+        self._loader(path, scanner=scanner, table_name=table_name,
+                     csv_fh=csv_fh, file_info=file_info)
+
+    def merge(self, table_name, member=None):
+        """
+        Copy table_name from its staging db into db_path, as created there.
+        INSERT INTO ... SELECT * between tables of the same schema, into an
+        empty one, lets SQLite copy the b-tree content rather than re-insert
+        row by row.
+        """
+        path = self.stage_path(table_name)
+        con = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            with phase(member or table_name, 'merge') as info:
+                started = time.perf_counter()
+                con.execute("ATTACH DATABASE ? AS stage", (path,))
+                create_sql, = con.execute(
+                    "SELECT sql FROM stage.sqlite_master "
+                    "WHERE type = 'table' AND name = ?",
+                    (table_name,)).fetchone()
+                con.execute("BEGIN IMMEDIATE")
+                try:
+                    con.execute(create_sql)
+                    rows = con.execute(
+                        f"INSERT INTO main.{table_name} "
+                        f"SELECT * FROM stage.{table_name}").rowcount
+                    con.execute("COMMIT")
+                except BaseException:
+                    con.execute("ROLLBACK")
+                    raise
+                con.execute("DETACH DATABASE stage")
+                info['rows'] = rows
+            logger.info("merged %s: %d rows in %.2fs", table_name, rows,
+                        time.perf_counter() - started)
+        finally:
+            con.close()
+            os.remove(path)
+
+    def close(self):
+        shutil.rmtree(self._stage_dir, ignore_errors=True)
@@ -0,0 +1,90 @@
+from io import RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
+import os
+import struct
+from zipfile import ZipInfo, ZIP_STORED
+
+# Local file header: signature, then fixed fields up to the name & extra
+# field lengths, which are the last two of its 30 bytes
+LOCAL_HEADER = struct.Struct("<4s22xHH")
+LOCAL_HEADER_SIG = b"PK\x03\x04"
+
+READLINE_CHUNK = 2 ** 16
+
+
+def is_stored(file_info: ZipInfo):
+    return (file_info.compress_type == ZIP_STORED
+            and not file_info.flag_bits & 0x1)  # not encrypted
+
+
+def member_data_offset(fd, file_info: ZipInfo):
+    """ Byte offset of a member's data within the archive file. """
+    header = os.pread(fd, LOCAL_HEADER.size, file_info.header_offset)
+    sig, name_len, extra_len = LOCAL_HEADER.unpack(header)
+    if sig != LOCAL_HEADER_SIG:
+        raise ValueError(f"Bad local header for {file_info.filename}")
+    return file_info.header_offset + LOCAL_HEADER.size + name_len + extra_len
+
+
+class StoredMemberReader(RawIOBase):
+    """
+    Reads an uncompressed (ZIP_STORED) member straight out of the archive
+    file, bypassing ZipExtFile, and exposes the file descriptor and byte
+    span underneath it, so the member can be handed to os.sendfile().
+    The member's CRC isn't checked.
+    """
+
+    def __init__(self, zip_filename, file_info: ZipInfo):
+        self._fd = os.open(zip_filename, os.O_RDONLY)
+        self._start = member_data_offset(self._fd, file_info)
+        self._size = file_info.file_size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._fd
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=SEEK_SET):
+        base = {SEEK_SET: 0, SEEK_CUR: self._pos, SEEK_END: self._size}
+        self._pos = min(max(0, base[whence] + offset), self._size)
+        return self._pos
+
+    def readinto(self, buf):
+        want = min(len(buf), self._size - self._pos)
+        data = os.pread(self._fd, want, self._start + self._pos)
+        buf[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def readline(self, limit=-1):
+        line = bytearray()
+        while limit < 0 or len(line) < limit:
+            chunk = os.pread(self._fd, READLINE_CHUNK,
+                             self._start + self._pos)
+            chunk = chunk[:self._size - self._pos]
+            if not chunk:
+                break
+            end = chunk.find(b"\n") + 1 or len(chunk)
+            if limit >= 0:
+                end = min(end, limit - len(line))
+            line += chunk[:end]
+            self._pos += end
+            if line.endswith(b"\n"):
+                break
+        return bytes(line)
+
+    def data_span(self):
+        """ (fd, absolute offset of the current position, bytes left) """
+        return self._fd, self._start + self._pos, self._size - self._pos
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
@@ -0,0 +1,53 @@
+from io import BytesIO, StringIO
+from multiprocessing import get_context
+from unittest import TestCase
+
+from archive_progress import ArchiveProgress
+from bytes_io_progress_wrapper import BytesIOProgressWrapper
+
+data = b"".join(b"%05d,abc\n" % i for i in range(1000))
+
+
+def _read_all(progress, name):
+    wrapper = BytesIOProgressWrapper(
+        BytesIO(data), file_len=len(data), object_name=name,
+        every_pct=1, callback=progress.callback('scan'))
+    while wrapper.readline():
+        pass
+
+
+class TestArchiveProgress(TestCase):
+    def test_callback_counts_deltas_per_member(self):
+        progress = ArchiveProgress('a.zip', 2 * len(data))
+        report = progress.callback('scan')
+        report('one', 10, 100, len(data))
+        report('two', 10, 300, len(data))
+        report('one', 20, 250, len(data))
+        self.assertEqual(progress.done('scan'), 550)
+        self.assertEqual(progress.done('load'), 0)
+
+    def test_finish_credits_the_unread_rest(self):
+        progress = ArchiveProgress('a.zip', len(data), phases=('scan',))
+        progress.callback('scan')('one', 1, 100, len(data))
+        progress.finish('scan', 'one', len(data))
+        self.assertEqual(progress.done(), progress.total)
+
+    def test_sums_across_processes(self):
+        progress = ArchiveProgress('a.zip', 2 * len(data), phases=('scan',))
+        ctx = get_context('fork')
+        workers = [ctx.Process(target=_read_all, args=(progress, name))
+                   for name in ('one', 'two')]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(progress.done(), 2 * len(data))
+
+    def test_reports_overall_percent_on_stop(self):
+        progress_fh = StringIO()
+        with ArchiveProgress('a.zip', len(data), progress_fh=progress_fh,
+                             every_secs=60) as progress:
+            _read_all(progress, 'one')
+        self.assertRegex(progress_fh.getvalue(),
+                         r"^\ra.zip: 50% of [\d.]+ MB \(scan 100%, load 0%\)"
+                         r" - [\d.,]+ MB/s, ETA \d+:\d\d\n$")
@@ -0,0 +1,103 @@
+import asyncio
+from io import BytesIO, StringIO
+import os
+from shutil import which
+import sqlite3
+import tempfile
+from unittest import TestCase, skipUnless
+
+from async_pipeline import AsyncPipeline, import_sqlite_async, transfer_async
+from csv_scanner import CSVScanner
+from test_fifo_transfer import PipeSink, sample_data
+
+
+class TestTransferAsync(TestCase):
+    def transfer(self, csv_fh):
+        sink = PipeSink()
+        fd = sink.write_fh.fileno()
+        os.set_blocking(fd, False)
+        # A pipe smaller than the data, so the writes have to wait on it
+        done = asyncio.run(transfer_async(fd, csv_fh, buf_size=4096))
+        return sink.collected(), done
+
+    def test_copies_into_a_full_pipe(self):
+        data, done = self.transfer(BytesIO(sample_data))
+        self.assertEqual(data, sample_data)
+        self.assertEqual((done.method, done.nbytes),
+                         ('copy', len(sample_data)))
+
+    def test_sends_files(self):
+        with tempfile.TemporaryFile() as fh:
+            fh.write(sample_data)
+            fh.seek(0)
+            header = fh.readline()
+            data, done = self.transfer(fh)
+            self.assertEqual(data, sample_data[len(header):])
+            self.assertEqual(done.method, 'sendfile')
+            self.assertEqual(fh.tell(), len(sample_data))
+
+
+class Spool(BytesIO):
+    closed_spools = []
+
+    def close(self):
+        self.closed_spools.append(self)
+        super().close()
+
+
+class TestAsyncPipeline(TestCase):
+    def setUp(self) -> None:
+        self.loaded = []
+        Spool.closed_spools = []
+
+    def inflate(self, name, table_name, file_info):
+        return Spool(name.encode())
+
+    def scan(self, name, table_name, file_info, spool):
+        if name == 'bad':
+            raise ValueError(name)
+        return name.upper()
+
+    async def load(self, name, table_name, file_info, ss, spool):
+        await asyncio.sleep(0)
+        self.loaded.append((name, ss, spool.getvalue()))
+
+    def members(self, *names):
+        return [(name, name, None) for name in names]
+
+    def test_loads_in_order(self):
+        AsyncPipeline(self.inflate, self.scan, self.load).run(
+            self.members('a', 'b', 'c'))
+        self.assertEqual(self.loaded, [('a', 'A', b'a'), ('b', 'B', b'b'),
+                                       ('c', 'C', b'c')])
+        self.assertEqual(len(Spool.closed_spools), 3)
+
+    def test_failures_stop_it_and_close_spools(self):
+        with self.assertRaises(ValueError):
+            AsyncPipeline(self.inflate, self.scan, self.load).run(
+                self.members('a', 'bad', 'c', 'd'))
+        self.assertEqual(self.loaded[:1], [('a', 'A', b'a')])
+        self.assertNotIn('bad', [name for name, _, _ in self.loaded])
+        self.assertTrue(all(spool.closed for spool in Spool.closed_spools))
+
+
+@skipUnless(which('sqlite3'), "needs the sqlite3 CLI")
+class TestImportSqliteAsync(TestCase):
+    def test_imports(self):
+        text = "id,name\n" + "".join(f"{i},n{i}\n" for i in range(1000))
+        scanner = CSVScanner(StringIO(text), 't')
+        scanner.scan()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, 't.db')
+            csv_fh = BytesIO(text.encode())
+            csv_fh.readline()
+            asyncio.run(import_sqlite_async(
+                db_path, scanner=scanner, table_name='t', csv_fh=csv_fh,
+                file_info=None))
+            con = sqlite3.connect(db_path)
+            try:
+                self.assertEqual(
+                    con.execute("SELECT count(*), max(id) FROM t").fetchone(),
+                    (1000, 999))
+            finally:
+                con.close()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+from unittest import TestCase
+import zipfile
+
+from benchmark import make_corpus, bench_scan
+
+
+class TestBenchmarkCorpus(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _corpus(self, fname, **kw):
+        path = os.path.join(self.tmpdir.name, fname)
+        make_corpus(path, tables=2, rows=200, width=5, **kw)
+        with zipfile.ZipFile(path) as zip:
+            return path, {info.filename: zip.read(info)
+                          for info in zip.infolist()}
+
+    def test_same_seed_same_data(self):
+        _, first = self._corpus('a.zip', seed=7)
+        _, second = self._corpus('b.zip', seed=7, compression='stored')
+        _, other = self._corpus('c.zip', seed=8)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_scan_counts_every_row(self):
+        path, members = self._corpus('a.zip', newline_frac=0.1,
+                                     quoting='all')
+        results = bench_scan(path)
+        self.assertEqual([r['member'] for r in results], list(members))
+        self.assertEqual([r['rows'] for r in results], [200, 100])
+
+    def test_unknown_type_rejected(self):
+        with self.assertRaises(ValueError):
+            self._corpus('a.zip', type_mix='int=1,uuid=2')
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from chrome_trace import ChromeTrace
+import pipeline_hooks
+from pipeline_hooks import phase
+
+
+class TestChromeTrace(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.out_path = os.path.join(self.tmpdir.name, 'trace.json')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _events(self):
+        with open(self.out_path) as fh:
+            return json.load(fh)['traceEvents']
+
+    def test_nested_phases_and_threads(self):
+        def scan():
+            with phase('b.csv', 'scan'):
+                pass
+
+        with pipeline_hooks.install(ChromeTrace(self.out_path)):
+            with phase('a.csv', 'import') as info:
+                with phase('a.csv', 'transfer', buf_size=4096):
+                    pass
+                info['bytes'] = 10
+            thread = threading.Thread(target=scan, name='scanner')
+            thread.start()
+            thread.join()
+
+        spans = {e['name']: e for e in self._events() if e['ph'] == 'X'}
+        self.assertEqual(set(spans), {'import', 'transfer', 'scan'})
+        outer, inner = spans['import'], spans['transfer']
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'],
+                                inner['ts'] + inner['dur'])
+        self.assertEqual(outer['args'], {'member': 'a.csv', 'bytes': 10})
+        self.assertEqual(inner['args']['buf_size'], 4096)
+        self.assertNotEqual(spans['scan']['tid'], outer['tid'])
+        thread_names = {e['args']['name'] for e in self._events()
+                        if e['name'] == 'thread_name'}
+        self.assertIn('scanner', thread_names)
+
+    def test_child_process_spans_get_their_own_track(self):
+        with pipeline_hooks.install(ChromeTrace(self.out_path)):
+            with phase('a.csv', 'sqlite3') as info:
+                info['pid'] = 4242
+        events = self._events()
+        span, = [e for e in events if e['ph'] == 'X']
+        self.assertEqual((span['pid'], span['tid']), (4242, 4242))
+        self.assertIn({'name': 'process_name', 'ph': 'M', 'pid': 4242,
+                       'args': {'name': 'sqlite3'}}, events)
+
+    def test_worker_events_are_merged(self):
+        worker, parent = ChromeTrace(self.out_path), ChromeTrace(self.out_path)
+        pipeline_hooks.adopt([worker])
+        try:
+            with phase('c.csv', 'scan'):
+                pass
+            drained, = pipeline_hooks.drain()
+        finally:
+            pipeline_hooks.adopt([])
+        parent.absorb(drained)
+        parent.close()
+        self.assertEqual([e['args']['member'] for e in self._events()
+                          if e['ph'] == 'X'], ['c.csv'])
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from column_classifier import (
+    type_rx, classify_value, classify_column, classify_rows)
+
+
+sample_values = [
+    "", "0", "42", "-17", "+3", "1-2", "3.14", "-.5", ".", "1.2.3",
+    "2023-04-20", "2023/04/20", "2023-04-20 12:34:56", "2023-04-20T12:34:56",
+    "12:34:56", "true", "truest", "false", "falsey", "None", "none",
+    "Apple, raw", "n/a", "x1", "NaN", "t", "f", "N", "123\n", "٣",
+]
+
+
+def regex_type(val):
+    return {typ for typ, value in type_rx.match(val).groupdict().items()
+            if value is not None}.pop()
+
+
+class TestClassifyValue(TestCase):
+    def test_that_shortcuts_agree_with_type_rx(self):
+        for val in sample_values:
+            self.assertEqual(regex_type(val), classify_value(val), repr(val))
+
+    def test_that_unmatchable_values_are_str(self):
+        self.assertEqual(classify_value("two\nlines"), 'str')
+
+
+class TestClassifyColumn(TestCase):
+    def test_that_counts_keep_first_appearance_order(self):
+        type_counts, str_max_len = classify_column(
+            ["1", "x", "2.5", "1", "yy", "2.5"])
+        self.assertEqual(list(type_counts.items()),
+                         [('int', 2), ('str', 2), ('decimal', 2)])
+        self.assertEqual(str_max_len, 2)
+
+    def test_that_ragged_rows_only_count_present_values(self):
+        tallies = classify_rows([["1", "a", "x"], ["2"], ["3", "bb"]])
+        self.assertEqual(tallies, [
+            ({'int': 3}, 0),
+            ({'str': 2}, 2),
+            ({'str': 1}, 1),
+        ])
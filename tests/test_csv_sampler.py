@@ -0,0 +1,86 @@
+from io import BytesIO, BufferedReader, RawIOBase, TextIOWrapper
+from unittest import TestCase
+
+from csv_sampler import sample_blocks, sample_records, sample_reservoir
+from csv_scanner import CSVScanner
+from text_io_progress_wrapper import TextIOProgressWrapper
+
+
+sample_data = b"id,name\n" + b"".join(
+    b'%d,"name\n%d"\n' % (i, i) if i % 7 == 0 else b"%d,n%d\n" % (i, i)
+    for i in range(10000))
+
+
+class Unseekable(RawIOBase):
+    def __init__(self, data):
+        self._source = BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        return self._source.readinto(buf)
+
+
+class TestSampleBlocks(TestCase):
+    def test_that_samples_span_the_file(self):
+        field_names, rows = sample_blocks(
+            BytesIO(sample_data), len(sample_data), 100, blocks=10)
+        rows = list(rows)
+        self.assertEqual(field_names, ['id', 'name'])
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(rows[0], ['0', 'name\n0'])
+        self.assertGreater(int(rows[-1][0]), 9000)
+
+    def test_that_blocks_start_outside_quoted_fields(self):
+        for blocks in (10, 33, 97):
+            _, rows = sample_blocks(
+                BytesIO(sample_data), len(sample_data), 500, blocks=blocks)
+            rows = list(rows)
+            self.assertGreater(len(rows), 400)
+            for row in rows:
+                self.assertEqual(len(row), 2, row)
+                self.assertTrue(row[0].isdigit(), row)
+                self.assertEqual(row[1][-len(row[0]):], row[0], row)
+
+    def test_that_small_files_are_not_read_twice(self):
+        _, rows = sample_blocks(
+            BytesIO(sample_data), len(sample_data), 20000, blocks=4)
+        ids = [row[0] for row in rows]
+        self.assertEqual(len(ids), len(set(ids)))
+
+
+class TestSampleReservoir(TestCase):
+    def test_that_sample_is_bounded_and_reproducible(self):
+        rows = [[str(i)] for i in range(1000)]
+        sample = sample_reservoir(iter(rows), 50)
+        self.assertEqual(len(sample), 50)
+        self.assertEqual(sample, sample_reservoir(iter(rows), 50))
+        self.assertNotEqual(sample, rows[:50])
+
+    def test_that_unseekable_streams_use_reservoir(self):
+        field_names, rows = sample_records(
+            BufferedReader(Unseekable(sample_data)), len(sample_data), 10)
+        self.assertEqual(field_names, ['id', 'name'])
+        self.assertEqual(len(rows), 10)
+
+
+class TestSampledScan(TestCase):
+    def test_that_quoted_newlines_leave_types_alone(self):
+        scanner = CSVScanner(TextIOWrapper(BytesIO(sample_data)), 't',
+                             sample_rows=500, file_len=len(sample_data))
+        scanner.scan()
+        self.assertEqual(scanner.stats['id'], {'int': 512})
+        self.assertEqual(next(scanner.result())[:2], ('id', 'int'))
+
+    def test_that_sampling_reports_progress(self):
+        reports = []
+        csv_fh = TextIOProgressWrapper(
+            BytesIO(sample_data), object_name='t',
+            file_len=len(sample_data), every_pct=10,
+            callback=lambda *args: reports.append(args))
+        scanner = CSVScanner(csv_fh, 't', sample_rows=500,
+                             file_len=len(sample_data))
+        scanner.scan()
+        self.assertGreater(len(reports), 5)
+        self.assertEqual(reports[-1][2:], (len(sample_data),) * 2)
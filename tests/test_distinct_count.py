@@ -0,0 +1,125 @@
+from io import StringIO
+import pickle
+from unittest import TestCase
+
+from csv_scanner import CSVScanner
+from distinct_count import DistinctCounter, REPEATED_LIMIT
+
+
+class TestDistinctCounter(TestCase):
+    def test_exact_while_unique(self):
+        counter = DistinctCounter(limit=100)
+        counter.add([str(i) for i in range(100)] + [''])
+        self.assertTrue(counter.exact)
+        self.assertTrue(counter.unique)
+        self.assertTrue(counter.canonical_ints)
+        self.assertEqual((counter.values, counter.distinct()), (100, 100))
+
+    def test_estimates_past_limit(self):
+        counter = DistinctCounter(limit=100, k=64)
+        counter.add([str(i) for i in range(5000)])
+        self.assertFalse(counter.exact)
+        self.assertFalse(counter.unique)
+        self.assertAlmostEqual(counter.distinct(), 5000, delta=5000 * 0.3)
+
+    def test_repeats(self):
+        counter = DistinctCounter()
+        counter.add(['a', 'b', 'a'])
+        self.assertTrue(counter.exact)
+        self.assertFalse(counter.unique)
+        self.assertEqual(counter.distinct(), 2)
+        # Not unique, so no longer worth counting exactly
+        counter.add([f"v{i}" for i in range(REPEATED_LIMIT)])
+        self.assertFalse(counter.exact)
+
+    def test_canonical_ints(self):
+        for values, canonical in ((['0', '-12', '340'], True),
+                                  (['007'], False), (['+1'], False),
+                                  (['-0'], False), (['1' * 19], False)):
+            counter = DistinctCounter()
+            counter.add(values)
+            self.assertEqual(counter.canonical_ints, canonical, values)
+
+    def test_merge(self):
+        first = DistinctCounter(limit=100, k=64)
+        second = DistinctCounter(limit=100, k=64)
+        first.add(['1', '2'])
+        second.add(['3', '4'])
+        first.merge(second)
+        self.assertEqual((first.distinct(), first.unique), (4, True))
+        second.add(['1'])
+        first.merge(second)
+        self.assertFalse(first.unique)
+        big = DistinctCounter(limit=100, k=64)
+        big.add([str(i) for i in range(1000)])
+        first.merge(big)
+        self.assertFalse(first.exact)
+        self.assertAlmostEqual(first.distinct(), 1000, delta=300)
+
+    def test_pickles(self):
+        for n in (10, 1000):
+            counter = DistinctCounter(limit=100, k=64)
+            counter.add([str(i) for i in range(n)])
+            copy = pickle.loads(pickle.dumps(counter))
+            self.assertEqual((copy.exact, copy.unique, copy.values,
+                              copy.distinct()),
+                             (counter.exact, counter.unique, counter.values,
+                              counter.distinct()))
+
+    def test_hashed_counts_go_on(self):
+        counter = DistinctCounter()
+        counter.add(['1', '2'])
+        copy = pickle.loads(pickle.dumps(counter))
+        self.assertTrue(copy.canonical_ints)
+        copy.add(['3'])
+        copy.merge(counter)
+        self.assertEqual((copy.values, copy.distinct(), copy.unique),
+                         (5, 3, False))
+        copy.add(['007'])
+        self.assertFalse(copy.canonical_ints)
+
+
+class TestPrimaryKey(TestCase):
+    def scanner(self, text, **kw):
+        scanner = CSVScanner(StringIO(text), 't', distinct_limit=1000, **kw)
+        scanner.scan()
+        return scanner
+
+    def test_int_key_is_rowid(self):
+        scanner = self.scanner("id,name\n" + "".join(
+            f"{i},n{i % 3}\n" for i in range(50)))
+        self.assertEqual(scanner.primary_key(), 'id')
+        self.assertEqual(scanner.sql_create_table(),
+                         "CREATE TABLE t (\n"
+                         "    id INTEGER PRIMARY KEY,\n"
+                         "    name VARCHAR(2)\n"
+                         ");\n")
+
+    def test_str_key_without_rowid(self):
+        scanner = self.scanner("code,qty\n" + "".join(
+            f"c{i},{i % 4}\n" for i in range(50)))
+        self.assertEqual(scanner.distinct['qty'].distinct(), 4)
+        self.assertEqual(scanner.sql_create_table(),
+                         "CREATE TABLE t (\n"
+                         "    code VARCHAR(3) PRIMARY KEY,\n"
+                         "    qty INTEGER\n"
+                         ") WITHOUT ROWID;\n")
+
+    def test_stats_show_counts_beside_types(self):
+        scanner = self.scanner("code,qty\n" + "".join(
+            f"c{i},{i % 4}\n" for i in range(50)))
+        self.assertEqual(scanner.stats['qty'], {
+            'int': 50,
+            'distinct': {'distinct': 4, 'exact': True, 'unique': False}})
+        self.assertEqual(list(scanner.result()),
+                         [('code', 'str', 3), ('qty', 'int', None)])
+
+    def test_no_key(self):
+        # Non-canonical ints, empty values, and partial scans are no proof
+        for text, kw in (("id\n01\n2\n", {}),
+                         ("id,x\n1,a\n,a\n", {}),
+                         ("id\n0\n-0\n5\n", {}),
+                         ("id\n1\n2\n3\n", {'max_rows': 2})):
+            scanner = self.scanner(text, **kw)
+            self.assertIsNone(scanner.primary_key(), text)
+            self.assertNotIn('PRIMARY KEY', scanner.sql_create_table())
@@ -0,0 +1,84 @@
+from io import BytesIO
+import os
+import tempfile
+from threading import Thread
+from unittest import TestCase
+import zipfile
+
+from bytes_io_progress_wrapper import BytesIOProgressWrapper
+from fifo_transfer import transfer
+from stored_member_reader import StoredMemberReader
+
+
+sample_data = b"id,name\n" + b"".join(
+    b"%d,name %d\n" % (i, i) for i in range(50000))
+
+
+class PipeSink:
+    """ Collects whatever is written to the write end of a pipe. """
+
+    def __init__(self):
+        read_fd, write_fd = os.pipe()
+        self.write_fh = open(write_fd, "wb", buffering=0)
+        self._read_fh = open(read_fd, "rb")
+        self.data = None
+        self._thread = Thread(target=self._drain)
+        self._thread.start()
+
+    def _drain(self):
+        self.data = self._read_fh.read()
+        self._read_fh.close()
+
+    def collected(self):
+        self.write_fh.close()
+        self._thread.join()
+        return self.data
+
+
+class TestTransfer(TestCase):
+    def test_that_buffered_sources_are_copied(self):
+        sink = PipeSink()
+        done = transfer(sink.write_fh, BytesIO(sample_data))
+        self.assertEqual(sink.collected(), sample_data)
+        self.assertEqual(done.method, 'copy')
+        self.assertEqual(done.nbytes, len(sample_data))
+
+    def test_that_files_are_sent_from_current_position(self):
+        with tempfile.TemporaryFile() as fh:
+            fh.write(sample_data)
+            fh.seek(0)
+            header = fh.readline()
+            wrapper = BytesIOProgressWrapper(
+                source=fh, object_name='x', file_len=len(sample_data))
+            sink = PipeSink()
+            done = transfer(sink.write_fh, wrapper)
+            self.assertEqual(sink.collected(), sample_data[len(header):])
+            self.assertEqual(done.method, 'sendfile')
+            self.assertEqual(fh.tell(), len(sample_data))
+            self.assertEqual(wrapper.char_num, done.nbytes)
+
+
+class TestStoredMemberReader(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.zip_filename = os.path.join(self.tmpdir.name, 'stored.zip')
+        with zipfile.ZipFile(self.zip_filename, 'w') as zip:
+            zip.writestr('first.csv', b"a,b\n1,2\n")
+            zip.writestr('data/sample.csv', sample_data)
+            self.file_info = zip.getinfo('data/sample.csv')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_that_reads_match_member(self):
+        with StoredMemberReader(self.zip_filename, self.file_info) as fh:
+            self.assertEqual(fh.readline(), b"id,name\n")
+            self.assertEqual(fh.read(), sample_data[8:])
+
+    def test_that_stored_members_are_sent(self):
+        with StoredMemberReader(self.zip_filename, self.file_info) as fh:
+            fh.readline()
+            sink = PipeSink()
+            done = transfer(sink.write_fh, fh)
+            self.assertEqual(sink.collected(), sample_data[8:])
+            self.assertEqual(done.method, 'sendfile')
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+from zipfile import ZipInfo
+
+from import_registry import ImportRegistry
+
+
+def make_info(crc, size):
+    info = ZipInfo('fruit.csv')
+    info.CRC = crc
+    info.file_size = size
+    return info
+
+
+class TestImportRegistry(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'test.db')
+        self.registry = ImportRegistry(self.db_path)
+
+    def tearDown(self) -> None:
+        self.registry.close()
+        self.tmpdir.cleanup()
+
+    def _load_shadow(self, rows):
+        con = sqlite3.connect(self.db_path)
+        shadow = ImportRegistry.shadow_name('fruit')
+        con.execute(f"CREATE TABLE {shadow} (name TEXT)")
+        con.executemany(f"INSERT INTO {shadow} VALUES (?)",
+                        [(row,) for row in rows])
+        con.commit()
+        con.close()
+
+    def test_that_replace_swaps_in_shadow_and_records_it(self):
+        info = make_info(1, 10)
+        self.assertFalse(self.registry.is_current('fruit', 'fruit.csv', info))
+        self._load_shadow(['apple', 'fig'])
+        self.assertEqual(self.registry.replace('fruit', 'fruit.csv', info), 2)
+        self.assertTrue(self.registry.is_current('fruit', 'fruit.csv', info))
+
+        self._load_shadow(['pear'])
+        self.registry.replace('fruit', 'fruit.csv', make_info(2, 5))
+        con = sqlite3.connect(self.db_path)
+        self.assertEqual(con.execute("SELECT name FROM fruit").fetchall(),
+                         [('pear',)])
+        self.assertFalse(self.registry.is_current('fruit', 'fruit.csv', info))
+
+    def test_that_missing_table_is_not_current(self):
+        info = make_info(1, 10)
+        self._load_shadow(['apple'])
+        self.registry.replace('fruit', 'fruit.csv', info)
+        sqlite3.connect(self.db_path).execute("DROP TABLE fruit")
+        self.assertFalse(self.registry.is_current('fruit', 'fruit.csv', info))
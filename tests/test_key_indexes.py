@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from choose_key_fields import Candidate, base_type, key_candidates
+from import_registry import ImportRegistry
+from key_indexes import KeyIndexer, index_name
+
+
+class TestKeyCandidates(TestCase):
+    def test_shared_columns_are_candidates(self):
+        structs = {
+            'customers': {'customer_id': 'int', 'name': 'str(8)',
+                          'active': 'bool'},
+            'orders': {'order_id': 'int', 'customer_id': 'int',
+                       'name': 'str(12)', 'active': 'bool'},
+            'notes': {'note_id': 'int', 'customer_id': 'str(4)'},
+        }
+        self.assertEqual(key_candidates(structs), [
+            Candidate('customers', 'customer_id', True),
+            Candidate('customers', 'name', False),
+            Candidate('orders', 'customer_id', False),
+            Candidate('orders', 'name', False),
+        ])
+
+    def test_base_type(self):
+        self.assertEqual(base_type('str(12)'), 'str')
+        self.assertEqual(base_type('VARCHAR(12)'), 'VARCHAR')
+        self.assertEqual(base_type('INTEGER'), 'INTEGER')
+
+
+class TestKeyIndexer(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'shop.db')
+        con = sqlite3.connect(self.db_path)
+        con.executescript("""
+            CREATE TABLE customers (customer_id INTEGER, name VARCHAR(8));
+            CREATE TABLE orders (order_id INTEGER, customer_id INTEGER,
+                                 paid BOOLEAN);
+            CREATE TABLE refunds (refund_id INTEGER, paid BOOLEAN);
+        """)
+        con.executemany("INSERT INTO orders VALUES (?, ?, 1)",
+                        [(i, i % 10) for i in range(100)])
+        con.commit()
+        con.close()
+        # Its bookkeeping table isn't one to index
+        ImportRegistry(self.db_path).close()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def indexes(self):
+        con = sqlite3.connect(self.db_path)
+        try:
+            return sorted(con.execute(
+                "SELECT name, tbl_name FROM sqlite_master "
+                "WHERE type = 'index' AND sql IS NOT NULL"))
+        finally:
+            con.close()
+
+    def test_builds_candidate_indexes_once(self):
+        timings = KeyIndexer(self.db_path, threads=2).build()
+        self.assertEqual(sorted(timings), [
+            index_name('customers', 'customer_id'),
+            index_name('orders', 'customer_id')])
+        self.assertEqual(self.indexes(), [
+            (index_name('customers', 'customer_id'), 'customers'),
+            (index_name('orders', 'customer_id'), 'orders')])
+        self.assertEqual(KeyIndexer(self.db_path).build(), {})
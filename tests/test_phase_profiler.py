@@ -0,0 +1,47 @@
+import os
+import pstats
+import tempfile
+from unittest import TestCase
+
+import pipeline_hooks
+from pipeline_hooks import phase
+from phase_profiler import PhaseProfiler, SUMMARY_FILE
+
+
+def busy():
+    return sum(i * i for i in range(10000))
+
+
+class TestPhaseProfiler(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.profile_dir = os.path.join(self.tmpdir.name, 'profiles')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_profiles_scan_and_import_of_each_member(self):
+        with pipeline_hooks.install(PhaseProfiler(self.profile_dir)):
+            for phase_name in ('open', 'scan', 'import'):
+                with phase('dir/a.csv', phase_name):
+                    busy()
+        self.assertEqual(
+            sorted(os.listdir(self.profile_dir)),
+            ['dir_a.csv.import.pstats', 'dir_a.csv.scan.pstats',
+             SUMMARY_FILE])
+        stats = pstats.Stats(
+            os.path.join(self.profile_dir, 'dir_a.csv.scan.pstats'))
+        self.assertTrue(any(func[2] == 'busy' for func in stats.stats))
+        with open(os.path.join(self.profile_dir, SUMMARY_FILE)) as fh:
+            summary = fh.read()
+        self.assertIn("=== scan: 1 member(s)", summary)
+        self.assertIn("busy", summary)
+
+    def test_every_n_picks_the_same_members(self):
+        profiler = PhaseProfiler(self.profile_dir, every_n=3)
+        members = [f"m{i}.csv" for i in range(300)]
+        picked = [m for m in members if profiler.profiled(m, 'scan')]
+        self.assertTrue(60 < len(picked) < 140)
+        again = PhaseProfiler(self.profile_dir, every_n=3)
+        self.assertEqual(
+            picked, [m for m in members if again.profiled(m, 'scan')])
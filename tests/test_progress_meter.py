@@ -0,0 +1,67 @@
+from io import BytesIO, StringIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from bytes_io_progress_wrapper import BytesIOProgressWrapper
+from progress_meter import ProgressMeter, format_eta, NEVER
+
+data = b"".join(b"%05d,abc\n" % i for i in range(1000))
+
+
+class TestProgressMeter(TestCase):
+    def test_every_pct_fires_per_step_and_once_at_end(self):
+        calls = []
+        wrapper = BytesIOProgressWrapper(
+            BytesIO(data), file_len=len(data), object_name='x',
+            every_pct=10, callback=lambda *args: calls.append(args))
+        while wrapper.readline():
+            pass
+        self.assertEqual(len(calls), 10)
+        self.assertEqual(calls[-1][2], len(data))
+        self.assertEqual(wrapper._meter.next_char, NEVER)
+
+    def test_every_rows_between_checks_is_just_a_compare(self):
+        meter = ProgressMeter('x', len(data), every_rows=100,
+                              callback=lambda *args: None)
+        self.assertEqual(meter.next_line, 100)
+        with patch.object(meter, 'update',
+                          wraps=meter.update) as update:
+            wrapper = BytesIOProgressWrapper(
+                BytesIO(data), file_len=len(data), object_name='x',
+                every_rows=100, callback=lambda *args: None)
+            wrapper._meter = meter
+            while wrapper.readline():
+                pass
+        self.assertEqual(update.call_count, 10)
+
+    def test_every_secs_reports_on_the_clock(self):
+        calls = []
+        clock = iter(range(0, 10 ** 6, 1))
+        with patch('progress_meter.time.monotonic', lambda: next(clock)):
+            meter = ProgressMeter('x', 10 ** 9, every_secs=5,
+                                  callback=lambda *args: calls.append(args))
+            for line in range(1, 20):
+                meter.update(line * 4096, line * 10 ** 6)
+        # The clock ticks once per update, so every fifth one reports
+        self.assertEqual([call[1] // 4096 for call in calls], [5, 10, 15])
+
+    def test_progress_fh_is_throttled_but_shows_the_end(self):
+        progress_fh = StringIO()
+        wrapper = BytesIOProgressWrapper(
+            BytesIO(data), file_len=len(data), object_name='x',
+            every_rows=1, progress_fh=progress_fh)
+        while wrapper.readline():
+            pass
+        lines = progress_fh.getvalue().split("\r")[1:]
+        self.assertLess(len(lines), 10)
+        self.assertIn("row 999 of 999 - 100%", lines[-1])
+        self.assertTrue(lines[-1].endswith("ETA 0:00"))
+
+    def test_format_eta(self):
+        self.assertEqual(format_eta(59), "0:59")
+        self.assertEqual(format_eta(3 * 3600 + 61), "3:01:01")
+
+    def test_rejects_two_everys(self):
+        with self.assertRaises(ValueError):
+            ProgressMeter('x', 1, every_rows=1, every_secs=1,
+                          callback=lambda *args: None)
@@ -0,0 +1,81 @@
+from io import BytesIO, StringIO
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+import zipfile
+
+from csv_scanner import CSVScanner
+from read_ahead_reader import ReadAheadReader, read_ahead
+from sqlite_loader import import_sqlite_inproc
+
+sample_data = b"id,name\n" + b"".join(
+    b"%d,name %d\n" % (i, i) for i in range(50000))
+
+
+class Broken(BytesIO):
+    def readinto(self, buf):
+        if self.tell() > 1000:
+            raise OSError("bad member")
+        return super().readinto(buf)
+
+
+class TestReadAheadReader(TestCase):
+    def test_reads_it_all_in_order(self):
+        reader = ReadAheadReader(BytesIO(sample_data), block_size=1000,
+                                 blocks=2)
+        with reader:
+            self.assertEqual(reader.read(), sample_data)
+            self.assertEqual(reader.read(10), b'')
+
+    def test_inflates_zip_members(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'data.zip')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('data.csv', sample_data)
+            with zipfile.ZipFile(path) as zf:
+                with read_ahead(zf.open('data.csv')) as fh:
+                    self.assertEqual(fh.readline(), b"id,name\n")
+                    self.assertEqual(fh.read(), sample_data[8:])
+
+    def test_close_stops_the_thread_early(self):
+        source = BytesIO(sample_data)
+        reader = ReadAheadReader(source, block_size=100, blocks=2)
+        self.assertEqual(reader.read(10), sample_data[:10])
+        reader.close()
+        self.assertFalse(reader._thread.is_alive())
+        self.assertTrue(source.closed)
+
+    def test_errors_reach_the_reader(self):
+        with ReadAheadReader(Broken(sample_data), block_size=500) as reader:
+            with self.assertRaises(OSError):
+                reader.read()
+
+    def test_files_are_left_alone(self):
+        with tempfile.TemporaryFile() as fh:
+            self.assertIs(read_ahead(fh), fh)
+
+    def test_tells_what_it_handed_out(self):
+        with read_ahead(BytesIO(sample_data)) as fh:
+            self.assertFalse(fh.seekable())
+            header = fh.readline()
+            self.assertEqual(fh.tell(), len(header))
+            fh.read()
+            self.assertEqual(fh.tell(), len(sample_data))
+
+    def test_python_loader_reads_it(self):
+        scanner = CSVScanner(StringIO(sample_data.decode()), 't')
+        scanner.scan()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, 't.db')
+            csv_fh = read_ahead(BytesIO(sample_data))
+            csv_fh.readline()
+            import_sqlite_inproc(db_path, scanner=scanner, table_name='t',
+                                 csv_fh=csv_fh, file_info=None)
+            con = sqlite3.connect(db_path)
+            try:
+                self.assertEqual(
+                    con.execute("SELECT count(*) FROM t").fetchone(),
+                    (50000,))
+            finally:
+                con.close()
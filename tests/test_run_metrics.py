@@ -0,0 +1,85 @@
+from functools import partial
+import json
+import os
+import tempfile
+from unittest import TestCase
+import zipfile
+
+from csv2db import zip_walker
+import pipeline_hooks
+from pipeline_hooks import phase
+from run_metrics import RunMetrics
+from sqlite_loader import import_sqlite_inproc
+
+fruit_csv = b"id,name\n1,apple\n2,fig\n3,kiwi\n"
+
+
+class TestRunMetrics(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.out_path = os.path.join(self.tmpdir.name, 'metrics.json')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _report(self):
+        with open(self.out_path) as fh:
+            return json.load(fh)
+
+    def test_phases_add_up_per_member(self):
+        with pipeline_hooks.install(RunMetrics(self.out_path)):
+            for rows in (10, 20):
+                with phase('a.csv', 'import', buf_size=4096) as info:
+                    info['rows'] = rows
+        self.assertEqual(pipeline_hooks.installed(), [])
+        record = self._report()['members']['a.csv']['import']
+        self.assertEqual(record['count'], 2)
+        self.assertEqual(record['rows'], 30)
+        self.assertEqual(record['buf_size'], 4096)
+        self.assertGreater(record['peak_rss'], 0)
+
+    def test_drained_worker_records_are_absorbed(self):
+        worker, parent = RunMetrics(self.out_path), RunMetrics(self.out_path)
+        pipeline_hooks.adopt([worker])
+        try:
+            with phase('b.csv', 'scan') as info:
+                info['rows'] = 5
+            drained = pipeline_hooks.drain()
+        finally:
+            pipeline_hooks.adopt([])
+        parent.absorb(drained[0])
+        parent.close()
+        report = self._report()
+        self.assertEqual(report['members']['b.csv']['scan']['rows'], 5)
+        self.assertEqual(report['overall']['phases']['scan']['rows'], 5)
+
+    def test_absorbed_records_add_to_the_parents(self):
+        parent = RunMetrics(self.out_path)
+        with pipeline_hooks.install(parent):
+            with phase('c.csv', 'open') as info:
+                info['bytes'] = 100
+        theirs = {'wall': 2.0, 'cpu': 1.0, 'child_cpu': 0.0, 'count': 1,
+                  'bytes': 50, 'pid': -1, 'peak_rss': 1}
+        parent.absorb({'c.csv': {'open': theirs}})
+        parent.close()
+        record = self._report()['members']['c.csv']['open']
+        self.assertEqual(record['count'], 2)
+        self.assertEqual(record['bytes'], 150)
+        self.assertGreater(record['wall'], 2.0)
+        self.assertEqual(record['pid'], os.getpid())
+        self.assertGreater(record['peak_rss'], 1)
+
+    def test_zip_walker_reports_every_phase(self):
+        zip_filename = os.path.join(self.tmpdir.name, 'fruit.zip')
+        with zipfile.ZipFile(zip_filename, 'w') as zip:
+            zip.writestr('fruit.csv', fruit_csv)
+        zip_walker(
+            zip_filename, max_rows=None,
+            output_fn=partial(import_sqlite_inproc,
+                              os.path.join(self.tmpdir.name, 'fruit.db')),
+            hooks=[RunMetrics(self.out_path)])
+        phases = self._report()['members']['fruit.csv']
+        self.assertEqual(set(phases), {'open', 'scan', 'create', 'import'})
+        self.assertEqual(phases['scan']['rows'], 3)
+        self.assertEqual(phases['import']['rows'], 3)
+        self.assertEqual(phases['import']['bytes'], len(fruit_csv) - 8)
@@ -0,0 +1,63 @@
+from io import StringIO
+import os
+import tempfile
+import time
+from unittest import TestCase
+from zipfile import ZipInfo
+
+from csv_scanner import CSVScanner
+from scan_cache import ScanCache
+
+
+def make_info(name, crc, size):
+    info = ZipInfo(name)
+    info.CRC = crc
+    info.file_size = size
+    return info
+
+
+def make_scanner():
+    scanner = CSVScanner(StringIO("id,name\n1,apple\n2,fig\n"), 'fruit')
+    scanner.scan()
+    return scanner
+
+
+class TestScanCache(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ScanCache(self.tmpdir.name)
+        self.info = make_info('fruit.csv', 1234, 22)
+        self.scanner_kw = dict(max_rows=None)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_that_scanners_round_trip(self):
+        self.cache.put('fruit.csv', self.info, self.scanner_kw,
+                       make_scanner())
+        cached = self.cache.get('fruit.csv', self.info, self.scanner_kw)
+        self.assertEqual(list(cached.result()),
+                         list(make_scanner().result()))
+        self.assertEqual(cached.sql_create_table(),
+                         make_scanner().sql_create_table())
+
+    def test_that_changed_members_or_settings_miss(self):
+        self.cache.put('fruit.csv', self.info, self.scanner_kw,
+                       make_scanner())
+        self.assertIsNone(self.cache.get(
+            'fruit.csv', make_info('fruit.csv', 4321, 22), self.scanner_kw))
+        self.assertIsNone(self.cache.get(
+            'fruit.csv', self.info, dict(max_rows=10)))
+
+    def test_that_evict_drops_old_then_oldest(self):
+        for crc in range(3):
+            self.cache.put('fruit.csv', make_info('fruit.csv', crc, 22),
+                           self.scanner_kw, make_scanner())
+        paths = sorted(entry.path for entry in os.scandir(self.tmpdir.name))
+        stale = time.time() - 3600
+        os.utime(paths[0], (stale, stale))
+        entry_size = os.path.getsize(paths[1])
+
+        ScanCache(self.tmpdir.name, max_age=60,
+                  max_bytes=entry_size).evict()
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 1)
@@ -0,0 +1,27 @@
+from io import StringIO
+from unittest import TestCase
+
+from csv_scanner import CSVScanner
+
+
+def make_csv(rows):
+    return StringIO("id,name,amount\n" + "".join(
+        f"{i},name{i % 10},{i * 1.5}\n" for i in range(rows)))
+
+
+class TestScanConvergence(TestCase):
+    def test_that_scan_stops_once_columns_are_stable(self):
+        scanner = CSVScanner(make_csv(100000), 'conv', converge=0.01)
+        scanner.scan()
+        self.assertLess(sum(scanner.stats['id'].values()), 100000)
+        self.assertEqual(
+            list(scanner.result()),
+            [('id', 'int', None), ('name', 'str', 5),
+             ('amount', 'decimal', None)])
+
+    def test_that_decisions_match_a_full_scan(self):
+        full = CSVScanner(make_csv(20000), 'conv')
+        full.scan()
+        converged = CSVScanner(make_csv(20000), 'conv', converge=0.001)
+        converged.scan()
+        self.assertEqual(list(full.result()), list(converged.result()))
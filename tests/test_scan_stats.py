@@ -0,0 +1,75 @@
+from io import StringIO
+import pickle
+from unittest import TestCase
+
+from csv_scanner import CSVScanner
+from scan_stats import ScanStats
+
+
+def scan(text, **kw):
+    scanner = CSVScanner(StringIO(text), 'fruit', **kw)
+    scanner.scan()
+    return scanner
+
+
+class TestScanStats(TestCase):
+    def test_types_keep_their_first_seen_order(self):
+        stats = ScanStats()
+        stats.add('price', {'int': 2, 'decimal': 1})
+        stats.add('price', {'str': 1, 'int': 1}, str_max_len=3)
+        self.assertEqual(stats.type_counts('price'),
+                         {'int': 3, 'decimal': 1, 'str': 1})
+        self.assertEqual(stats.str_max_len('price'), 3)
+        self.assertEqual(stats.type_counts('missing'), {})
+
+    def test_merge(self):
+        first, second = ScanStats(), ScanStats()
+        first.add('id', {'int': 2})
+        first.add('name', {'str': 2}, str_max_len=5, nulls=1)
+        first.add_rows(2)
+        second.add('id', {'decimal': 1, 'int': 1})
+        second.add('name', {'str': 2}, str_max_len=9)
+        second.add('extra', {'bool': 2})
+        second.add_rows(2)
+        first.merge(second)
+        self.assertEqual(first.as_dict(), {
+            'id': {'int': 3, 'decimal': 1},
+            'name': {'str': 4},
+            'extra': {'bool': 2},
+        })
+        self.assertEqual(first.str_max_len('name'), 9)
+        self.assertEqual(first.nulls('name'), 1)
+        self.assertEqual(first.row_count, 4)
+
+    def test_bytes_round_trip(self):
+        stats = scan("id,name,note\n1,apple,\n2,fig,ripe\nx,kiwi,\n"
+                     ).scan_stats
+        data = stats.to_bytes()
+        again = ScanStats.from_bytes(data)
+        self.assertEqual(again, stats)
+        self.assertEqual(again.field_names, ['id', 'name', 'note'])
+        self.assertEqual(again.nulls('note'), 2)
+        self.assertEqual(again.row_count, 3)
+        self.assertEqual(pickle.loads(pickle.dumps(stats)), stats)
+        with self.assertRaises(ValueError):
+            ScanStats.from_bytes(b'nope' + data[4:])
+
+    def test_merged_chunks_match_a_whole_scan(self):
+        header = "id,name,price\n"
+        rows = [f"{i},name{i % 7},{i / 3 if i % 5 else 'n/a'}\n"
+                for i in range(300)]
+        whole = scan(header + "".join(rows))
+        merged = scan(header + "".join(rows[:100]))
+        merged.merge(scan(header + "".join(rows[100:])))
+        self.assertEqual(merged.scan_stats, whole.scan_stats)
+        self.assertEqual(list(merged.result()), list(whole.result()))
+
+    def test_row_count_counts_rows(self):
+        rows = "".join(f"name{i},{i}\n" for i in range(50000))
+        converged = scan("name,id\n" + rows, converge=0.001)
+        # name's retired after the first batch, and it all settles a batch
+        # later
+        self.assertEqual(converged.row_count, 8192)
+        self.assertEqual(scan("name,id\n" + rows).row_count, 50000)
+        same_names = scan("a,a\n" + "".join(f"{i},x\n" for i in range(100)))
+        self.assertEqual(same_names.row_count, 100)
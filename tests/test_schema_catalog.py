@@ -0,0 +1,93 @@
+from io import StringIO
+import os
+import pickle
+import sqlite3
+import tempfile
+from unittest import TestCase
+from zipfile import ZipInfo
+
+from choose_key_fields import load_structs
+from csv_scanner import CSVScanner
+from schema_catalog import CATALOG_VERSION, SchemaCatalog, is_catalog
+
+
+def scanned(text):
+    scanner = CSVScanner(StringIO(text), 't', max_rows=None, sketch_k=64,
+                         distinct_limit=1000)
+    scanner.scan()
+    return scanner
+
+
+def member(name, crc):
+    file_info = ZipInfo(name)
+    file_info.CRC, file_info.file_size = crc, 100
+    return file_info
+
+
+class TestSchemaCatalog(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'structs.db')
+        self.catalog = SchemaCatalog(self.path)
+        self.catalog.put('customers', 'a.zip', 'customers.csv',
+                         member('customers.csv', 1),
+                         scanned("id,name\n1,ann\n2,bob\n3,\n"))
+
+    def tearDown(self) -> None:
+        self.catalog.close()
+        self.tmpdir.cleanup()
+
+    def test_reads_back_per_table(self):
+        catalog = self.catalog
+        self.assertEqual(catalog.table_names(), ['customers'])
+        self.assertEqual(catalog.source_of('customers'),
+                         ('a.zip', 'customers.csv', 1, 100))
+        self.assertEqual(catalog.struct('customers'),
+                         {'id': 'int', 'name': 'str(3)'})
+        self.assertEqual(catalog.type_counts('customers')['id'], {'int': 3})
+        self.assertEqual(catalog.distinct('customers')['id'],
+                         {'distinct': 3, 'exact': True, 'unique': True})
+        self.assertEqual(len(catalog.sketches('customers')['name']), 2)
+
+    def test_rescans_replace_and_runs_add_up(self):
+        self.catalog.put('customers', 'a.zip', 'customers.csv',
+                         member('customers.csv', 2), scanned("id\n1\n"))
+        self.catalog.close()
+        self.catalog = SchemaCatalog(self.path)
+        self.catalog.put('orders', 'b.zip', 'orders.csv',
+                         member('orders.csv', 3), scanned("order_id\n7\n"))
+        self.assertEqual(self.catalog.table_names(), ['customers', 'orders'])
+        self.assertEqual(self.catalog.struct('customers'), {'id': 'int'})
+        self.assertEqual(self.catalog.source_of('customers')[2], 2)
+
+    def test_merge(self):
+        other_path = os.path.join(self.tmpdir.name, 'other.db')
+        with SchemaCatalog(other_path) as other:
+            other.put('customers', 'c.zip', 'customers.csv',
+                      member('customers.csv', 4), scanned("cid\n1\n"))
+            other.put('items', 'c.zip', 'items.csv',
+                      member('items.csv', 5), scanned("sku\nab\n"))
+        self.catalog.merge(other_path)
+        self.assertEqual(self.catalog.table_names(), ['customers', 'items'])
+        self.assertEqual(self.catalog.struct('customers'), {'cid': 'int'})
+
+    def test_refuses_other_versions(self):
+        self.catalog.close()
+        con = sqlite3.connect(self.path)
+        con.execute(f"PRAGMA user_version = {CATALOG_VERSION + 1}")
+        con.close()
+        with self.assertRaises(ValueError):
+            SchemaCatalog(self.path)
+        self.catalog = SchemaCatalog(
+            os.path.join(self.tmpdir.name, 'new.db'))
+
+    def test_load_structs_tells_formats_apart(self):
+        legacy = os.path.join(self.tmpdir.name, 'structs.pkl')
+        with open(legacy, 'wb') as fh:
+            pickle.dump({'t': {'id': 'int'}}, fh)
+        self.assertFalse(is_catalog(legacy))
+        self.assertTrue(is_catalog(self.path))
+        structs, sketches = load_structs(self.path)
+        self.assertEqual(dict(structs), {
+            'customers': {'id': 'int', 'name': 'str(3)'}})
+        self.assertEqual(sorted(sketches['customers']), ['id', 'name'])
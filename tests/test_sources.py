@@ -0,0 +1,150 @@
+import bz2
+from functools import partial
+import gzip
+import io
+import os
+import sqlite3
+import tarfile
+import tempfile
+from unittest import TestCase
+import zipfile
+
+from csv2db import size_order, source_walker
+from sources import (DirectorySource, FileSource, MemberInfo, Source,
+                     StdinSource, TarSource, ZipSource, open_source)
+from sqlite_loader import import_sqlite_inproc
+from staged_load import StagedLoad
+
+FRUIT = b"id,name,price\n1,apple,0.5\n2,fig,1.25\n3,kiwi,0.75\n"
+VEG = b"id,name\n1,leek\n2,okra\n"
+
+
+class TestSources(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmpdir.name, 'food')
+        os.makedirs(os.path.join(self.dir, 'more'))
+        with gzip.open(os.path.join(self.dir, 'fruit.csv.gz'), 'wb') as fh:
+            fh.write(FRUIT)
+        with bz2.open(os.path.join(self.dir, 'more', 'veg.csv.bz2'),
+                      'wb') as fh:
+            fh.write(VEG)
+        with open(os.path.join(self.dir, 'nuts.csv'), 'wb') as fh:
+            fh.write(b"id\n1\n")
+        self.tar_filename = os.path.join(self.tmpdir.name, 'food.tar.gz')
+        with tarfile.open(self.tar_filename, 'w:gz') as tar:
+            for name, data in (('fruit.csv', FRUIT), ('veg.csv', VEG)):
+                tarinfo = tarfile.TarInfo(name)
+                tarinfo.size = len(data)
+                tar.addfile(tarinfo, io.BytesIO(data))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_directory_members(self):
+        source = DirectorySource(self.dir)
+        infos = {info.filename: info for info in source.members()}
+        self.assertEqual(sorted(infos),
+                         ['fruit.csv', 'more/veg.csv', 'nuts.csv'])
+        # gzip's trailer gives its size; bz2 has nothing to tell
+        self.assertEqual(infos['fruit.csv'].file_size, len(FRUIT))
+        self.assertIsNone(infos['more/veg.csv'].file_size)
+        self.assertEqual(infos['nuts.csv'].file_size, 5)
+        with source.open('more/veg.csv') as fh:
+            self.assertEqual(fh.read(), VEG)
+        with source.open(infos['fruit.csv']) as fh:
+            self.assertEqual(fh.read(), FRUIT)
+
+    def test_sources_must_open_members(self):
+        class Listing(Source):
+            def members(self):
+                return []
+
+        with self.assertRaises(TypeError):
+            Listing(self.dir)
+
+    def test_fingerprint_follows_the_file(self):
+        path = os.path.join(self.dir, 'nuts.csv')
+        before, = FileSource(path).members()
+        with open(path, 'ab') as fh:
+            fh.write(b"2\n")
+        after, = FileSource(path).members()
+        self.assertNotEqual(before.CRC, after.CRC)
+        self.assertEqual(after.file_size, 7)
+
+    def test_tar_streams_members_in_order(self):
+        source = TarSource(self.tar_filename)
+        self.assertTrue(source.streaming)
+        read = []
+        for info in source.members():
+            read.append((info.filename, info.file_size,
+                         source.open(info).read()))
+        self.assertEqual(read, [('fruit.csv', len(FRUIT), FRUIT),
+                                ('veg.csv', len(VEG), VEG)])
+
+    def test_tar_opens_only_its_current_member(self):
+        source = TarSource(self.tar_filename)
+        members = source.members()
+        first = next(members)
+        with self.assertRaises(ValueError):
+            source.open('veg.csv')
+        source.open(first)
+        with self.assertRaises(ValueError):
+            source.open(first)
+        members.close()
+
+    def test_open_source(self):
+        self.assertIsInstance(open_source('-'), StdinSource)
+        self.assertIsInstance(open_source(self.dir), DirectorySource)
+        self.assertIsInstance(open_source(self.tar_filename), TarSource)
+        self.assertIsInstance(
+            open_source(os.path.join(self.dir, 'nuts.csv')), FileSource)
+        zip_filename = os.path.join(self.tmpdir.name, 'food.zip')
+        with zipfile.ZipFile(zip_filename, 'w') as zip:
+            zip.writestr('veg.csv', VEG)
+        with open_source(zip_filename) as source:
+            self.assertIsInstance(source, ZipSource)
+
+    def _load(self, source, **kw):
+        db_path = os.path.join(self.tmpdir.name, 'food.db')
+        with source:
+            source_walker(source, max_rows=None,
+                          output_fn=partial(import_sqlite_inproc, db_path),
+                          **kw)
+        con = sqlite3.connect(db_path)
+        try:
+            return {table: con.execute(
+                        f"SELECT count(*) FROM {table}").fetchone()[0]
+                    for table, in con.execute(
+                        "SELECT name FROM sqlite_master "
+                        "WHERE type = 'table'")}
+        finally:
+            con.close()
+
+    def test_load_a_directory(self):
+        self.assertEqual(self._load(DirectorySource(self.dir)),
+                         {'fruit': 3, 'veg': 2, 'nuts': 1})
+
+    def test_load_a_directory_in_jobs(self):
+        # veg.csv.bz2's size is unknown, which mustn't upset the biggest
+        # first ordering
+        self.assertEqual(self._load(DirectorySource(self.dir), jobs=2),
+                         {'fruit': 3, 'veg': 2, 'nuts': 1})
+
+    def test_parallel_load_a_directory(self):
+        db_path = os.path.join(self.tmpdir.name, 'food.db')
+        staged = StagedLoad(db_path, import_sqlite_inproc)
+        self.assertEqual(self._load(DirectorySource(self.dir), jobs=2,
+                                    staged=staged),
+                         {'fruit': 3, 'veg': 2, 'nuts': 1})
+
+    def test_size_order(self):
+        infos = {info.filename: info
+                 for info in DirectorySource(self.dir).members()}
+        self.assertGreater(
+            size_order(('veg', 'veg', infos['more/veg.csv'])), 0)
+        self.assertEqual(size_order(('x', 'x', MemberInfo('x.csv'))), 0)
+
+    def test_load_a_tar(self):
+        self.assertEqual(self._load(TarSource(self.tar_filename)),
+                         {'fruit': 3, 'veg': 2})
@@ -0,0 +1,92 @@
+import csv
+from concurrent.futures import ProcessPoolExecutor
+import io
+import os
+import tempfile
+from unittest import TestCase
+import zipfile
+
+from csv2db import scan_member, scan_member_split
+from sources import FileSource, ZipSource
+from split_scan import (
+    SpanReader, chunk_reads, chunk_spans, count_quotes, record_start,
+    split_points)
+
+
+def make_csv(rows=2000):
+    out = io.StringIO(newline='')
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['id', 'note', 'price'])
+    notes = ['plain', 'say "hi"', 'two\nlines', 'a, b', '"\n"\n']
+    for i in range(rows):
+        writer.writerow([i, notes[i % len(notes)] * (i % 3 + 1),
+                         f"{i / 7:.2f}" if i % 500 else 'n/a'])
+    return out.getvalue().encode()
+
+
+class TestSplitScan(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data = make_csv()
+        self.csv_filename = os.path.join(self.tmpdir.name, 'notes.csv')
+        with open(self.csv_filename, 'wb') as fh:
+            fh.write(self.data)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_record_start_skips_quoted_newlines(self):
+        data = b'a,"x\ny"\nb,c\n'
+        self.assertEqual(record_start(data, 0, False, len(data)), 8)
+        # Knowing pos 5 is inside the quotes finds the real record end
+        self.assertEqual(record_start(data, 5, True, len(data)), 8)
+        self.assertEqual(record_start(data, 9, False, 10), 10)
+
+    def test_chunks_are_whole_records(self):
+        data = self.data
+        points = split_points(0, len(data), 3000)
+        quote_counts = [count_quotes(data, start, end) for start, end in
+                        zip([0] + points[:-1], points)]
+        spans = chunk_spans(data, 0, len(data), points, quote_counts)
+        self.assertGreater(len(spans), 5)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(data))
+        rows = []
+        for reads in chunk_reads(data, 0, len(data), spans):
+            with SpanReader(self.csv_filename, reads) as fh:
+                chunk = list(csv.reader(io.TextIOWrapper(
+                    io.BufferedReader(fh), newline='')))
+            self.assertEqual(chunk[0], ['id', 'note', 'price'])
+            rows += chunk[1:]
+        self.assertEqual(rows, list(csv.reader(
+            io.StringIO(data.decode(), newline='')))[1:])
+
+    def _split_scan(self, source, file_info):
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            ss, spool = scan_member_split(pool, source, file_info.filename,
+                                          'notes', file_info, 3000,
+                                          max_rows=None)
+        return ss, spool
+
+    def test_same_stats_as_a_whole_scan(self):
+        source = FileSource(self.csv_filename)
+        file_info, = source.members()
+        whole = scan_member(source, 'notes.csv', 'notes', len(self.data),
+                            max_rows=None)
+        ss, spool = self._split_scan(source, file_info)
+        self.assertIsNone(spool)
+        self.assertEqual(ss.stats, whole.stats)
+        self.assertEqual(list(ss.result()), list(whole.result()))
+
+    def test_deflated_member_is_inflated_to_a_temp_file(self):
+        zip_filename = os.path.join(self.tmpdir.name, 'notes.zip')
+        with zipfile.ZipFile(zip_filename, 'w',
+                             zipfile.ZIP_DEFLATED) as zip:
+            zip.writestr('notes.csv', self.data)
+        with ZipSource(zip_filename) as source:
+            file_info, = source.members()
+            ss, spool = self._split_scan(source, file_info)
+        with spool:
+            self.assertEqual(spool.read(), self.data)
+        self.assertFalse(os.path.exists(spool.name))
+        self.assertEqual(ss.row_count, 2000)
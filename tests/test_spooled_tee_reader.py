@@ -0,0 +1,20 @@
+from io import BytesIO, BufferedReader
+from unittest import TestCase
+
+from spooled_tee_reader import SpooledTeeReader
+
+
+sample_data = b"".join(b"%d,row %d\n" % (i, i) for i in range(1000))
+
+
+class TestSpooledTeeReader(TestCase):
+    def test_that_reads_pass_through(self):
+        tee = BufferedReader(SpooledTeeReader(BytesIO(sample_data)))
+        self.assertEqual(tee.read(), sample_data)
+
+    def test_that_spool_holds_whole_source_after_partial_read(self):
+        tee = SpooledTeeReader(BytesIO(sample_data), max_mem=256)
+        reader = BufferedReader(tee, buffer_size=64)
+        reader.readline()
+        reader.readline()
+        self.assertEqual(tee.spooled().read(), sample_data)
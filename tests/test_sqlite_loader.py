@@ -0,0 +1,74 @@
+from io import BytesIO, TextIOWrapper
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from csv_scanner import CSVScanner
+from sqlite_loader import import_sqlite_inproc, iter_text_lines
+
+
+sample_data = (b'id,name,amount\r\n'
+               b'1,"Apple, raw",1.5\r\n'
+               b'2,"two\nlines",2\r\n'
+               b'3,short\r\n')
+
+
+class Truncated(BytesIO):
+    def read(self, size=-1):
+        data = super().read(size)
+        if not data:
+            raise OSError("truncated member")
+        return data
+
+
+class TestIterTextLines(TestCase):
+    def test_that_lines_survive_small_blocks(self):
+        data = "a,b\r\nc,\"é\nf\"\r\ng,h".encode('utf-8')
+        lines = list(iter_text_lines(BytesIO(data), block_size=3))
+        self.assertEqual("".join(lines), data.decode('utf-8'))
+        self.assertEqual(lines[0], "a,b\r\n")
+
+
+class TestImportSqliteInproc(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'test.db')
+        self.scanner = CSVScanner(
+            TextIOWrapper(BytesIO(sample_data), newline=''), 'fruit')
+        self.scanner.scan()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _import(self, create_only=False):
+        csv_fh = BytesIO(sample_data)
+        csv_fh.readline()
+        import_sqlite_inproc(self.db_path, self.scanner, 'fruit', csv_fh,
+                             file_info=None, create_only=create_only)
+        return sqlite3.connect(self.db_path)
+
+    def test_that_rows_are_imported(self):
+        con = self._import()
+        self.assertEqual(
+            con.execute("SELECT * FROM fruit ORDER BY id").fetchall(),
+            [(1, 'Apple, raw', 1.5), (2, 'two\nlines', 2.0),
+             (3, 'short', None)])
+
+    def test_that_create_only_leaves_table_empty(self):
+        con = self._import(create_only=True)
+        self.assertEqual(
+            con.execute("SELECT count(*) FROM fruit").fetchone(), (0,))
+
+    @patch('sqlite_loader.INSERT_BATCH_ROWS', 1)
+    def test_that_failed_loads_roll_back(self):
+        csv_fh = Truncated(sample_data)
+        csv_fh.readline()
+        with self.assertRaises(OSError):
+            import_sqlite_inproc(self.db_path, self.scanner, 'fruit', csv_fh,
+                                 file_info=None)
+        con = sqlite3.connect(self.db_path)
+        self.assertEqual(
+            con.execute("SELECT count(*) FROM fruit").fetchone(), (0,))
+        con.close()
@@ -0,0 +1,71 @@
+from functools import partial
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+import zipfile
+
+from csv2db import zip_walker
+from sqlite_loader import import_sqlite_inproc
+from staged_load import StagedLoad
+
+members = {
+    'fruit.csv': b"id,name,price\n1,apple,0.5\n2,fig,1.25\n3,kiwi,0.75\n",
+    'veg.csv': b"id,name\n1,leek\n2,okra\n",
+}
+
+
+def dump(db_path):
+    con = sqlite3.connect(db_path)
+    try:
+        return list(con.iterdump())
+    finally:
+        con.close()
+
+
+class TestStagedLoad(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.zip_filename = os.path.join(self.tmpdir.name, 'food.zip')
+        with zipfile.ZipFile(self.zip_filename, 'w') as zip:
+            for name, data in members.items():
+                zip.writestr(name, data)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _db(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_same_db_as_a_serial_load(self):
+        zip_walker(self.zip_filename, max_rows=None,
+                   output_fn=partial(import_sqlite_inproc,
+                                     self._db('serial.db')))
+        staged = StagedLoad(self._db('staged.db'), import_sqlite_inproc)
+        zip_walker(self.zip_filename, max_rows=None, jobs=2,
+                   output_fn=partial(import_sqlite_inproc,
+                                     self._db('staged.db')),
+                   staged=staged)
+        self.assertEqual(dump(self._db('staged.db')),
+                         dump(self._db('serial.db')))
+        # Staging dir is cleaned up along the way
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)),
+                         ['food.zip', 'serial.db', 'staged.db'])
+
+    def test_merge_moves_the_table_over(self):
+        staged = StagedLoad(self._db('target.db'), import_sqlite_inproc)
+        try:
+            con = sqlite3.connect(staged.stage_path('t'))
+            con.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+            con.executemany("INSERT INTO t VALUES (?, ?)",
+                            [(1, 'x'), (2, 'y')])
+            con.commit()
+            con.close()
+            staged.merge('t')
+            self.assertFalse(os.path.exists(staged.stage_path('t')))
+        finally:
+            staged.close()
+        con = sqlite3.connect(self._db('target.db'))
+        self.assertEqual(con.execute("SELECT * FROM t").fetchall(),
+                         [(1, 'x'), (2, 'y')])
+        con.close()
@@ -243,4 +243,7 @@ class TestTextIOProgressWrapperCallbacks(TestCase):
 
         wrapper.read()
         progress_fh.seek(0)
-        self.assertEqual(progress_fh.read(), '\rfnoord: row 99 of 99 - 100%')
+        self.assertRegex(
+            progress_fh.read(),
+            r'^\rfnoord: row 99 of 99 - 100% - [\d,]+ rows/s, '
+            r'[\d.,]+ MB/s, ETA 0:00$')
@@ -0,0 +1,85 @@
+from io import StringIO
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from choose_key_fields import Inclusion, inclusion_candidates, load_structs
+from csv_scanner import CSVScanner
+from value_sketch import KMVSketch, value_hash
+
+
+def sketch_of(values, k=64):
+    sketch = KMVSketch(k)
+    sketch.update(values)
+    return sketch
+
+
+class TestKMVSketch(TestCase):
+    def test_small_columns_are_exact(self):
+        sketch = sketch_of(['a', 'b', 'a', '', 'c'])
+        self.assertFalse(sketch.full)
+        self.assertEqual(sketch.distinct(), 3)
+        self.assertEqual(sketch.hashes,
+                         {value_hash(val) for val in 'abc'})
+
+    def test_distinct_estimate(self):
+        sketch = sketch_of(map(str, range(20000)), k=256)
+        self.assertTrue(sketch.full)
+        self.assertEqual(len(sketch), 256)
+        self.assertAlmostEqual(sketch.distinct(), 20000, delta=20000 * 0.25)
+
+    def test_merge_is_a_sketch_of_both(self):
+        first = sketch_of(map(str, range(0, 3000)))
+        first.merge(sketch_of(map(str, range(3000, 6000))))
+        self.assertEqual(first, sketch_of(map(str, range(6000))))
+
+    def test_containment(self):
+        keys = sketch_of(map(str, range(5000)))
+        refs = sketch_of(str(i * 7 % 5000) for i in range(2000))
+        others = sketch_of(map(str, range(10000, 12000)))
+        self.assertGreater(refs.containment(keys), 0.95)
+        self.assertLess(others.containment(keys) or 0, 0.05)
+        # Too few values to say
+        self.assertIsNone(sketch_of(['1', '2']).containment(keys))
+
+    def test_round_trip(self):
+        sketch = sketch_of(map(str, range(1000)))
+        self.assertEqual(KMVSketch.from_bytes(sketch.to_bytes()), sketch)
+        self.assertEqual(pickle.loads(pickle.dumps(sketch)), sketch)
+
+
+class TestInclusionCandidates(TestCase):
+    def scan(self, text):
+        scanner = CSVScanner(StringIO(text), 't', sketch_k=64)
+        scanner.scan()
+        return scanner.sketches
+
+    def test_finds_foreign_keys_by_value(self):
+        sketches = {
+            'customers': self.scan("id,name\n" + "".join(
+                f"{i},c{i}\n" for i in range(1000))),
+            'orders': self.scan("order_id,cust\n" + "".join(
+                f"{5000 + i},{i * 3 % 1000}\n" for i in range(3000))),
+        }
+        structs = {'customers': {'id': 'int', 'name': 'str(4)'},
+                   'orders': {'order_id': 'int', 'cust': 'int'}}
+        found = inclusion_candidates(sketches, structs)
+        self.assertEqual([inc[:4] for inc in found],
+                         [('customers', 'id', 'orders', 'cust'),
+                          ('orders', 'cust', 'customers', 'id')])
+        self.assertIsInstance(found[0], Inclusion)
+
+    def test_load_structs_reads_both_formats(self):
+        structs = {'t': {'id': 'int'}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            legacy = os.path.join(tmpdir, 'legacy.pkl')
+            with open(legacy, 'wb') as fh:
+                pickle.dump(structs, fh)
+            self.assertEqual(load_structs(legacy), (structs, {}))
+            current = os.path.join(tmpdir, 'current.pkl')
+            sketches = {'t': {'id': sketch_of(['1'])}}
+            with open(current, 'wb') as fh:
+                pickle.dump({'version': 2, 'structs': structs,
+                             'sketches': sketches}, fh)
+            self.assertEqual(load_structs(current), (structs, sketches))
@@ -26,6 +26,14 @@ class TextIOStatsWrapper(io.TextIOWrapper):
         self._line_num += len(data)
         return data
 
+    def advance(self, nchars, lines=0):
+        """
+        Count nchars & lines as consumed when they were read from the
+        buffer by other means, e.g. by csv_sampler.
+        """
+        self._char_num += nchars
+        self._line_num += lines
+
     @property
     def char_num(self):
         return self._char_num
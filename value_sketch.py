@@ -0,0 +1,139 @@
+from hashlib import blake2b
+import heapq
+import struct
+from typing import Iterable, Optional
+
+# Hashes kept per column; distinct counts come out within about
+# 1/sqrt(k), i.e. ~6%
+DEFAULT_K = 256
+
+# Fewest of a column's hashes that must fall within another's range before
+# containment() will say how much of it the other holds
+MIN_SAMPLE = 16
+
+HASH_SPACE = 2 ** 64
+HEADER = struct.Struct('<I')
+
+
+def value_hash(val: str) -> int:
+    # blake2b, unlike hash(), is the same in every process & run, so
+    # sketches from pool workers & earlier runs compare. Big-endian, so
+    # digests compare as bytes the way their hashes do, see update()
+    return int.from_bytes(blake2b(val.encode(), digest_size=8).digest(),
+                          'big')
+
+
+class KMVSketch:
+    """
+    A bottom-k ("k minimum values") sketch of a column's distinct values:
+    the k smallest of their 64 bit hashes. Those are a uniform sample of
+    the distinct values, whatever the column's size, so two columns'
+    sketches say roughly how many distinct values each has, and how many
+    of one's are also the other's, in O(k) memory.
+    """
+    __slots__ = ('k', '_hashes', '_heap')
+
+    def __init__(self, k=DEFAULT_K, hashes: Iterable[int] = ()):
+        self.k = k
+        self._hashes = set()
+        self._heap = []  # negated, so the biggest kept hash is on top
+        self.add_hashes(hashes)
+
+    def add_hashes(self, hashes: Iterable[int]):
+        kept, heap, k = self._hashes, self._heap, self.k
+        for h in hashes:
+            if h in kept:
+                continue
+            if len(heap) < k:
+                heapq.heappush(heap, -h)
+                kept.add(h)
+            elif h < -heap[0]:
+                kept.discard(-heapq.heapreplace(heap, -h))
+                kept.add(h)
+
+    def update(self, values: Iterable[str]):
+        """ Add values, ignoring empty ones. """
+        kept, heap, k = self._hashes, self._heap, self.k
+        # Once full, most values' digests are over the bound, and are
+        # dropped without making ints of them
+        bound = (-heap[0]).to_bytes(8, 'big') if len(heap) >= k else None
+        for val in values:
+            if not val:
+                continue
+            digest = blake2b(val.encode(), digest_size=8).digest()
+            if bound is not None and digest >= bound:
+                continue
+            h = int.from_bytes(digest, 'big')
+            if h in kept:
+                continue
+            if len(heap) < k:
+                heapq.heappush(heap, -h)
+                kept.add(h)
+            else:
+                kept.discard(-heapq.heapreplace(heap, -h))
+                kept.add(h)
+            if len(heap) >= k:
+                bound = (-heap[0]).to_bytes(8, 'big')
+
+    def merge(self, other: 'KMVSketch'):
+        self.add_hashes(other._hashes)
+
+    @property
+    def hashes(self):
+        return frozenset(self._hashes)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    @property
+    def full(self):
+        return len(self._heap) >= self.k
+
+    @property
+    def bound(self):
+        """ Hashes up to here are all in the sketch, if they were seen. """
+        return -self._heap[0] if self.full else HASH_SPACE
+
+    def distinct(self):
+        """ Estimated number of distinct values; exact if not full. """
+        if not self.full:
+            return len(self._hashes)
+        return round((self.k - 1) / (self.bound / HASH_SPACE))
+
+    def containment(self, other: 'KMVSketch') -> Optional[float]:
+        """
+        Estimated share of this column's distinct values that other's has
+        too, from those of this sketch's hashes that other's would hold if
+        it had seen them, or None if fewer than MIN_SAMPLE of them.
+        """
+        bound = other.bound
+        sample = [h for h in self._hashes if h <= bound]
+        if len(sample) < MIN_SAMPLE:
+            return None
+        return sum(h in other._hashes for h in sample) / len(sample)
+
+    def to_bytes(self) -> bytes:
+        hashes = sorted(self._hashes)
+        return (HEADER.pack(self.k)
+                + struct.pack(f'<{len(hashes)}Q', *hashes))
+
+    @classmethod
+    def from_bytes(cls, data) -> 'KMVSketch':
+        k, = HEADER.unpack_from(data)
+        count = (len(data) - HEADER.size) // 8
+        return cls(k, struct.unpack_from(f'<{count}Q', data, HEADER.size))
+
+    def __reduce__(self):
+        return _from_bytes, (self.to_bytes(),)
+
+    def __eq__(self, other):
+        if not isinstance(other, KMVSketch):
+            return NotImplemented
+        return self.k == other.k and self._hashes == other._hashes
+
+    def __repr__(self):
+        return f"KMVSketch(k={self.k}, distinct~{self.distinct()})"
+
+
+def _from_bytes(data):
+    return KMVSketch.from_bytes(data)